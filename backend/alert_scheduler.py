@@ -0,0 +1,149 @@
+# ============================================================================
+# CARRILES DE PRIORIDAD DEL WORKER
+# ============================================================================
+# Cada alerta por revisar va al primer carril que cumpla:
+# - urgent: el vuelo sale en WORKER_URGENT_DAYS días o menos,
+# - premium: el usuario tiene users.tier = 'premium',
+# - near_target: el último precio visto (alert_price_stats) supera el
+#   objetivo como mucho en WORKER_NEAR_TARGET_PCT % (o ya lo cumple),
+# - standard: el resto.
+# El carril se calcula en la consulta (LANE_SQL) para que el worker lea cada
+# carril con su propio cursor en el servidor, a trozos, sin cargar todas las
+# alertas en memoria. La siguiente alerta sale de un round-robin ponderado
+# "suave" entre los carriles que tienen alertas (WORKER_LANE_WEIGHTS): un
+# carril con peso 8 frente a otro con peso 1 recibe 8 de cada 9 turnos,
+# intercalados, y ninguno se queda sin turno. Dentro de un carril, primero
+# la que lleva más tiempo pendiente. Contra la inanición: una alerta que lleva
+# más de WORKER_LANE_MAX_WAIT_MINUTES pendiente se adelanta, pero como mucho
+# una por ronda (tantos turnos como la suma de los pesos), así que con mucho
+# atraso los pesos se siguen respetando.
+# ============================================================================
+
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+LANES = ('urgent', 'premium', 'near_target', 'standard')
+PREMIUM_TIER = 'premium'
+
+WORKER_LANE_WEIGHTS = os.getenv('WORKER_LANE_WEIGHTS', 'urgent:8,premium:4,near_target:2,standard:1')
+WORKER_URGENT_DAYS = int(os.getenv('WORKER_URGENT_DAYS', '7'))
+WORKER_NEAR_TARGET_PCT = float(os.getenv('WORKER_NEAR_TARGET_PCT', '10'))
+WORKER_LANE_MAX_WAIT_MINUTES = float(os.getenv('WORKER_LANE_MAX_WAIT_MINUTES', '60'))
+
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    """'urgent:8,standard:1' -> pesos de los cuatro carriles (los que no aparecen valen 1)"""
+    weights = {lane: 1 for lane in LANES}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        lane, _, weight = item.partition(':')
+        lane = lane.strip()
+        if lane not in weights:
+            raise ValueError(f"Carril desconocido en WORKER_LANE_WEIGHTS: {lane!r} (válidos: {', '.join(LANES)})")
+        if not weight.strip().isdigit() or int(weight) < 1:
+            raise ValueError(f"Peso no válido para el carril {lane!r}: {weight!r} (entero >= 1)")
+        weights[lane] = int(weight)
+    return weights
+
+
+# Carril de cada alerta dentro de la consulta del worker (alias a = alerts,
+# u = users, s = alert_price_stats); parámetros de lane_params()
+LANE_SQL = f"""
+    CASE
+        WHEN a.date_from - CURRENT_DATE <= %(urgent_days)s THEN 'urgent'
+        WHEN u.tier = '{PREMIUM_TIER}' THEN 'premium'
+        WHEN s.last_cents <= a.price_target_cents * (1 + %(near_target_pct)s / 100.0) THEN 'near_target'
+        ELSE 'standard'
+    END
+"""
+
+
+def lane_params(urgent_days: int = WORKER_URGENT_DAYS, near_target_pct: float = WORKER_NEAR_TARGET_PCT) -> Dict[str, Any]:
+    return {'urgent_days': urgent_days, 'near_target_pct': near_target_pct}
+
+
+class ScheduledAlert(NamedTuple):
+    alert: Dict[str, Any]
+    lane: str
+    due_at: float       # instante monotónico en que la alerta pasó a tocar
+    promoted: bool      # servida por la protección contra la inanición
+
+
+class LaneStream:
+    """Alertas de un carril en orden, como (instante en que tocaba, alerta), con la siguiente a la vista"""
+
+    def __init__(self, items: Iterable[Tuple[float, Dict[str, Any]]], total: int = 0):
+        self._items: Iterator = iter(items)
+        self._head: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._exhausted = False
+        self.remaining = total
+
+    def peek(self) -> Optional[Tuple[float, Dict[str, Any]]]:
+        if self._head is None and not self._exhausted:
+            self._head = next(self._items, None)
+            self._exhausted = self._head is None
+        return self._head
+
+    def pop(self) -> Tuple[float, Dict[str, Any]]:
+        head = self.peek()
+        self._head = None
+        self.remaining = max(0, self.remaining - 1)
+        return head
+
+
+class PriorityScheduler:
+    """Round-robin ponderado entre los carriles; cada uno se lee de su stream según hace falta"""
+
+    def __init__(self, weights: Dict[str, int], max_wait_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.weights = weights
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self._streams: Dict[str, LaneStream] = {}
+        self._credit = {lane: 0 for lane in weights}
+        self._turns_since_promotion = 0
+
+    def open(self, streams: Dict[str, Iterable[Tuple[float, Dict[str, Any]]]],
+             totals: Optional[Dict[str, int]] = None):
+        """Sustituye lo que hubiera en cola por los streams de cada carril (ordenados por antigüedad)"""
+        totals = totals or {}
+        self._streams = {lane: LaneStream(items, totals.get(lane, 0)) for lane, items in streams.items()}
+        self._credit = {lane: 0 for lane in self.weights}
+        self._turns_since_promotion = 0
+
+    def next(self) -> Optional[ScheduledAlert]:
+        heads = {lane: stream.peek() for lane, stream in self._streams.items()}
+        active = [lane for lane in self.weights if heads.get(lane) is not None]
+        if not active:
+            return None
+
+        oldest = min(active, key=lambda lane: heads[lane][0])
+        round_turns = sum(self.weights[candidate] for candidate in active)
+        promoted = (self.clock() - heads[oldest][0] > self.max_wait_seconds
+                    and self._turns_since_promotion >= round_turns - 1)
+        if promoted:
+            lane = oldest
+            self._turns_since_promotion = 0
+        else:
+            self._turns_since_promotion += 1
+            # Round-robin ponderado suave (como el de nginx): cada carril suma su
+            # peso, gana el de más crédito y paga la suma de los pesos activos
+            for candidate in active:
+                self._credit[candidate] += self.weights[candidate]
+            lane = max(active, key=lambda candidate: self._credit[candidate])
+            self._credit[lane] -= sum(self.weights[candidate] for candidate in active)
+
+        due_at, alert = self._streams[lane].pop()
+        if self._streams[lane].peek() is None:
+            self._credit[lane] = 0
+        return ScheduledAlert(alert, lane, due_at, promoted)
+
+    def depth(self) -> Dict[str, int]:
+        """Alertas por revisar en cada carril (según los totales de open())"""
+        return {lane: self._streams[lane].remaining if lane in self._streams else 0 for lane in self.weights}
+
+    def pending(self) -> int:
+        return sum(self.depth().values())
+
+    def clear(self):
+        self.open({})
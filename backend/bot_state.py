@@ -0,0 +1,365 @@
+# ============================================================================
+# ESTADO COMPARTIDO DEL BOT (CONVERSACIONES Y user_data)
+# ============================================================================
+# Por defecto python-telegram-bot guarda el paso de cada conversación
+# (/crear_alerta) y context.user_data en memoria: un reinicio las pierde y con
+# varias réplicas del webhook cada una ve un estado distinto. Aquí:
+# - un almacén intercambiable (Postgres, tabla bot_state, o SQLite para una
+#   sola máquina) con el estado serializado en JSON,
+# - carga perezosa por chat: antes de procesar cada update se lee el estado de
+#   ese chat/usuario (una consulta), salvo que esta réplica tenga cambios suyos
+#   sin escribir, que son más recientes,
+# - escritura diferida: los cambios se acumulan en memoria y se escriben en
+#   bloque cada BOT_STATE_FLUSH_SECONDS (y al parar), no uno por mensaje.
+#
+# El coste es que otra réplica puede ver el estado con hasta
+# BOT_STATE_FLUSH_SECONDS de retraso; entre dos mensajes de una persona
+# escribiendo no suele notarse.
+#
+# BOT_STATE_BACKEND: memory (por defecto, sin persistencia) | postgres | sqlite
+# ============================================================================
+
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, BasePersistence, ConversationHandler, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+BOT_STATE_BACKEND = os.getenv('BOT_STATE_BACKEND', 'memory').lower()
+BOT_STATE_SQLITE_PATH = os.getenv('BOT_STATE_SQLITE_PATH', 'bot_state.sqlite3')
+BOT_STATE_FLUSH_SECONDS = float(os.getenv('BOT_STATE_FLUSH_SECONDS', '1'))
+
+USER_DATA = 'user_data'
+
+# (kind, state_key) -> valor; None significa borrar
+StateKey = Tuple[str, str]
+
+
+# ============================================================================
+# SERIALIZACIÓN
+# ============================================================================
+# user_data guarda fechas (date_from, date_to) además de textos y números
+
+def _encode(value: Any):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} no se puede guardar en bot_state")
+
+
+def _decode(obj: Dict):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__date__' in obj:
+        return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, default=_encode)
+
+
+def loads(text: str) -> Any:
+    return json.loads(text, object_hook=_decode)
+
+
+# ============================================================================
+# ALMACENES
+# ============================================================================
+
+class PostgresStateStore:
+    """Tabla bot_state en la base de datos de la aplicación"""
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+    def load(self, keys: List[StateKey]) -> Dict[StateKey, Any]:
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT kind, state_key, data::text FROM bot_state WHERE (kind, state_key) IN %s",
+                    (tuple(keys),)
+                )
+                return {(kind, key): loads(data) for kind, key, data in cur.fetchall()}
+        finally:
+            conn.close()
+
+    def save(self, items: Dict[StateKey, Any]):
+        from psycopg2.extras import execute_values
+
+        upserts = [(kind, key, dumps(value)) for (kind, key), value in items.items() if value is not None]
+        deletes = tuple(key for key, value in items.items() if value is None)
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                if upserts:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO bot_state (kind, state_key, data) VALUES %s
+                        ON CONFLICT (kind, state_key) DO UPDATE
+                        SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP
+                        """,
+                        upserts, template="(%s, %s, %s::jsonb)"
+                    )
+                if deletes:
+                    cur.execute("DELETE FROM bot_state WHERE (kind, state_key) IN %s", (deletes,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class SQLiteStateStore:
+    """Fichero SQLite: réplicas en la misma máquina o desarrollo sin Postgres"""
+
+    def __init__(self, path: str = BOT_STATE_SQLITE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    kind TEXT NOT NULL,
+                    state_key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (kind, state_key)
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def load(self, keys: List[StateKey]) -> Dict[StateKey, Any]:
+        where = " OR ".join("(kind = ? AND state_key = ?)" for _ in keys)
+        params = [part for key in keys for part in key]
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT kind, state_key, data FROM bot_state WHERE {where}", params).fetchall()
+        return {(kind, key): loads(data) for kind, key, data in rows}
+
+    def save(self, items: Dict[StateKey, Any]):
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                INSERT INTO bot_state (kind, state_key, data) VALUES (?, ?, ?)
+                ON CONFLICT (kind, state_key) DO UPDATE
+                SET data = excluded.data, updated_at = CURRENT_TIMESTAMP
+                """,
+                [(kind, key, dumps(value)) for (kind, key), value in items.items() if value is not None]
+            )
+            conn.executemany(
+                "DELETE FROM bot_state WHERE kind = ? AND state_key = ?",
+                [key for key, value in items.items() if value is None]
+            )
+
+
+# ============================================================================
+# PERSISTENCIA PARA python-telegram-bot
+# ============================================================================
+
+class SharedStatePersistence(BasePersistence):
+    """
+    Persistencia con carga perezosa y escritura diferida. Solo guarda user_data
+    y las conversaciones con nombre; al arrancar no carga nada (lo hace
+    SharedStateApplication chat a chat).
+    """
+
+    def __init__(self, store, update_interval: float = BOT_STATE_FLUSH_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self._pending: Dict[StateKey, Any] = {}
+        self._flushing: Dict[StateKey, Any] = {}
+        self._write_lock = asyncio.Lock()
+        self.stats = {'loads': 0, 'flushes': 0, 'rows_written': 0}
+
+    # --- carga y escritura --------------------------------------------------
+
+    def has_pending(self, key: StateKey) -> bool:
+        return key in self._pending or key in self._flushing
+
+    def stage(self, key: StateKey, value: Any):
+        """Apunta un cambio para la próxima escritura (None o {} = borrar)"""
+        self._pending[key] = None if value == {} else value
+
+    async def load(self, keys: List[StateKey]) -> Dict[StateKey, Any]:
+        self.stats['loads'] += 1
+        return await asyncio.to_thread(self.store.load, keys)
+
+    async def write_pending(self):
+        """Escribe en bloque los cambios acumulados; si falla se reintentan en la siguiente"""
+        async with self._write_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self.store.save, self._flushing)
+                self.stats['flushes'] += 1
+                self.stats['rows_written'] += len(self._flushing)
+            except Exception as e:
+                logger.error(f"❌ Error guardando el estado del bot ({len(self._flushing)} claves): {e}")
+                # Lo que haya cambiado mientras tanto es más reciente
+                self._pending = {**self._flushing, **self._pending}
+            finally:
+                self._flushing = {}
+
+    # --- interfaz de BasePersistence ----------------------------------------
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]):
+        self.stage(conversation_key(name, key), new_state)
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        # PTB la llama para todo usuario que ha escrito; los cambios reales ya
+        # los apunta SharedStateApplication al terminar cada update
+        pass
+
+    async def drop_user_data(self, user_id: int):
+        self.stage((USER_DATA, str(user_id)), None)
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
+
+    async def flush(self):
+        await self.write_pending()
+
+
+def conversation_key(name: str, key: Iterable[int]) -> StateKey:
+    return (f"conversation:{name}", ':'.join(str(part) for part in key))
+
+
+class SharedStateApplication(Application):
+    """
+    Application que, antes de cada update, trae del almacén el estado de ese
+    chat/usuario y, después, deja apuntados los cambios para escribirlos en bloque.
+    """
+
+    async def process_update(self, update: object) -> None:
+        persistence = self.persistence
+        if not isinstance(persistence, SharedStatePersistence) or not isinstance(update, Update):
+            await super().process_update(update)
+            return
+
+        keys = self._state_keys(update)
+        await self._load_state(persistence, keys)
+        before = self._snapshot(keys)
+        await super().process_update(update)
+        # Solo se escribe lo que ha cambiado durante el update
+        for key, value in self._current_state(keys).items():
+            if dumps(value) != before.get(key):
+                persistence.stage(key, value)
+
+    async def update_persistence(self) -> None:
+        # PTB le pasa a la persistencia todo lo que ha cambiado; luego se escribe de una vez
+        await super().update_persistence()
+        if isinstance(self.persistence, SharedStatePersistence):
+            await self.persistence.write_pending()
+
+    def _state_keys(self, update: Update) -> Dict[StateKey, Tuple]:
+        """Claves de user_data y de cada conversación persistente que afectan al update"""
+        keys: Dict[StateKey, Tuple] = {}
+        user, chat = update.effective_user, update.effective_chat
+        if user:
+            keys[(USER_DATA, str(user.id))] = (USER_DATA, user.id)
+        for handler in self._persistent_conversations():
+            if (handler.per_chat and not chat) or (handler.per_user and not user):
+                continue
+            key = tuple(([chat.id] if handler.per_chat else []) + ([user.id] if handler.per_user else []))
+            keys[conversation_key(handler.name, key)] = (handler.name, key)
+        return keys
+
+    def _persistent_conversations(self) -> List[ConversationHandler]:
+        # Las conversaciones por mensaje (per_message) no se cargan aquí
+        return [
+            handler for group in self.handlers.values() for handler in group
+            if isinstance(handler, ConversationHandler) and handler.persistent and not handler.per_message
+        ]
+
+    async def _load_state(self, persistence: SharedStatePersistence, keys: Dict[StateKey, Tuple]):
+        stale = [key for key in keys if not persistence.has_pending(key)]
+        if not stale:
+            return
+        stored = await persistence.load(stale)
+        for key in stale:
+            target, ident = keys[key]
+            value = stored.get(key)
+            if target == USER_DATA:
+                user_data = self._user_data[ident]
+                user_data.clear()
+                user_data.update(value or {})
+            else:
+                # Estado sin marcar como cambiado: no se vuelve a escribir
+                conversations = self._conversation_handler_conversations[target]
+                if value is None:
+                    conversations.data.pop(ident, None)
+                else:
+                    conversations.update_no_track({ident: value})
+
+    def _current_state(self, keys: Dict[StateKey, Tuple]) -> Dict[StateKey, Any]:
+        current = {}
+        for key, (target, ident) in keys.items():
+            if target == USER_DATA:
+                current[key] = dict(self._user_data.get(ident) or {})
+            else:
+                state = self._conversation_handler_conversations[target].get(ident)
+                # Un handler no bloqueante deja el estado pendiente; lo guardará update_persistence
+                if state is None or isinstance(state, (int, str)):
+                    current[key] = state
+        return current
+
+    def _snapshot(self, keys: Dict[StateKey, Tuple]) -> Dict[StateKey, str]:
+        return {key: dumps(value) for key, value in self._current_state(keys).items()}
+
+
+def create_persistence(backend: str = BOT_STATE_BACKEND) -> Optional[SharedStatePersistence]:
+    """Persistencia según BOT_STATE_BACKEND; None para dejar el estado en memoria"""
+    if backend == 'postgres':
+        from backend import db
+        return SharedStatePersistence(PostgresStateStore(db.get_connection))
+    if backend == 'sqlite':
+        return SharedStatePersistence(SQLiteStateStore(BOT_STATE_SQLITE_PATH))
+    return None
@@ -1,6 +1,7 @@
 import psycopg2
 import os
 from dotenv import load_dotenv
+from backend.request_timing import TimedCursor, track
 
 # Carga las variables de entorno desde un archivo .env
 load_dotenv()
@@ -15,12 +16,15 @@ def get_connection():
     """
     Crea y retorna una conexión a la base de datos PostgreSQL.
     Lanza una excepción si la conexión falla.
+    Dentro de una petición de la API, conexión y consultas cuentan como tiempo de BD.
     """
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    with track('db'):
+        conn = psycopg2.connect(
+            host=DB_HOST,
+            port=DB_PORT,
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            cursor_factory=TimedCursor
+        )
     return conn
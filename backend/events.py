@@ -0,0 +1,136 @@
+# ============================================================================
+# EVENTOS DE PRECIOS EN TIEMPO REAL (POSTGRES LISTEN/NOTIFY + SSE)
+# ============================================================================
+# El worker (y los trabajos del backend) publican con pg_notify en la misma
+# transacción que el snapshot. El backend escucha el canal con una única
+# conexión integrada en el event loop y reparte cada evento a las colas de
+# los clientes SSE suscritos a ese usuario.
+# ============================================================================
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "price_events"
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY_SECONDS = 5
+
+
+def notify_price_event(cur, user_id: int, alert_id: int, event_type: str,
+                       price_cents: Optional[int], **extra: Any) -> None:
+    """
+    Publica un evento de precio en el canal. Se entrega al hacer commit de la
+    transacción del cursor, así que nunca sale un evento de una escritura fallida.
+    """
+    payload = {
+        "type": event_type,
+        "user_id": user_id,
+        "alert_id": alert_id,
+        "price_cents": price_cents,
+        **extra
+    }
+    cur.execute("SELECT pg_notify(%s, %s);", (CHANNEL, json.dumps(payload, default=str)))
+
+
+class PriceEventBroker:
+    """
+    Reparte eventos a las colas asyncio de los clientes conectados, por usuario.
+    Un cliente inactivo solo cuesta una cola vacía y una tarea dormida.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Entrega el evento a los suscriptores de su usuario; devuelve cuántos lo recibieron"""
+        queues = self._subscribers.get(event.get("user_id"), ())
+        for queue in queues:
+            if queue.full():
+                # Cliente lento: se descarta el evento más antiguo en vez de bloquear
+                queue.get_nowait()
+            queue.put_nowait(event)
+        return len(queues)
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+# Instancia global
+broker = PriceEventBroker()
+
+
+class PriceEventListener:
+    """
+    LISTEN sobre una conexión psycopg2 no bloqueante registrada con loop.add_reader,
+    sin hilos extra. Se reconecta sola si la conexión se pierde.
+    """
+
+    def __init__(self, event_broker: PriceEventBroker):
+        self.broker = event_broker
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        try:
+            # Import diferido: solo el proceso que escucha necesita la conexión
+            from backend import db
+            self._conn = db.get_connection()
+            self._conn.autocommit = True
+            self._conn.cursor().execute(f"LISTEN {CHANNEL};")
+            loop.add_reader(self._conn.fileno(), self._on_readable)
+            logger.info(f"📡 Escuchando eventos de precios en '{CHANNEL}'")
+        except Exception as e:
+            logger.error(f"❌ Error iniciando listener de precios: {e}")
+            self._schedule_reconnect()
+
+    def stop(self) -> None:
+        if self._conn is not None:
+            try:
+                self._loop.remove_reader(self._conn.fileno())
+            except Exception:
+                pass
+            self._conn.close()
+            self._conn = None
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except Exception as e:
+            logger.error(f"❌ Conexión del listener perdida: {e}")
+            self.stop()
+            self._schedule_reconnect()
+            return
+
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                self.broker.publish(json.loads(notify.payload))
+            except ValueError:
+                logger.warning(f"⚠️ Evento con payload inválido: {notify.payload[:100]}")
+
+    def _schedule_reconnect(self) -> None:
+        if self._loop is not None:
+            self._loop.call_later(RECONNECT_DELAY_SECONDS, self.start, self._loop)
+
+
+# Instancia global
+listener = PriceEventListener(broker)
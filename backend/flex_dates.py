@@ -0,0 +1,198 @@
+# ============================================================================
+# BÚSQUEDA CON FECHAS FLEXIBLES (±N DÍAS)
+# ============================================================================
+# Construye un calendario de precios alrededor de una fecha con el mínimo de
+# llamadas a Kiwi:
+# - los días que faltan se agrupan en rangos contiguos (de hasta
+#   MAX_RANGE_DAYS) y cada rango es UNA búsqueda por rango de fechas,
+# - el vuelo más barato de cada día se guarda en una caché con TTL, así que
+#   las búsquedas siguientes sobre la misma ruta reutilizan los días ya vistos,
+# - con max_calls se acota el gasto de cuota: primero los rangos más cercanos
+#   a la fecha pedida,
+# - con un PriceCalendarStore, los días que ya están en la tabla price_calendar
+#   (de cualquier búsqueda reciente) tampoco se piden, y lo que se descarga se
+#   guarda ahí para el resto de procesos.
+# Las alternativas se devuelven ordenadas por precio y, a igualdad, por
+# cercanía a la fecha original.
+# ============================================================================
+
+import os
+import time
+import logging
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.flight_record import FlightRecord
+from backend.price_calendar import PriceCalendarStore, cheapest_per_day
+
+logger = logging.getLogger(__name__)
+
+# Cuánto vale el precio cacheado de un día
+FLEX_CACHE_TTL_SECONDS = int(os.getenv('FLEX_CACHE_TTL_SECONDS', str(6 * 3600)))
+
+# Días máximos por búsqueda por rango (con más días los resultados, ordenados
+# por precio, se concentran en unos pocos días baratos y el resto queda vacío)
+MAX_RANGE_DAYS = 7
+
+# Entradas máximas de la caché antes de limpiar las caducadas
+MAX_CACHE_ENTRIES = 50000
+
+CacheKey = Tuple[str, str, date]
+
+
+class PriceCalendarCache:
+    """
+    Vuelo más barato por (origen, destino, día) con caducidad. Un día sin vuelos
+    entre los resultados se guarda como None para no volver a pedirlo, salvo si
+    la respuesta llegó al límite de resultados (el día puede tenerlos, más caros).
+    """
+
+    def __init__(self, ttl_seconds: int = FLEX_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[CacheKey, Tuple[float, Optional[FlightRecord]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Tuple[bool, Optional[FlightRecord]]:
+        """(está en caché, vuelo más barato o None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            return False, None
+        return True, entry[1]
+
+    def put(self, key: CacheKey, flight: Optional[FlightRecord]):
+        with self._lock:
+            if len(self._entries) >= MAX_CACHE_ENTRIES:
+                self._evict_expired()
+            self._entries[key] = (time.monotonic(), flight)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        # Si todo sigue vigente, descartar la mitad más antigua
+        if len(self._entries) >= MAX_CACHE_ENTRIES:
+            oldest = sorted(self._entries, key=lambda key: self._entries[key][0])
+            for key in oldest[:len(oldest) // 2]:
+                del self._entries[key]
+
+
+class FlexDateSearch:
+    """
+    Calendario de precios y alternativas de fechas cercanas sobre FlightSearchAPI.
+    """
+
+    def __init__(self, flights_api, cache: Optional[PriceCalendarCache] = None,
+                 store: Optional[PriceCalendarStore] = None):
+        self.flights_api = flights_api
+        self.cache = cache or PriceCalendarCache()
+        self.store = store
+
+    def price_calendar(self, origin: str, destination: str, center: date, days: int,
+                       max_calls: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Vuelo más barato de cada día de [center - days, center + days] (sin días pasados).
+        'complete' es False si el presupuesto de llamadas no alcanzó para todos los días.
+        """
+        origin, destination = origin.upper(), destination.upper()
+        today = date.today()
+        window = [center + timedelta(days=offset) for offset in range(-days, days + 1)]
+        window = [day for day in window if day >= today]
+
+        calendar: Dict[date, Optional[FlightRecord]] = {}
+        missing = []
+        for day in window:
+            cached, flight = self.cache.get((origin, destination, day))
+            if cached:
+                calendar[day] = flight
+            else:
+                missing.append(day)
+
+        # Días que otra búsqueda ya dejó en price_calendar
+        if missing and self.store:
+            stored = self.store.read(origin, destination, missing[0], missing[-1],
+                                     max_age_seconds=self.cache.ttl_seconds)
+            for day, entry in stored.items():
+                if day in missing:
+                    self.cache.put((origin, destination, day), entry.flight)
+                    calendar[day] = entry.flight
+            missing = [day for day in missing if day not in calendar]
+
+        # Primero los rangos más cercanos a la fecha pedida
+        ranges = sorted(_contiguous_ranges(missing), key=lambda r: _range_distance(r, center))
+        calls = 0
+        for start, end in ranges:
+            if max_calls is not None and calls >= max_calls:
+                break
+            calls += 1
+            result = self.flights_api.search_date_range(origin, destination, start, end)
+            if not result.get('success'):
+                logger.warning(f"⚠️ Sin calendario para {origin} → {destination} {start}..{end}")
+                continue
+            if self.store:
+                self.store.record(origin, destination, result['flights'])
+            cheapest = cheapest_per_day(result['flights'])
+            day = start
+            while day <= end:
+                flight = cheapest.get(day)
+                if flight is not None or not result.get('truncated'):
+                    self.cache.put((origin, destination, day), flight)
+                calendar[day] = flight
+                day += timedelta(days=1)
+
+        return {
+            'days': dict(sorted(calendar.items())),
+            'upstream_calls': calls,
+            'complete': len(calendar) == len(window),
+        }
+
+    def alternatives(self, origin: str, destination: str, center: date, days: int = 3, limit: int = 3,
+                     max_price_cents: Optional[int] = None, max_calls: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Días cercanos (sin contar center) con su vuelo más barato, ordenados por
+        precio y cercanía. Con max_price_cents solo los que no superan ese precio.
+        """
+        calendar = self.price_calendar(origin, destination, center, days, max_calls)
+        options = [
+            {'date': day, 'days_from_target': (day - center).days, 'flight': flight}
+            for day, flight in calendar['days'].items()
+            if flight is not None and day != center
+            and (max_price_cents is None or flight.price_cents <= max_price_cents)
+        ]
+        options.sort(key=lambda o: (o['flight'].price_cents, abs(o['days_from_target']), o['days_from_target']))
+        return {
+            'alternatives': options[:limit],
+            'center_flight': calendar['days'].get(center),
+            'upstream_calls': calendar['upstream_calls'],
+            'complete': calendar['complete'],
+        }
+
+
+def _contiguous_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Agrupa días ordenados en rangos contiguos de hasta MAX_RANGE_DAYS días"""
+    ranges = []
+    for day in days:
+        if ranges:
+            start, end = ranges[-1]
+            if day == end + timedelta(days=1) and (day - start).days < MAX_RANGE_DAYS:
+                ranges[-1] = (start, day)
+                continue
+        ranges.append((day, day))
+    return ranges
+
+
+def _range_distance(day_range: Tuple[date, date], center: date) -> int:
+    start, end = day_range
+    if start <= center <= end:
+        return 0
+    return min(abs((start - center).days), abs((end - center).days))
+
+
+def alternatives_to_storage(alternatives: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Formato compacto de las alternativas para search_snapshots.details"""
+    return [
+        {'date': o['date'].isoformat(), 'days': o['days_from_target'], 'price_cents': o['flight'].price_cents}
+        for o in alternatives
+    ]
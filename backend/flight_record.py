@@ -0,0 +1,140 @@
+# ============================================================================
+# REPRESENTACIÓN COMPACTA DE UN VUELO
+# ============================================================================
+# FlightRecord sustituye a los dicts de ~20 claves que devolvía el parser de
+# Kiwi. Usa __slots__ (sin __dict__ por instancia), guarda el precio en
+# céntimos y comparte (sys.intern) los códigos de aeropuerto, aerolínea y
+# ciudad, que se repiten en casi todos los vuelos de una respuesta.
+#
+# - to_storage(): formato JSONB de search_snapshots.details, solo con lo
+#   necesario para reconstruir una notificación.
+# - to_dict(): formato público de /flights/search (compatible con el anterior).
+# ============================================================================
+
+import sys
+from typing import Any, Dict, List, Optional
+
+# Versión del formato compacto guardado en BD
+STORAGE_VERSION = 1
+
+API_USED = 'kiwi_round_trip'
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class FlightRecord:
+    """
+    Vuelo encontrado en una búsqueda (solo ida del itinerario, que es lo que mostramos).
+    """
+
+    __slots__ = (
+        'id', 'price_cents', 'origin', 'destination', 'origin_city', 'destination_city',
+        'departure_time', 'arrival_time', 'airline', 'stops', 'booking_link',
+        'duration_seconds', 'seats_left', 'cabin_class', 'flight_number',
+    )
+
+    def __init__(self, id: str, price_cents: int, origin: str, destination: str,
+                 departure_time: str, arrival_time: Optional[str], airline: str, stops: int,
+                 booking_link: str, duration_seconds: int, flight_number: str,
+                 origin_city: Optional[str] = None, destination_city: Optional[str] = None,
+                 seats_left: Optional[int] = None, cabin_class: str = 'ECONOMY'):
+        self.id = id
+        self.price_cents = price_cents
+        self.origin = _intern(origin)
+        self.destination = _intern(destination)
+        self.origin_city = _intern(origin_city)
+        self.destination_city = _intern(destination_city)
+        self.departure_time = departure_time
+        self.arrival_time = arrival_time
+        self.airline = _intern(airline)
+        self.stops = stops
+        self.booking_link = booking_link
+        self.duration_seconds = duration_seconds
+        self.seats_left = seats_left
+        self.cabin_class = _intern(cabin_class)
+        self.flight_number = flight_number
+
+    # Propiedades con los nombres que usaban los dicts antiguos
+    @property
+    def price_euros(self) -> float:
+        return self.price_cents / 100
+
+    @property
+    def airlines(self) -> List[str]:
+        return [self.airline]
+
+    @property
+    def flight_duration(self) -> str:
+        hours = self.duration_seconds // 3600
+        minutes = (self.duration_seconds % 3600) // 60
+        return f"PT{hours}H{minutes}M"
+
+    def to_storage(self) -> Dict[str, Any]:
+        """Formato compacto para search_snapshots.details"""
+        return {
+            'v': STORAGE_VERSION,
+            'price_cents': self.price_cents,
+            'origin': self.origin,
+            'destination': self.destination,
+            'departure': self.departure_time,
+            'airline': self.airline,
+            'flight_number': self.flight_number,
+            'stops': self.stops,
+            'duration_s': self.duration_seconds,
+            'booking_link': self.booking_link,
+        }
+
+    @classmethod
+    def from_storage(cls, data: Dict[str, Any]) -> 'FlightRecord':
+        """Reconstruye un vuelo desde BD (formato compacto o dict antiguo completo)"""
+        if data.get('v') == STORAGE_VERSION:
+            return cls(
+                id='', price_cents=data['price_cents'], origin=data['origin'],
+                destination=data['destination'], departure_time=data['departure'],
+                arrival_time=None, airline=data['airline'], stops=data['stops'],
+                booking_link=data['booking_link'], duration_seconds=data['duration_s'],
+                flight_number=data['flight_number'],
+            )
+
+        # Snapshots guardados antes del formato compacto
+        duration = data.get('flight_duration', 'PT0H0M')[2:-1].split('H')
+        return cls(
+            id=data.get('id', ''), price_cents=round(data['price_euros'] * 100),
+            origin=data['origin'], destination=data['destination'],
+            departure_time=data.get('departure_time'), arrival_time=data.get('arrival_time'),
+            airline=(data.get('airlines') or ['Unknown'])[0], stops=data.get('stops', 0),
+            booking_link=data.get('booking_link', 'https://kiwi.com'),
+            duration_seconds=int(duration[0]) * 3600 + int(duration[1]) * 60,
+            flight_number=data.get('flight_number', ''),
+            origin_city=data.get('origin_city'), destination_city=data.get('destination_city'),
+            seats_left=data.get('availability'), cabin_class=data.get('cabin_class', 'ECONOMY'),
+        )
+
+    def to_dict(self, found_at: Optional[str] = None) -> Dict[str, Any]:
+        """Formato público de la API (mismas claves que los dicts anteriores)"""
+        return {
+            'id': self.id,
+            'price_euros': self.price_euros,
+            'origin': self.origin,
+            'destination': self.destination,
+            'origin_city': self.origin_city,
+            'destination_city': self.destination_city,
+            'departure_time': self.departure_time,
+            'arrival_time': self.arrival_time,
+            'airlines': self.airlines,
+            'stops': self.stops,
+            'booking_link': self.booking_link,
+            'found_at': found_at,
+            'api_used': API_USED,
+            'flight_duration': self.flight_duration,
+            'availability': self.seats_left,
+            'validating_airline': self.airline,
+            'cabin_class': self.cabin_class,
+            'flight_number': self.flight_number,
+        }
+
+    def __repr__(self) -> str:
+        return (f"FlightRecord({self.origin}→{self.destination} {self.price_euros:.2f}€ "
+                f"{self.airline} {self.departure_time})")
@@ -0,0 +1,145 @@
+# ============================================================================
+# GRABACIÓN Y REPRODUCCIÓN DEL TRÁFICO CON KIWI (RapidAPI)
+# ============================================================================
+# FlightSearchAPI hace sus peticiones HTTP a través de un "transporte":
+# - live (por defecto): requests.get contra RapidAPI,
+# - record: igual que live, y además guarda cada petición (ruta y parámetros,
+#   sin la API key), el código, la latencia y el cuerpo en un archivo JSONL
+#   comprimido con gzip (FLIGHTS_API_ARCHIVE),
+# - replay: no sale a la red ni necesita API key; responde con lo grabado para
+#   los mismos parámetros, esperando la latencia original multiplicada por
+#   FLIGHTS_REPLAY_LATENCY_SCALE (0 = sin espera). Si una petición se grabó
+#   varias veces, las respuestas se devuelven en el mismo orden (y vuelta a
+#   empezar); una petición no grabada responde 404.
+# Sirve para perfilar el worker y la API de forma repetible sin gastar cuota.
+# Cada proceso que grabe debe usar su propio archivo.
+# ============================================================================
+
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+FLIGHTS_API_MODE = os.getenv('FLIGHTS_API_MODE', 'live').lower()   # live | record | replay
+FLIGHTS_API_ARCHIVE = os.getenv('FLIGHTS_API_ARCHIVE', 'flights_traffic.jsonl.gz')
+FLIGHTS_REPLAY_LATENCY_SCALE = float(os.getenv('FLIGHTS_REPLAY_LATENCY_SCALE', '1'))
+
+
+def request_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+    """Ruta del endpoint y parámetros ordenados (el host puede cambiar entre grabar y reproducir)"""
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return urlparse(url).path + '?' + json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+
+
+class RecordedResponse:
+    """Lo que FlightSearchAPI usa de requests.Response"""
+
+    __slots__ = ('status_code', 'text')
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class LiveTransport:
+    offline = False
+
+    def get(self, url: str, headers: Dict[str, str], params: Dict[str, Any], timeout: float):
+        return requests.get(url, headers=headers, params=params, timeout=timeout)
+
+
+class RecordingTransport(LiveTransport):
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: Dict[str, str], params: Dict[str, Any], timeout: float):
+        started = time.perf_counter()
+        response = requests.get(url, headers=headers, params=params, timeout=timeout)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        body = response.text
+        if response.status_code == 200:
+            # Sin espacios: el archivo ocupa menos incluso antes de comprimir
+            try:
+                body = json.dumps(response.json(), ensure_ascii=False, separators=(',', ':'))
+            except ValueError:
+                pass
+        entry = {'key': request_key(url, params), 'status': response.status_code,
+                 'latency_ms': round(latency_ms, 1), 'body': body}
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, 'ab')
+            self._file.write(line)
+            # Cada entrada queda en disco aunque el proceso muera
+            self._file.flush()
+            self.recorded += 1
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayTransport:
+    offline = True
+
+    def __init__(self, path: str, latency_scale: float = FLIGHTS_REPLAY_LATENCY_SCALE):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['key']].append(entry)
+        logger.info(f"📼 {sum(len(e) for e in self._entries.values())} respuestas de Kiwi cargadas de {path}")
+
+    def get(self, url: str, headers: Dict[str, str], params: Dict[str, Any], timeout: float):
+        key = request_key(url, params)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.stats['misses'] += 1
+                entry = None
+            else:
+                self.stats['hits'] += 1
+                entry = entries[self._positions[key] % len(entries)]
+                self._positions[key] += 1
+
+        if entry is None:
+            logger.warning(f"📼 Petición no grabada: {key}")
+            return RecordedResponse(404, '{"message": "not recorded"}')
+        if self.latency_scale > 0:
+            time.sleep(entry['latency_ms'] / 1000 * self.latency_scale)
+        return RecordedResponse(entry['status'], entry['body'])
+
+
+def create_transport(mode: str = FLIGHTS_API_MODE, path: str = FLIGHTS_API_ARCHIVE):
+    if mode == 'record':
+        logger.info(f"⏺️ Grabando el tráfico con Kiwi en {path}")
+        return RecordingTransport(path)
+    if mode == 'replay':
+        return ReplayTransport(path)
+    return LiveTransport()
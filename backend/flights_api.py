@@ -6,29 +6,108 @@
 # ============================================================================
 
 import os
-import requests
 import logging
 from typing import Dict, List, Optional, Any
 from datetime import datetime, date, timedelta
 import json
 import base64
 
+from backend.flight_record import FlightRecord
+from backend.locations import get_location_index
+from backend.request_timing import track
+from backend.flight_traffic import create_transport
+
 logger = logging.getLogger(__name__)
 
+# Endpoint de RapidAPI Kiwi.com (se cambia para apuntar a un servidor falso en benchmarks)
+KIWI_API_URL = os.getenv('KIWI_API_URL', 'https://kiwi-com-cheap-flights.p.rapidapi.com')
+
+# Máximo de itinerarios que procesamos por respuesta (y que pedimos a la API)
+MAX_ITINERARIES = 12
+
+# Itinerarios que pedimos en una búsqueda por rango de fechas (calendario de precios)
+CALENDAR_LIMIT = 60
+
+# Dict vacío compartido para encadenar .get() sin crear objetos por itinerario
+_EMPTY: Dict[str, Any] = {}
+
+# IDs de Kiwi fijados a mano; el resto se deduce del índice de ubicaciones
+KIWI_LOCATION_OVERRIDES = {
+    'MAD': 'City:madrid_es',
+    'BCN': 'City:barcelona_es',
+    'LHR': 'City:london_gb',
+    'CDG': 'City:paris_fr',
+    'FCO': 'City:rome_it',
+    'AMS': 'City:amsterdam_nl',
+    'FRA': 'City:frankfurt_de',
+    'MUC': 'City:munich_de',
+    'VIE': 'City:vienna_at',
+    'ZUR': 'City:zurich_ch',
+    'JFK': 'City:new-york_us',
+    'LAX': 'City:los-angeles_us',
+    'ORD': 'City:chicago_us',
+    'MIA': 'City:miami_us',
+    'DXB': 'City:dubai_ae',
+    'SIN': 'City:singapore_sg',
+    'NRT': 'City:tokyo_jp',
+    'ICN': 'City:seoul_kr',
+    'PEK': 'City:beijing_cn',
+    'SYD': 'City:sydney_au',
+    'MEL': 'City:melbourne_au',
+    'YYZ': 'City:toronto_ca',
+    'YVR': 'City:vancouver_ca',
+    'GRU': 'City:sao-paulo_br',
+    'GIG': 'City:rio-de-janeiro_br',
+    'BOG': 'City:bogota_co',
+    'LIM': 'City:lima_pe',
+    'SCL': 'City:santiago_cl',
+    'EZE': 'City:buenos-aires_ar'
+}
+
 class FlightSearchAPI:
     """
     Cliente principal para búsqueda de vuelos usando RapidAPI Kiwi.com Cheap Flights
-    300 búsquedas/mes gratis - Datos reales de vuelos de Kiwi.com
+    300 búsquedas/mes gratis - Datos reales de vuelos de Kiwi.com.
+    Las peticiones pasan por un transporte (real, grabando o reproduciendo lo
+    grabado, ver backend/flight_traffic.py).
     """
     
-    def __init__(self):
+    def __init__(self, transport=None):
         self.api_key = os.getenv('RAPIDAPI_KEY')
-        self.base_url = "https://kiwi-com-cheap-flights.p.rapidapi.com"
+        self.base_url = KIWI_API_URL
+        self.transport = transport or create_transport()
+        
+    def close(self):
+        """Cierra el transporte (al grabar, completa el archivo)"""
+        if hasattr(self.transport, 'close'):
+            self.transport.close()
         
     def search_flights(self, origin: str, destination: str, date_from: str, **kwargs) -> Dict[str, Any]:
         """Buscar vuelos usando RapidAPI Kiwi.com Cheap Flights"""
+        # No pedimos más itinerarios de los que vamos a procesar
+        return self._search_round_trip(origin, destination, date_from, {}, min(kwargs.get('limit', 10), MAX_ITINERARIES))
+    
+    def search_date_range(self, origin: str, destination: str, date_start: date, date_end: date,
+                          limit: int = CALENDAR_LIMIT) -> Dict[str, Any]:
+        """
+        Buscar vuelos con salida en cualquier día de [date_start, date_end] en una
+        sola llamada (rango de fechas de Kiwi). Se usa para el calendario de precios
+        de la búsqueda flexible (backend/flex_dates.py). Con 'truncated' la respuesta
+        llegó al límite y un día sin vuelos puede tenerlos fuera de los resultados.
+        """
+        range_params = {
+            'outboundDepartureDateStart': f"{date_start.isoformat()}T00:00:00",
+            'outboundDepartureDateEnd': f"{date_end.isoformat()}T23:59:59",
+        }
+        return self._search_round_trip(origin, destination, date_start.isoformat(), range_params,
+                                       min(limit, CALENDAR_LIMIT), max_itineraries=CALENDAR_LIMIT)
+    
+    def _search_round_trip(self, origin: str, destination: str, date_from: str, extra_params: Dict[str, Any],
+                           limit: int, max_itineraries: int = MAX_ITINERARIES) -> Dict[str, Any]:
+        """Llamada al endpoint round-trip de Kiwi, común a la búsqueda normal y por rango"""
         
-        if not self.api_key:
+        # Reproduciendo tráfico grabado no hace falta API key
+        if not self.api_key and not self.transport.offline:
             logger.warning("No RapidAPI key configured")
             return self._no_api_response(origin, destination, date_from)
         
@@ -54,23 +133,28 @@ class FlightSearchAPI:
                 'sortBy': 'PRICE',
                 'transportTypes': 'FLIGHT',
                 'contentProviders': 'KIWI',
-                'limit': kwargs.get('limit', 10)
+                'limit': limit,
+                **extra_params
             }
             
             logger.info(f"🥝 Kiwi Cheap Flights búsqueda: {source} → {destination_formatted}")
             logger.info(f"Parámetros: {params}")
             
-            response = requests.get(url, headers=headers, params=params, timeout=30)
+            with track('upstream'):
+                response = self.transport.get(url, headers=headers, params=params, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
-                flights = self._process_kiwi_results(data, origin, destination)
+                flights = self._process_kiwi_results(data, origin, destination, max_itineraries)
                 
                 return {
                     'success': True,
                     'flights': flights,
                     'total_results': len(flights),
-                    'api_used': 'kiwi_rapidapi'
+                    # Kiwi devolvió tantos como se pidieron: puede haber más (más caros)
+                    'truncated': len(data.get('itineraries', ())) >= limit,
+                    'api_used': 'kiwi_rapidapi',
+                    'found_at': datetime.now().isoformat()
                 }
             else:
                 logger.error(f"Kiwi Cheap Flights error: {response.status_code} - {response.text}")
@@ -82,119 +166,68 @@ class FlightSearchAPI:
     
     def _format_location_for_kiwi(self, airport_code: str) -> str:
         """Formatear ubicación para RapidAPI Kiwi.com (requiere formato específico)"""
-        # Mapeo de códigos de aeropuerto a formato Kiwi
-        location_mapping = {
-            'MAD': 'City:madrid_es',
-            'BCN': 'City:barcelona_es', 
-            'LHR': 'City:london_gb',
-            'CDG': 'City:paris_fr',
-            'FCO': 'City:rome_it',
-            'AMS': 'City:amsterdam_nl',
-            'FRA': 'City:frankfurt_de',
-            'MUC': 'City:munich_de',
-            'VIE': 'City:vienna_at',
-            'ZUR': 'City:zurich_ch',
-            'JFK': 'City:new-york_us',
-            'LAX': 'City:los-angeles_us',
-            'ORD': 'City:chicago_us',
-            'MIA': 'City:miami_us',
-            'DXB': 'City:dubai_ae',
-            'SIN': 'City:singapore_sg',
-            'NRT': 'City:tokyo_jp',
-            'ICN': 'City:seoul_kr',
-            'PEK': 'City:beijing_cn',
-            'SYD': 'City:sydney_au',
-            'MEL': 'City:melbourne_au',
-            'YYZ': 'City:toronto_ca',
-            'YVR': 'City:vancouver_ca',
-            'GRU': 'City:sao-paulo_br',
-            'GIG': 'City:rio-de-janeiro_br',
-            'BOG': 'City:bogota_co',
-            'LIM': 'City:lima_pe',
-            'SCL': 'City:santiago_cl',
-            'EZE': 'City:buenos-aires_ar'
-        }
+        code = airport_code.upper()
         
         # Si tenemos el mapeo específico, usarlo
-        if airport_code.upper() in location_mapping:
-            return location_mapping[airport_code.upper()]
+        if code in KIWI_LOCATION_OVERRIDES:
+            return KIWI_LOCATION_OVERRIDES[code]
         
-        # Alternativamente, intentar con formato Country
-        country_mapping = {
-            'ES': 'Country:ES',  # España
-            'FR': 'Country:FR',  # Francia
-            'IT': 'Country:IT',  # Italia
-            'DE': 'Country:DE',  # Alemania
-            'GB': 'Country:GB',  # Reino Unido
-            'US': 'Country:US'   # Estados Unidos
-        }
+        # Cualquier otro aeropuerto o código de ciudad del índice IATA
+        location = get_location_index().get(code)
+        if location:
+            return location.kiwi_id
         
         # Como fallback, usar formato City genérico
         return f'City:{airport_code.lower()}'
 
-    def _process_kiwi_results(self, data: Dict, origin: str, destination: str) -> List[Dict]:
-        """Procesar resultados de RapidAPI Kiwi.com Round Trip API"""
+    def _process_kiwi_results(self, data: Dict, origin: str, destination: str,
+                              max_itineraries: int = MAX_ITINERARIES) -> List[FlightRecord]:
+        """
+        Procesar resultados de RapidAPI Kiwi.com Round Trip API.
+        Solo recorre los primeros max_itineraries itinerarios y lee únicamente los
+        campos que usamos; los valores comunes se calculan una vez por respuesta.
+        """
         flights = []
         
-        # La respuesta real tiene esta estructura
-        itineraries = data.get('itineraries', [])
+        # Valores comunes a todos los vuelos de esta respuesta
+        default_origin_city = f'Ciudad {origin}'
+        default_dest_city = f'Ciudad {destination}'
         
-        for i, itinerary in enumerate(itineraries[:12]):  # Máximo 12 resultados
+        for i, itinerary in enumerate(data.get('itineraries', ())[:max_itineraries]):
             try:
-                # Información básica del precio
-                price_info = itinerary.get('price', {})
-                price_eur = float(price_info.get('amount', 200))
-                
-                # Información del vuelo de ida
-                outbound = itinerary.get('outbound', {})
-                outbound_segments = outbound.get('sectorSegments', [])
-                
+                outbound_segments = (itinerary.get('outbound') or _EMPTY).get('sectorSegments')
                 if not outbound_segments:
                     continue
                 
-                first_segment = outbound_segments[0].get('segment', {})
-                
-                # Información de origen y destino
-                source_info = first_segment.get('source', {})
-                dest_info = first_segment.get('destination', {})
-                
-                # Extraer información de aerolínea
-                carrier = first_segment.get('carrier', {})
-                airline = carrier.get('name', 'Unknown')
-                
-                # Extraer ciudades desde la estructura real
-                origin_city = source_info.get('city', {}).get('name', f'Ciudad {origin}')
-                dest_city = dest_info.get('city', {}).get('name', f'Ciudad {destination}')
+                first_segment = outbound_segments[0].get('segment') or _EMPTY
+                source_info = first_segment.get('source') or _EMPTY
+                dest_info = first_segment.get('destination') or _EMPTY
+                carrier = first_segment.get('carrier') or _EMPTY
                 
-                processed_flight = {
-                    'id': f'kiwi_round_{itinerary.get("id", i)}',
-                    'price_euros': float(price_eur),
-                    'origin': origin,
-                    'destination': destination,
-                    'origin_city': origin_city,
-                    'destination_city': dest_city,
-                    'departure_time': source_info.get('localTime', '2025-09-15T08:00:00'),
-                    'arrival_time': dest_info.get('localTime', '2025-09-15T10:30:00'),
-                    'airlines': [airline],
-                    'stops': len(outbound_segments) - 1,
-                    'booking_link': self._extract_booking_link_real(itinerary),
-                    'found_at': datetime.now().isoformat(),
-                    'api_used': 'kiwi_round_trip',
-                    'flight_duration': self._format_duration(first_segment.get('duration', 7200)),
-                    'availability': itinerary.get('lastAvailable', {}).get('seatsLeft', 9),
-                    'validating_airline': airline,
-                    'cabin_class': first_segment.get('cabinClass', 'ECONOMY'),
-                    'flight_number': f"{carrier.get('code', 'XX')}{first_segment.get('code', '000')}"
-                }
-                
-                flights.append(processed_flight)
+                flights.append(FlightRecord(
+                    id=f'kiwi_round_{itinerary.get("id", i)}',
+                    price_cents=round(float((itinerary.get('price') or _EMPTY).get('amount', 200)) * 100),
+                    origin=origin,
+                    destination=destination,
+                    origin_city=(source_info.get('city') or _EMPTY).get('name', default_origin_city),
+                    destination_city=(dest_info.get('city') or _EMPTY).get('name', default_dest_city),
+                    departure_time=source_info.get('localTime', '2025-09-15T08:00:00'),
+                    arrival_time=dest_info.get('localTime', '2025-09-15T10:30:00'),
+                    airline=carrier.get('name', 'Unknown'),
+                    stops=len(outbound_segments) - 1,
+                    booking_link=self._extract_booking_link_real(itinerary),
+                    duration_seconds=first_segment.get('duration', 7200),
+                    seats_left=(itinerary.get('lastAvailable') or _EMPTY).get('seatsLeft', 9),
+                    cabin_class=first_segment.get('cabinClass', 'ECONOMY'),
+                    flight_number=f"{carrier.get('code', 'XX')}{first_segment.get('code', '000')}"
+                ))
                 
             except Exception as e:
                 logger.error(f"Error procesando itinerario Kiwi: {e}")
                 continue
         
         # Ordenar por precio
-        flights.sort(key=lambda x: x.get('price_euros', 9999))
+        flights.sort(key=lambda f: f.price_cents)
         return flights
     
     def _extract_booking_link_real(self, itinerary: Dict) -> str:
@@ -207,12 +240,6 @@ class FlightSearchAPI:
                 return f"https://kiwi.com{booking_url}"
         return 'https://kiwi.com'
     
-    def _format_duration(self, duration_seconds: int) -> str:
-        """Formatear duración en segundos a formato legible"""
-        hours = duration_seconds // 3600
-        minutes = (duration_seconds % 3600) // 60
-        return f"PT{hours}H{minutes}M"
-    
     def _format_date_for_kiwi(self, date_str: str) -> str:
         """Kiwi usa formato DD/MM/YYYY"""
         try:
@@ -251,32 +278,15 @@ class FlightSearchAPI:
             'api_used': 'rapidapi_error'
         }
     
-    def get_locations(self, query: str) -> Dict[str, Any]:
+    def get_locations(self, query: str, limit: int = 5) -> Dict[str, Any]:
         """
-        Búsqueda básica de ubicaciones (códigos IATA comunes)
+        Búsqueda de aeropuertos/ciudades por nombre, ciudad o código IATA
+        (sin tildes, tolerante a erratas) sobre el índice de backend/locations.py
         """
-        mock_locations = {
-            'madrid': [{'code': 'MAD', 'name': 'Madrid-Barajas Airport', 'city': 'Madrid', 'country': 'Spain'}],
-            'barcelona': [{'code': 'BCN', 'name': 'Barcelona-El Prat Airport', 'city': 'Barcelona', 'country': 'Spain'}],
-            'london': [{'code': 'LHR', 'name': 'Heathrow Airport', 'city': 'London', 'country': 'United Kingdom'}],
-            'paris': [{'code': 'CDG', 'name': 'Charles de Gaulle Airport', 'city': 'Paris', 'country': 'France'}],
-            'rome': [{'code': 'FCO', 'name': 'Fiumicino Airport', 'city': 'Rome', 'country': 'Italy'}],
-            'amsterdam': [{'code': 'AMS', 'name': 'Schiphol Airport', 'city': 'Amsterdam', 'country': 'Netherlands'}],
-            'frankfurt': [{'code': 'FRA', 'name': 'Frankfurt Airport', 'city': 'Frankfurt', 'country': 'Germany'}],
-            'new york': [{'code': 'JFK', 'name': 'Kennedy Airport', 'city': 'New York', 'country': 'United States'}],
-            'los angeles': [{'code': 'LAX', 'name': 'Los Angeles Airport', 'city': 'Los Angeles', 'country': 'United States'}],
-        }
-        
-        query_lower = query.lower()
-        locations = []
-        
-        for city, location_list in mock_locations.items():
-            if query_lower in city:
-                locations.extend(location_list)
-        
+        locations = get_location_index().search(query, limit)
         return {
             'success': True,
-            'locations': locations[:5]  # Máximo 5 resultados
+            'locations': [location.to_public() for location in locations]
         }
 
 # Instancia global
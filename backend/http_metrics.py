@@ -0,0 +1,242 @@
+# ============================================================================
+# MÉTRICAS Y PROFILING DE PETICIONES DE LA API
+# ============================================================================
+# - RequestMetricsMiddleware mide cada petición hasta que empieza la respuesta
+#   (incluye la serialización del JSON; en los streams SSE, hasta abrirlos) y
+#   la registra por ruta (plantilla, p. ej. /alerts/{alert_id}) junto con el
+#   tiempo de BD, del proveedor de vuelos y de serialización que acumuló
+#   backend/request_timing.py. Se exponen en GET /metrics (formato Prometheus).
+# - Con PROFILE_SLOW_REQUEST_MS > 0, un hilo muestrea cada
+#   PROFILE_SAMPLE_INTERVAL_MS las pilas de los hilos que ejecutan endpoints y,
+#   si la petición supera el umbral, vuelca sus muestras en PROFILE_DIR en
+#   formato "folded" (flamegraph.pl, speedscope, inferno...). Los endpoints
+#   async se muestrean en el hilo del bucle, que comparten con otras peticiones.
+# ============================================================================
+
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from functools import wraps
+from typing import Deque, Dict, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from backend import metrics
+from backend import request_timing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SLOW_REQUEST_MS = float(os.getenv('PROFILE_SLOW_REQUEST_MS', '0'))   # 0 = desactivado
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/profiles')
+PROFILE_MAX_DUMPS = int(os.getenv('PROFILE_MAX_DUMPS', '100'))
+
+UNMATCHED_ROUTE = 'unmatched'
+
+registry = metrics.Registry()
+request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'Latencia de las peticiones hasta el inicio de la respuesta', ['method', 'route'])
+phase_seconds = registry.histogram(
+    'http_request_phase_seconds', 'Tiempo de cada petición en BD, proveedor de vuelos y serialización',
+    ['route', 'phase'])
+requests_total = registry.counter(
+    'http_requests_total', 'Peticiones por ruta y código de respuesta', ['method', 'route', 'status'])
+in_progress = registry.gauge('http_requests_in_progress', 'Peticiones en curso')
+slow_dumps = registry.counter('http_slow_request_profiles_total', 'Perfiles de peticiones lentas volcados')
+
+
+class TimedJSONResponse(JSONResponse):
+    """Respuesta JSON por defecto de la app: el render cuenta como 'serialize'"""
+
+    def render(self, content) -> bytes:
+        with request_timing.track('serialize'):
+            return super().render(content)
+
+
+# ============================================================================
+# PROFILER DE PETICIONES LENTAS
+# ============================================================================
+
+def _fold(frame) -> str:
+    """Pila de un hilo en formato folded (raíz primero, separada por ';')"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class _Profile:
+    __slots__ = ('timings', 'samples')
+
+    def __init__(self, timings: request_timing.RequestTimings):
+        self.timings = timings
+        self.samples: Counter = Counter()
+
+
+class SlowRequestProfiler:
+    """Muestrea las pilas de las peticiones en curso; vuelca las que superan threshold"""
+
+    def __init__(self, threshold_seconds: float, interval_seconds: float, output_dir: str,
+                 max_dumps: int = PROFILE_MAX_DUMPS):
+        self.threshold = threshold_seconds
+        self.interval = interval_seconds
+        self.output_dir = output_dir
+        self.max_dumps = max_dumps
+        self._active: Dict[int, _Profile] = {}
+        self._dumps: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, timings: request_timing.RequestTimings) -> _Profile:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    os.makedirs(self.output_dir, exist_ok=True)
+                    self._thread = threading.Thread(target=self._sample_forever, name='request-profiler', daemon=True)
+                    self._thread.start()
+        profile = _Profile(timings)
+        with self._lock:
+            self._active[id(profile)] = profile
+        return profile
+
+    def finish(self, profile: _Profile, method: str, route: str, seconds: float) -> Optional[str]:
+        with self._lock:
+            self._active.pop(id(profile), None)
+        if seconds < self.threshold or not profile.samples:
+            return None
+        return self._dump(profile, method, route, seconds)
+
+    def _sample_forever(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                for ident in list(profile.timings.threads):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        profile.samples[_fold(frame)] += 1
+
+    def _dump(self, profile: _Profile, method: str, route: str, seconds: float) -> str:
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(self.output_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{method}-{slug}-{seconds * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        slow_dumps.inc()
+        logger.warning(f"🐢 {method} {route} tardó {seconds * 1000:.0f}ms; perfil en {path}")
+
+        with self._lock:
+            self._dumps.append(path)
+            expired = self._dumps.popleft() if len(self._dumps) > self.max_dumps else None
+        if expired:
+            try:
+                os.remove(expired)
+            except OSError:
+                pass
+        return path
+
+
+profiler = SlowRequestProfiler(PROFILE_SLOW_REQUEST_MS / 1000, PROFILE_SAMPLE_INTERVAL_MS / 1000, PROFILE_DIR) \
+    if PROFILE_SLOW_REQUEST_MS > 0 else None
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Ruta que apunta en la petición el hilo que ejecuta el endpoint (el del
+    threadpool para los síncronos) para que el profiler sepa qué pila muestrear.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if profiler is not None:
+            endpoint = _bind_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _bind_thread(endpoint):
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timings = request_timing.current()
+            if timings is not None:
+                timings.threads.add(threading.get_ident())
+            return await endpoint(*args, **kwargs)
+    else:
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timings = request_timing.current()
+            ident = threading.get_ident()
+            if timings is not None:
+                timings.threads.add(ident)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if timings is not None:
+                    timings.threads.discard(ident)
+    return wrapper
+
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+class RequestMetricsMiddleware:
+    """Middleware ASGI: latencia por ruta, subtiempos por fase y profiling opcional"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = request_timing.begin()
+        timings = request_timing.current()
+        profile = profiler.begin(timings) if profiler else None
+        started = time.perf_counter()
+        recorded = False
+        in_progress.inc()
+
+        def record(status: int):
+            # Una sola vez, al empezar la respuesta: las BackgroundTasks que se
+            # ejecutan después no cuentan en la latencia de la petición
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            seconds = time.perf_counter() - started
+            in_progress.dec()
+            route = scope.get('route')
+            path = getattr(route, 'path', UNMATCHED_ROUTE)
+            method = scope['method']
+            request_seconds.labels(method, path).observe(seconds)
+            requests_total.labels(method, path, status).inc()
+            for phase, phase_total in list(timings.phases.items()):
+                phase_seconds.labels(path, phase).observe(phase_total)
+            if profile is not None:
+                profiler.finish(profile, method, path, seconds)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                record(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record(500)
+            request_timing.end(token)
@@ -0,0 +1,234 @@
+# ============================================================================
+# COLA DE TRABAJOS EN SEGUNDO PLANO (BÚSQUEDAS BAJO DEMANDA)
+# ============================================================================
+# Los endpoints /check-now y /alerts/{id}/search-real encolan aquí la búsqueda
+# y devuelven un job_id al momento. El estado se consulta en GET /jobs/{job_id}.
+# Cola en proceso: los trabajos se pierden si el backend se reinicia.
+# ============================================================================
+
+import os
+import json
+import uuid
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from backend import db
+from backend import events
+from backend import price_calendar
+from backend import price_stats
+from backend.flights_api import flights_api
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+
+class JobQueue:
+    """
+    Cola ligera en memoria con un pool de hilos y estado consultable por job_id.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> str:
+        """Encola un trabajo y devuelve su id"""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "created_at": datetime.datetime.now().isoformat(),
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+        self._executor.submit(self._run, job_id, fn, *args, **kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Devuelve una copia del estado del trabajo o None si no existe"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id: str, fn: Callable[..., Any], *args, **kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status="done", result=result)
+        except Exception as e:
+            logger.error(f"❌ Trabajo {job_id} fallido: {e}")
+            self._update(job_id, status="failed", error=str(e))
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job.update(fields)
+            if fields.get("status") in ("done", "failed"):
+                job["finished_at"] = datetime.datetime.now().isoformat()
+
+    def _evict_expired(self):
+        """Olvida los trabajos terminados hace más de ttl_seconds (llamar con el lock)"""
+        limit = datetime.datetime.now() - datetime.timedelta(seconds=self.ttl_seconds)
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] and datetime.datetime.fromisoformat(job["finished_at"]) < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Instancia global
+job_queue = JobQueue()
+
+
+# ============================================================================
+# TRABAJO: BÚSQUEDA REAL PARA UNA ALERTA
+# ============================================================================
+
+def run_alert_search(alert_id: int, notify: bool = False) -> Dict[str, Any]:
+    """
+    Busca vuelos para una alerta y guarda el snapshot.
+    Nunca mantiene una conexión a BD abierta mientras se llama a la API de vuelos.
+    """
+    # 1. Leer la alerta y cerrar la conexión
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT a.user_id, a.origin, a.destination, a.date_from, a.date_to, a.max_stops, u.telegram_id
+            FROM alerts a
+            JOIN users u ON a.user_id = u.id
+            WHERE a.id = %s AND a.active = TRUE AND a.deleted_at IS NULL;
+            """,
+            (alert_id,)
+        )
+        alert_data = cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+
+    if not alert_data:
+        raise ValueError("Alerta no encontrada o inactiva")
+
+    user_id, origin, destination, date_from, date_to, max_stops, telegram_id = alert_data
+
+    # 2. Búsqueda en la API externa, sin conexión abierta
+    search_result = flights_api.search_flights(
+        origin=origin,
+        destination=destination,
+        date_from=date_from.strftime('%d/%m/%Y'),
+        return_from=date_to.strftime('%d/%m/%Y') if date_to else None,
+        max_stopovers=max_stops or 2,
+        limit=5
+    )
+
+    if not search_result['success']:
+        raise RuntimeError(f"Error buscando vuelos: {search_result.get('error')}")
+
+    flights = search_result['flights']
+    best_flight = min(flights, key=lambda f: f.price_cents) if flights else None
+
+    if best_flight:
+        best_price_cents = best_flight.price_cents
+        details = {
+            "flights_found": len(flights),
+            "best_flight": best_flight.to_storage(),
+            "api_used": search_result.get('api_used')
+        }
+    else:
+        best_price_cents = None
+        details = {"message": "No flights found"}
+
+    # 3. Guardar el snapshot con una conexión nueva y corta
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        found_at = datetime.datetime.now()
+        cur.execute(
+            """
+            INSERT INTO search_snapshots (alert_id, price_cents, found_at, details)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id;
+            """,
+            (alert_id, best_price_cents, found_at, json.dumps(details))
+        )
+        snapshot_id = cur.fetchone()[0]
+        price_calendar.record_flights(cur, origin, destination, flights)
+        price_stats.update_stats(cur, alert_id, origin, destination, best_price_cents, found_at)
+        events.notify_price_event(cur, user_id, alert_id, "snapshot", best_price_cents, snapshot_id=snapshot_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    result = {
+        "alert_id": alert_id,
+        "flights_found": len(flights),
+        "snapshot_id": snapshot_id,
+        "api_used": search_result.get('api_used'),
+        "best_price_euros": best_flight.price_euros if best_flight else None,
+        "best_flight": {
+            "price": best_flight.price_euros,
+            "origin": best_flight.origin,
+            "destination": best_flight.destination,
+            "departure": best_flight.departure_time,
+            "airline": best_flight.airline,
+            "stops": best_flight.stops,
+            "booking_link": best_flight.booking_link
+        } if best_flight else None,
+    }
+
+    # 4. Opcionalmente, avisar al usuario por Telegram
+    if notify:
+        result["notified"] = _push_result_to_telegram(telegram_id, origin, destination, result)
+
+    return result
+
+
+def _push_result_to_telegram(telegram_id: int, origin: str, destination: str, result: Dict[str, Any]) -> bool:
+    """Envía el resultado de la búsqueda al chat de Telegram del usuario"""
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    if not token:
+        logger.warning("⚠️ No hay token de Telegram configurado")
+        return False
+
+    best = result["best_flight"]
+    if best:
+        message = f"🔎 **Búsqueda manual completada** ✈️\n\n"
+        message += f"**Ruta:** {origin} → {destination}\n"
+        message += f"**Mejor precio:** {best['price']:.2f}€\n"
+        message += f"**Aerolínea:** {best['airline']}\n"
+        message += f"**Escalas:** {best['stops']}\n\n"
+        message += f"🔗 **[RESERVAR AHORA]({best['booking_link']})**"
+    else:
+        message = f"🔎 Búsqueda manual {origin} → {destination}: no se encontraron vuelos."
+
+    try:
+        response = requests.post(
+            f"https://api.telegram.org/bot{token}/sendMessage",
+            json={'chat_id': telegram_id, 'text': message, 'parse_mode': 'Markdown'},
+            timeout=10
+        )
+        return response.status_code == 200
+    except Exception as e:
+        logger.error(f"❌ Error enviando resultado por Telegram: {e}")
+        return False
@@ -0,0 +1,478 @@
+# ============================================================================
+# ÍNDICE DE AEROPUERTOS Y CIUDADES (IATA)
+# ============================================================================
+# Carga una sola vez backend/data/locations.csv (~8k aeropuertos y códigos de
+# ciudad) y los alias en español de location_aliases.csv, y construye un
+# array ordenado de claves normalizadas (sin tildes, minúsculas) para:
+# - búsqueda por prefijo con bisect sobre código IATA, ciudad, nombre, alias
+#   y cada palabra del nombre,
+# - búsqueda tolerante a erratas (distancia de edición 1) como respaldo,
+# - mapeo de cualquier código IATA a su ID de ubicación de Kiwi.
+#
+# El mismo índice se puede precompilar a un fichero binario
+# (backend/data/locations.idx, con tools/build_locations_index.py) que se abre
+# con mmap: arrays de claves ordenadas + offsets, búsqueda binaria directamente
+# sobre el fichero y nada que construir al arrancar. API, worker y bot
+# comparten esas páginas a través de la caché del sistema operativo. Si los
+# CSV han cambiado desde que se compiló, se ignora y se construye en memoria.
+# ============================================================================
+
+import os
+import re
+import csv
+import sys
+import mmap
+import array
+import bisect
+import struct
+import hashlib
+import logging
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+LOCATIONS_CSV = os.path.join(DATA_DIR, 'locations.csv')
+ALIASES_CSV = os.path.join(DATA_DIR, 'location_aliases.csv')
+LOCATIONS_IDX = os.path.join(DATA_DIR, 'locations.idx')
+
+# Tipos de clave, de más a menos relevante cuando coinciden igual de bien
+KEY_CODE, KEY_ALIAS, KEY_CITY, KEY_NAME, KEY_TOKEN = range(5)
+
+# Cada clave guarda (id de ubicación << KIND_BITS) | tipo de clave
+KIND_BITS = 3
+KIND_MASK = (1 << KIND_BITS) - 1
+
+# Cuántas claves con el mismo prefijo se revisan como máximo ("a", "ma"...)
+MAX_PREFIX_SCAN = 2000
+
+# Palabras de los nombres que no sirven como clave de búsqueda
+STOPWORDS = {'airport', 'international', 'intl', 'aeropuerto', 'de', 'del', 'the', 'and', 'city',
+             'regional', 'municipal', 'field', 'airfield', 'todos', 'los', 'aeropuertos'}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+logger = logging.getLogger(__name__)
+
+
+class Location(NamedTuple):
+    code: str
+    kind: str  # 'airport' o 'city'
+    name: str
+    city: str
+    country_code: str
+    country: str
+    rank: int
+
+    @property
+    def kiwi_id(self) -> str:
+        """
+        ID de ubicación de Kiwi (formato City:<ciudad>_<país>). Sin ciudad (aeródromos
+        pequeños) se usa el formato genérico City:<código>, como para códigos desconocidos.
+        """
+        slug = normalize(self.city).replace(' ', '-')
+        if not slug:
+            return f"City:{self.code.lower()}"
+        return f"City:{slug}_{self.country_code.lower()}"
+
+    def to_public(self) -> Dict[str, str]:
+        return {
+            'code': self.code,
+            'name': self.name,
+            'city': self.city,
+            'country': self.country,
+            'type': self.kind,
+        }
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con un solo espacio entre palabras"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(_NON_ALNUM.sub(' ', text).split())
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Distancia de Damerau-Levenshtein (transposiciones adyacentes incluidas).
+    Devuelve max_distance + 1 en cuanto se sabe que la supera.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class _BaseLocationIndex:
+    """
+    Búsqueda común a los dos almacenamientos. Las subclases aportan:
+    - locations: secuencia de Location por id (ordenadas por código)
+    - _ranks: importancia de cada ubicación
+    - _keys / _meta: claves normalizadas ordenadas y su (id << KIND_BITS) | tipo
+    - _fuzzy_keys y _postings(variante): índice de borrados para las erratas
+    """
+
+    locations: Sequence[Location]
+    _ranks: Sequence[int]
+    _keys: Sequence[str]
+    _meta: Sequence[int]
+    _fuzzy_keys: Sequence[str]
+
+    def __init__(self):
+        self.search = lru_cache(maxsize=4096)(self._search)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def get(self, code: str) -> Optional[Location]:
+        raise NotImplementedError
+
+    def _postings(self, variant: str) -> Iterable[int]:
+        raise NotImplementedError
+
+    def _search(self, query: str, limit: int = 5) -> List[Location]:
+        """
+        Ubicaciones que mejor encajan con la consulta, ordenadas por relevancia:
+        coincidencia exacta > prefijo > errata, y dentro de cada nivel, por importancia del aeropuerto.
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        # Por ubicación, la mejor (nivel, -importancia, tipo de clave). Niveles:
+        # 0 = coincidencia exacta de código, alias, ciudad o nombre completo;
+        # 1 = prefijo o palabra suelta del nombre; 2 = errata
+        best: Dict[int, Tuple[int, int, int]] = {}
+
+        def consider(meta: int, tier: int):
+            loc_id, kind = meta >> KIND_BITS, meta & KIND_MASK
+            if tier == 0 and kind == KEY_TOKEN:
+                tier = 1
+            score = (tier, -self._ranks[loc_id], kind)
+            current = best.get(loc_id)
+            if current is None or score < current:
+                best[loc_id] = score
+
+        # 1. Prefijo (incluye coincidencia exacta) con bisect sobre las claves ordenadas
+        start = bisect.bisect_left(self._keys, q)
+        end = min(len(self._keys), start + MAX_PREFIX_SCAN)
+        for pos in range(start, end):
+            key = self._keys[pos]
+            if not key.startswith(q):
+                break
+            consider(self._meta[pos], 0 if len(key) == len(q) else 1)
+
+        # 2. Erratas, solo si no hay ninguna coincidencia por prefijo
+        if not best and len(q) >= 4:
+            for key, _ in self._fuzzy_keys_near(q):
+                pos = bisect.bisect_left(self._keys, key)
+                while pos < len(self._keys) and self._keys[pos] == key:
+                    consider(self._meta[pos], 2)
+                    pos += 1
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))
+        return [self.locations[loc_id] for loc_id, _ in ranked[:limit]]
+
+    def _fuzzy_keys_near(self, q: str, max_distance: int = 1):
+        """Claves a distancia de edición <= max_distance de la consulta"""
+        candidates = set()
+        for variant in {q} | _deletions(q):
+            candidates.update(self._postings(variant))
+        for key_id in candidates:
+            key = self._fuzzy_keys[key_id]
+            distance = edit_distance(q, key, max_distance)
+            if distance <= max_distance:
+                yield key, distance
+
+
+class LocationIndex(_BaseLocationIndex):
+    """
+    Índice en memoria, construido a partir de los CSV.
+    """
+
+    def __init__(self, locations: List[Location], aliases: Iterable[Tuple[str, str]] = ()):
+        super().__init__()
+        # El id de cada ubicación es su posición por código (igual que en el fichero binario)
+        self.locations = sorted(locations, key=lambda loc: loc.code)
+        self._ranks = [loc.rank for loc in self.locations]
+        self._by_code: Dict[str, int] = {loc.code: i for i, loc in enumerate(self.locations)}
+
+        entries = set()
+        for i, loc in enumerate(self.locations):
+            entries.add((loc.code.lower(), KEY_CODE, i))
+            entries.add((normalize(loc.city), KEY_CITY, i))
+            entries.add((normalize(loc.name), KEY_NAME, i))
+            for token in set(normalize(f"{loc.name} {loc.city}").split()):
+                if len(token) >= 3 and token not in STOPWORDS:
+                    entries.add((token, KEY_TOKEN, i))
+        for alias, code in aliases:
+            if code in self._by_code:
+                entries.add((normalize(alias), KEY_ALIAS, self._by_code[code]))
+
+        ordered = sorted(entry for entry in entries if entry[0])
+        self._keys = [key for key, _, _ in ordered]
+        self._meta = [(loc_id << KIND_BITS) | kind for _, kind, loc_id in ordered]
+
+        # Para la búsqueda con erratas (estilo SymSpell): cada clave de una palabra
+        # (ciudad, alias o palabra del nombre) registrada con todas sus variantes
+        # de un carácter borrado. Dos claves a distancia <= 1 comparten variante.
+        self._deletes: Dict[str, List[int]] = {}
+        fuzzy_keys = {key for key, kind, _ in ordered if kind != KEY_CODE and len(key) >= 4 and ' ' not in key}
+        self._fuzzy_keys = sorted(fuzzy_keys)
+        for key_id, key in enumerate(self._fuzzy_keys):
+            for variant in {key} | _deletions(key):
+                self._deletes.setdefault(variant, []).append(key_id)
+
+    def get(self, code: str) -> Optional[Location]:
+        loc_id = self._by_code.get(code.upper())
+        return self.locations[loc_id] if loc_id is not None else None
+
+    def _postings(self, variant: str) -> Iterable[int]:
+        return self._deletes.get(variant, ())
+
+
+# ============================================================================
+# ÍNDICE PRECOMPILADO (FICHERO BINARIO + MMAP)
+# ============================================================================
+# Formato (enteros uint32 little-endian, secciones alineadas a 4 bytes):
+#   cabecera: MAGIC, digest de los CSV de origen y (offset, longitud) de cada
+#             sección de INDEX_SECTIONS
+#   *_offsets: n+1 offsets dentro del *_blob correspondiente (UTF-8)
+#   loc_blob: code\x1fkind\x1fname\x1fcity\x1fcountry_code\x1fcountry por ubicación
+#   loc_ranks: un byte por ubicación
+#   key_meta: (id << KIND_BITS) | tipo por clave
+#   del_*: variantes con un carácter borrado, ordenadas; post_offsets/postings
+#          apuntan a los ids de fuzzy_* que comparten cada variante
+# ============================================================================
+
+INDEX_MAGIC = b'LOCIDX01'
+INDEX_SECTIONS = (
+    'loc_offsets', 'loc_blob', 'loc_ranks',
+    'key_offsets', 'key_blob', 'key_meta',
+    'fuzzy_offsets', 'fuzzy_blob',
+    'del_offsets', 'del_blob', 'post_offsets', 'postings',
+)
+_HEADER = struct.Struct(f'<8s16s{2 * len(INDEX_SECTIONS)}I')
+_FIELD_SEP = '\x1f'
+
+
+def source_digest(paths: Iterable[str] = (LOCATIONS_CSV, ALIASES_CSV)) -> bytes:
+    """Huella de los CSV de origen, para saber si el fichero binario está al día"""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.digest()[:16]
+
+
+def _pack_strings(strings: Iterable[str]) -> Tuple[array.array, bytes]:
+    offsets = array.array('I', [0])
+    blob = bytearray()
+    for value in strings:
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def write_index_file(index: LocationIndex, path: str, digest: bytes = b'') -> int:
+    """Serializa un LocationIndex al formato binario. Devuelve el tamaño en bytes."""
+    if sys.byteorder != 'little':
+        raise RuntimeError("El formato binario de ubicaciones asume little-endian")
+
+    variants = sorted(index._deletes)
+    sections = {}
+    sections['loc_offsets'], sections['loc_blob'] = _pack_strings(
+        _FIELD_SEP.join((loc.code, loc.kind, loc.name, loc.city, loc.country_code, loc.country))
+        for loc in index.locations
+    )
+    sections['loc_ranks'] = bytes(index._ranks)
+    sections['key_offsets'], sections['key_blob'] = _pack_strings(index._keys)
+    sections['key_meta'] = array.array('I', index._meta)
+    sections['fuzzy_offsets'], sections['fuzzy_blob'] = _pack_strings(index._fuzzy_keys)
+    sections['del_offsets'], sections['del_blob'] = _pack_strings(variants)
+    postings = array.array('I')
+    post_offsets = array.array('I', [0])
+    for variant in variants:
+        postings.extend(index._deletes[variant])
+        post_offsets.append(len(postings))
+    sections['post_offsets'], sections['postings'] = post_offsets, postings
+
+    body = bytearray()
+    layout = []
+    for name in INDEX_SECTIONS:
+        data = bytes(sections[name])
+        layout += [_HEADER.size + len(body), len(data)]
+        body += data + b'\0' * (-len(data) % 4)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, digest.ljust(16, b'\0'), *layout))
+        f.write(body)
+    os.replace(tmp_path, path)
+    return _HEADER.size + len(body)
+
+
+class _StringArray:
+    """Secuencia de strings sobre (offsets, blob) del fichero, sin copiarlos a memoria"""
+
+    __slots__ = ('_offsets', '_blob')
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+
+class _LocationArray:
+    """Secuencia de Location decodificadas bajo demanda desde el fichero"""
+
+    __slots__ = ('_records', '_ranks')
+
+    def __init__(self, records: _StringArray, ranks: memoryview):
+        self._records = records
+        self._ranks = ranks
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, i: int) -> Location:
+        code, kind, name, city, country_code, country = self._records[i].split(_FIELD_SEP)
+        return Location(code, kind, name, city, country_code, country, self._ranks[i])
+
+
+class _CodeArray:
+    """Códigos IATA de las ubicaciones del fichero, para la búsqueda binaria de get()"""
+
+    __slots__ = ('_records',)
+
+    def __init__(self, locations: _LocationArray):
+        self._records = locations._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, i: int) -> str:
+        records = self._records
+        start = records._offsets[i]
+        return str(records._blob[start:start + 3], 'ascii')
+
+
+class MappedLocationIndex(_BaseLocationIndex):
+    """
+    Índice leído directamente de locations.idx con mmap. Abrirlo solo lee la
+    cabecera; las páginas se cargan (y se comparten entre procesos) al buscar.
+    """
+
+    def __init__(self, path: str = LOCATIONS_IDX):
+        super().__init__()
+        if sys.byteorder != 'little':
+            raise RuntimeError("El formato binario de ubicaciones asume little-endian")
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self._mmap)
+        if header[0] != INDEX_MAGIC:
+            raise ValueError(f"{path} no es un índice de ubicaciones válido")
+        self.digest = header[1]
+
+        view = memoryview(self._mmap)
+        raw = {
+            name: view[header[2 + 2 * i]:header[2 + 2 * i] + header[3 + 2 * i]]
+            for i, name in enumerate(INDEX_SECTIONS)
+        }
+        u32 = {name: raw[name].cast('I') for name in
+               ('loc_offsets', 'key_offsets', 'key_meta', 'fuzzy_offsets', 'del_offsets', 'post_offsets', 'postings')}
+
+        self._ranks = raw['loc_ranks']
+        self.locations = _LocationArray(_StringArray(u32['loc_offsets'], raw['loc_blob']), self._ranks)
+        self._keys = _StringArray(u32['key_offsets'], raw['key_blob'])
+        self._meta = u32['key_meta']
+        self._fuzzy_keys = _StringArray(u32['fuzzy_offsets'], raw['fuzzy_blob'])
+        self._variants = _StringArray(u32['del_offsets'], raw['del_blob'])
+        self._post_offsets = u32['post_offsets']
+        self._postings_view = u32['postings']
+        # Los registros empiezan por el código IATA (3 letras) y están ordenados por código
+        self._codes = _CodeArray(self.locations)
+
+    def get(self, code: str) -> Optional[Location]:
+        code = code.upper()
+        pos = bisect.bisect_left(self._codes, code)
+        if pos < len(self._codes) and self._codes[pos] == code:
+            return self.locations[pos]
+        return None
+
+    def _postings(self, variant: str) -> Iterable[int]:
+        pos = bisect.bisect_left(self._variants, variant)
+        if pos < len(self._variants) and self._variants[pos] == variant:
+            return self._postings_view[self._post_offsets[pos]:self._post_offsets[pos + 1]]
+        return ()
+
+
+def _deletions(word: str) -> set:
+    """Variantes de la palabra con un carácter borrado"""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def load_locations(path: str = LOCATIONS_CSV) -> List[Location]:
+    with open(path, newline='', encoding='utf-8') as f:
+        return [
+            Location(row['code'], row['kind'], row['name'], row['city'],
+                     row['country_code'], row['country'], int(row['rank']))
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_aliases(path: str = ALIASES_CSV) -> List[Tuple[str, str]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['alias'], row['code']) for row in csv.DictReader(f)]
+
+
+_index: Optional[LocationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_location_index() -> _BaseLocationIndex:
+    """
+    Índice global, abierto la primera vez que se usa: el fichero binario si
+    existe y se compiló con los CSV actuales, o construido en memoria desde
+    los CSV si no.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _open_mapped_index(LOCATIONS_IDX)
+                if _index is None:
+                    _index = LocationIndex(load_locations(), load_aliases())
+    return _index
+
+
+def _open_mapped_index(path: str) -> Optional[MappedLocationIndex]:
+    """El índice precompilado, o None si no existe o no corresponde a los CSV de origen"""
+    if not os.path.exists(path):
+        return None
+    mapped = MappedLocationIndex(path)
+    if mapped.digest != source_digest():
+        logger.warning(f"⚠️ {path} no corresponde a los CSV actuales; se usa el índice en memoria "
+                       f"(regenerar con tools/build_locations_index.py)")
+        return None
+    return mapped
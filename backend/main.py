@@ -1,4 +1,5 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, BackgroundTasks, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -7,8 +8,18 @@ import datetime
 from backend import db
 import json
 import os
+import asyncio
+import threading
 from dotenv import load_dotenv
 from backend.flights_api import flights_api, search_flights_for_alert
+from backend import purge
+from backend import jobs
+from backend import events
+from backend.flex_dates import FlexDateSearch
+from backend.price_calendar import PriceCalendarStore
+from backend import price_stats
+from backend import metrics
+from backend import http_metrics
 
 # Cargar variables de entorno
 load_dotenv()
@@ -17,15 +28,67 @@ load_dotenv()
 app = FastAPI(
     title="Bot Agente Viajes API",
     description="API REST para gestión de alertas de vuelos",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=http_metrics.TimedJSONResponse
 )
 
+# Latencia por ruta con tiempos de BD, proveedor y serialización (GET /metrics)
+# y, con PROFILE_SLOW_REQUEST_MS, perfiles de las peticiones lentas
+app.router.route_class = http_metrics.ProfiledRoute
+app.add_middleware(http_metrics.RequestMetricsMiddleware)
+
+# Calendario de precios por ruta y día (tabla price_calendar) y búsqueda con
+# fechas flexibles sobre él (caché por día compartida por todas las peticiones)
+price_calendar_store = PriceCalendarStore(db.get_connection)
+flex_search = FlexDateSearch(flights_api, store=price_calendar_store)
+
+# Al arrancar, terminar en segundo plano las purgas que quedaron pendientes
+@app.on_event("startup")
+def resume_pending_purges():
+    threading.Thread(target=purge.purge_pending_deletions, daemon=True).start()
+
+
+# Escuchar los eventos de precios que publica el worker (LISTEN/NOTIFY)
+@app.on_event("startup")
+async def start_price_listener():
+    events.listener.start(asyncio.get_running_loop())
+
+
+@app.on_event("shutdown")
+async def stop_price_listener():
+    events.listener.stop()
+
+
+# Bot de Telegram en modo webhook dentro del mismo proceso (opcional): los
+# updates llegan a /telegram/webhook (ver backend/telegram_webhook.py)
+if os.getenv('BOT_WEBHOOK_MOUNT', 'false').lower() == 'true':
+    from backend.telegram_webhook import create_webhook
+    from bot.bot import build_application
+
+    bot_webhook = create_webhook(os.environ['TELEGRAM_BOT_TOKEN'], build_application)
+    app.mount("/telegram", bot_webhook.asgi_app(lifespan=False))
+
+    @app.on_event("startup")
+    async def start_bot_webhook():
+        await bot_webhook.start()
+
+    @app.on_event("shutdown")
+    async def stop_bot_webhook():
+        await bot_webhook.stop()
+
+
 # Endpoint simple para verificar que la API está funcionando
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+# Métricas de la API en formato Prometheus
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(http_metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Devuelve todos los usuarios registrados en el sistema
 @app.get("/users")
 def list_users():
@@ -76,28 +139,42 @@ def create_user(user: UserCreate):
     return {"message": "Usuario creado exitosamente", "user_id": user_id}
 
 
-# Devuelve todas las alertas activas de un usuario específico
+# Devuelve las alertas activas de un usuario específico (todas o una página)
 @app.get("/alerts")
-def list_alerts(user_id: int = Query(..., description="ID del usuario")):
+def list_alerts(
+    user_id: int = Query(..., description="ID del usuario"),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Alertas por página (sin él, todas)"),
+    offset: int = Query(0, ge=0, description="Alertas a saltar (con limit)")
+):
     """
-    Devuelve todas las alertas de un usuario concreto.
+    Devuelve las alertas de un usuario concreto, más recientes primero, con el
+    resumen de precios (último, mínimo en 30 días y tendencia) de
+    alert_price_stats. Con limit/offset solo lee esa página (más una fila
+    para saber si hay siguiente, has_more) y no cuenta el resto de alertas.
     """
+    stats_columns = ", ".join(f"s.{column}" for column in price_stats.STATS_COLUMNS)
     conn = db.get_connection()
     cur = conn.cursor()
     cur.execute(
-        """
-        SELECT id, origin, destination, date_from, date_to, price_target_cents, airlines_include, airlines_exclude, max_stops, airports_alternatives, active, created_at
-        FROM alerts
-        WHERE user_id = %s
-        ORDER BY created_at DESC;
+        f"""
+        SELECT a.id, a.origin, a.destination, a.date_from, a.date_to, a.price_target_cents, a.airlines_include, a.airlines_exclude, a.max_stops, a.airports_alternatives, a.active, a.created_at, a.notify_deals,
+               {stats_columns}
+        FROM alerts a
+        LEFT JOIN alert_price_stats s ON s.alert_id = a.id
+        WHERE a.user_id = %s AND a.deleted_at IS NULL
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT %s OFFSET %s;
         """,
-        (user_id,)
+        (user_id, limit + 1 if limit else None, offset)
     )
     rows = cur.fetchall()
+    has_more = bool(limit) and len(rows) > limit
+    rows = rows[:limit] if limit else rows
     cur.close()
     conn.close()
     alerts = []
     for row in rows:
+        stats = price_stats.PriceStats.from_row(row[13:]) if row[13] else None
         alerts.append({
             "id": row[0],
             "origin": row[1],
@@ -110,9 +187,15 @@ def list_alerts(user_id: int = Query(..., description="ID del usuario")):
             "max_stops": row[8],
             "airports_alternatives": row[9],
             "active": row[10],
-            "created_at": row[11].isoformat()
+            "created_at": row[11].isoformat(),
+            "notify_deals": row[12],
+            "price_summary": {
+                "last_euros": round(stats.last_cents / 100, 2),
+                "min_30d_euros": round(stats.min_last_days() / 100, 2) if stats.min_last_days() is not None else None,
+                "trend": stats.trend
+            } if stats else None
         })
-    return {"alerts": alerts}
+    return {"alerts": alerts, "has_more": has_more, "offset": offset, "limit": limit}
 
 
 # Devuelve el historial completo de búsquedas y precios de una alerta
@@ -126,7 +209,7 @@ def get_alert_price_history(alert_id: int):
     cur = conn.cursor()
     
     # Verificar que la alerta existe
-    cur.execute("SELECT id FROM alerts WHERE id = %s", (alert_id,))
+    cur.execute("SELECT id FROM alerts WHERE id = %s AND deleted_at IS NULL", (alert_id,))
     if not cur.fetchone():
         cur.close()
         conn.close()
@@ -159,30 +242,123 @@ def get_alert_price_history(alert_id: int):
     return {"alert_id": alert_id, "price_history": history}
 
 
-# Marca una alerta como inactiva (soft delete)
+# Estadísticas incrementales de la alerta y de su ruta (sin recorrer el histórico)
+@app.get("/alerts/{alert_id}/stats")
+def get_alert_stats(alert_id: int):
+    """
+    Mínimo, máximo, último precio, mínimo en 30 días, EWMA, volatilidad,
+    percentiles y tendencia de la alerta y de su ruta (de todas las alertas).
+    """
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT origin, destination FROM alerts WHERE id = %s AND deleted_at IS NULL", (alert_id,))
+        row = cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Alerta no encontrada")
+        alert_stats = price_stats.get_alert_stats(cur, alert_id)
+        route_stats = price_stats.get_route_stats(cur, row[0], row[1])
+    finally:
+        cur.close()
+        conn.close()
+    
+    return {
+        "alert_id": alert_id,
+        "origin": row[0],
+        "destination": row[1],
+        "alert": alert_stats.to_public() if alert_stats else None,
+        "route": route_stats.to_public() if route_stats else None
+    }
+
+
+# Predicción de bajada de precio de una alerta (modelo de ia/model.py)
+@app.get("/alerts/{alert_id}/prediction")
+def get_alert_prediction(alert_id: int):
+    """
+    Probabilidad de que el precio de la alerta baje y recomendación
+    ("esperar", "comprar_ya" o "neutral") según el último modelo entrenado
+    (`python -m ia.model train`); aquí no se reentrena.
+    """
+    try:
+        from ia import model
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Predicción no disponible (faltan numpy/pandas/scikit-learn)")
+    predictor = model.load_predictor()
+    if predictor is None:
+        raise HTTPException(status_code=503, detail="Predicción no disponible (modelo sin entrenar)")
+    
+    conn = db.get_connection()
+    try:
+        alerts = model.load_active_alerts(conn, [alert_id])
+        if alerts.empty:
+            raise HTTPException(status_code=404, detail="Alerta no encontrada, inactiva o sin historial de precios")
+        score = predictor.score_alerts(alerts).iloc[0]
+        return {
+            "alert_id": alert_id,
+            "drop_probability": float(score['drop_probability']),
+            "recommendation": score['recommendation'],
+            "model_trained_at": predictor.trained_at.isoformat() if predictor.trained_at else None
+        }
+    finally:
+        conn.close()
+
+
+# Stream SSE con los nuevos precios de las alertas de un usuario
+SSE_HEARTBEAT_SECONDS = 15
+
+@app.get("/users/{user_id}/price-stream")
+async def price_stream(user_id: int, request: Request):
+    """
+    Server-sent events con cada snapshot nuevo (evento `snapshot`) y cada precio
+    objetivo alcanzado (evento `threshold_hit`) de las alertas del usuario.
+    Envía un comentario keepalive cada SSE_HEARTBEAT_SECONDS si no hay eventos.
+    """
+    queue = events.broker.subscribe(user_id)
+
+    async def event_source():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.broker.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Marca una alerta como eliminada (soft delete) y purga su histórico en segundo plano
 @app.delete("/alerts/{alert_id}")
-def delete_alert(alert_id: int):
+def delete_alert(alert_id: int, background_tasks: BackgroundTasks):
     """
     Elimina una alerta específica por su ID.
-    También elimina todos los registros relacionados (histórico de precios y notificaciones).
+    La alerta se desactiva al momento con una sola sentencia; el histórico de precios
+    y notificaciones se borra después por lotes (ver backend/purge.py).
     """
     conn = db.get_connection()
     cur = conn.cursor()
     try:
-        # Verificar que la alerta existe
-        cur.execute("SELECT id FROM alerts WHERE id = %s", (alert_id,))
+        # Marcar como eliminada y desactivar para que el worker deje de procesarla
+        cur.execute(
+            """
+            UPDATE alerts SET active = FALSE, deleted_at = NOW()
+            WHERE id = %s AND deleted_at IS NULL
+            RETURNING id;
+            """,
+            (alert_id,)
+        )
         if not cur.fetchone():
             raise HTTPException(status_code=404, detail="Alerta no encontrada")
         
-        # Eliminar notificaciones relacionadas
-        cur.execute("DELETE FROM notifications_sent WHERE alert_id = %s", (alert_id,))
-        
-        # Eliminar histórico de precios
-        cur.execute("DELETE FROM search_snapshots WHERE alert_id = %s", (alert_id,))
-        
-        # Eliminar la alerta
-        cur.execute("DELETE FROM alerts WHERE id = %s", (alert_id,))
-        
         conn.commit()
     except HTTPException:
         conn.rollback()
@@ -194,6 +370,7 @@ def delete_alert(alert_id: int):
         cur.close()
         conn.close()
     
+    background_tasks.add_task(purge.purge_alert_history, alert_id)
     return {"message": f"Alerta {alert_id} eliminada correctamente"}
 
 
@@ -204,6 +381,7 @@ class AlertUpdate(BaseModel):
     airlines_include: Optional[List[str]] = Field(None, description="Nuevas aerolíneas a incluir")
     airlines_exclude: Optional[List[str]] = Field(None, description="Nuevas aerolíneas a excluir")
     max_stops: Optional[int] = Field(None, description="Nuevas escalas máximas")
+    notify_deals: Optional[bool] = Field(None, description="Avisar de bajadas anómalas de precio")
 
 
 # PATCH /alerts/{id}
@@ -217,7 +395,7 @@ def update_alert(alert_id: int, alert_update: AlertUpdate):
     cur = conn.cursor()
     try:
         # Verificar que la alerta existe
-        cur.execute("SELECT id FROM alerts WHERE id = %s", (alert_id,))
+        cur.execute("SELECT id FROM alerts WHERE id = %s AND deleted_at IS NULL", (alert_id,))
         if not cur.fetchone():
             raise HTTPException(status_code=404, detail="Alerta no encontrada")
         
@@ -245,6 +423,10 @@ def update_alert(alert_id: int, alert_update: AlertUpdate):
             update_fields.append("max_stops = %s")
             update_values.append(alert_update.max_stops)
         
+        if alert_update.notify_deals is not None:
+            update_fields.append("notify_deals = %s")
+            update_values.append(alert_update.notify_deals)
+        
         if not update_fields:
             raise HTTPException(status_code=400, detail="No hay campos para actualizar")
         
@@ -279,6 +461,7 @@ class AlertCreate(BaseModel):
     airlines_exclude: Optional[List[str]] = Field(None, description="Aerolíneas a excluir (opcional)")
     max_stops: Optional[int] = Field(None, description="Escalas máximas (opcional)")
     airports_alternatives: Optional[List[str]] = Field(None, description="Aeropuertos alternativos (opcional)")
+    notify_deals: bool = Field(False, description="Avisar de bajadas anómalas de precio de la ruta (chollos)")
 
 # Crea una nueva alerta de vuelo para un usuario
 @app.post("/alerts")
@@ -293,8 +476,8 @@ def create_alert(alert: AlertCreate):
             """
             INSERT INTO alerts (
                 user_id, origin, destination, date_from, date_to, price_target_cents,
-                airlines_include, airlines_exclude, max_stops, airports_alternatives, active
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
+                airlines_include, airlines_exclude, max_stops, airports_alternatives, notify_deals, active
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
             RETURNING id;
             """,
             (
@@ -307,7 +490,8 @@ def create_alert(alert: AlertCreate):
                 alert.airlines_include,
                 alert.airlines_exclude,
                 alert.max_stops,
-                alert.airports_alternatives
+                alert.airports_alternatives,
+                alert.notify_deals
             )
         )
         alert_id = cur.fetchone()[0]
@@ -321,52 +505,51 @@ def create_alert(alert: AlertCreate):
     return {"alert_id": alert_id, "message": "Alerta creada correctamente"}
 
 
-# Lanza una búsqueda inmediata de precios para testing
-@app.post("/check-now/{alert_id}")
-def check_alert_now(alert_id: int):
+# Lanza una búsqueda inmediata de precios en segundo plano
+@app.post("/check-now/{alert_id}", status_code=202)
+def check_alert_now(alert_id: int, notify: bool = Query(False, description="Enviar el resultado al chat de Telegram")):
     """
-    Lanza una búsqueda manual inmediata para una alerta específica.
-    Útil para testing o búsquedas bajo demanda.
+    Encola una búsqueda manual inmediata para una alerta específica.
+    Devuelve un job_id al momento; el resultado se consulta en GET /jobs/{job_id}.
+    """
+    _ensure_active_alert(alert_id)
+    job_id = jobs.job_queue.submit("check_now", jobs.run_alert_search, alert_id, notify)
+    return {
+        "message": f"Búsqueda manual encolada para alerta {alert_id}",
+        "job_id": job_id,
+        "status": "queued"
+    }
+
+
+# Consulta el estado y resultado de un trabajo en segundo plano
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """
+    Devuelve el estado (queued, running, done, failed) y el resultado de un trabajo.
+    """
+    job = jobs.job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+def _ensure_active_alert(alert_id: int):
+    """
+    Lanza 404 si la alerta no existe o no está activa. Conexión corta, sin llamadas externas.
     """
     conn = db.get_connection()
     cur = conn.cursor()
     try:
-        # Verificar que la alerta existe
-        cur.execute("SELECT id, origin, destination, date_from FROM alerts WHERE id = %s", (alert_id,))
-        alert_data = cur.fetchone()
-        if not alert_data:
-            raise HTTPException(status_code=404, detail="Alerta no encontrada")
-        
-        # Por ahora, insertamos un precio de ejemplo (más tarde conectaremos con APIs reales)
-        # En un caso real, aquí llamo a la API de Tequila/Amadeus por ejemplo o kiwi
-        example_price = 15000  # 150€ en céntimos
-        
         cur.execute(
-            """
-            INSERT INTO search_snapshots (alert_id, price_cents, raw_response)
-            VALUES (%s, %s, %s)
-            RETURNING id;
-            """,
-            (alert_id, example_price, json.dumps({"example": "manual_check", "price": example_price}))
+            "SELECT id FROM alerts WHERE id = %s AND active = TRUE AND deleted_at IS NULL",
+            (alert_id,)
         )
-        
-        snapshot_id = cur.fetchone()[0]
-        conn.commit()
-    except HTTPException:
-        conn.rollback()
-        raise
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
+        if not cur.fetchone():
+            raise HTTPException(status_code=404, detail="Alerta no encontrada o inactiva")
     finally:
         cur.close()
         conn.close()
-    
-    return {
-        "message": f"Búsqueda manual ejecutada para alerta {alert_id}",
-        "snapshot_id": snapshot_id,
-        "price_found": f"{example_price/100}€"
-    }
+
 
 # ============================================================================
 # ENDPOINTS PARA API DE VUELOS REALES
@@ -383,7 +566,7 @@ class FlightSearchRequest(BaseModel):
     limit: int = Field(10, description="Límite de resultados")
 
 @app.post("/flights/search")
-def search_flights(request: FlightSearchRequest):
+def search_flights(request: FlightSearchRequest, background_tasks: BackgroundTasks):
     """
     Busca vuelos reales usando la API de Tequila/Kiwi.com.
     
@@ -410,9 +593,12 @@ def search_flights(request: FlightSearchRequest):
         if not result['success']:
             raise HTTPException(status_code=500, detail=result.get('error', 'Error buscando vuelos'))
         
+        # Lo encontrado alimenta el calendario de precios, después de responder
+        background_tasks.add_task(price_calendar_store.record, request.origin, request.destination, result['flights'])
+        
         return {
             "success": True,
-            "flights": result['flights'],
+            "flights": [flight.to_dict(result.get('found_at')) for flight in result['flights']],
             "total_results": result['total_results'],
             "api_used": result.get('api_used', 'tequila'),
             "search_params": {
@@ -429,6 +615,85 @@ def search_flights(request: FlightSearchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@app.get("/flights/calendar")
+def get_price_calendar(
+    origin: str = Query(..., min_length=3, max_length=3, description="Código IATA de origen"),
+    destination: str = Query(..., min_length=3, max_length=3, description="Código IATA de destino"),
+    date_from: str = Query(..., description="Primer día (DD/MM/YYYY)"),
+    date_to: Optional[str] = Query(None, description="Último día (DD/MM/YYYY), por defecto date_from")
+):
+    """
+    Precios ya conocidos por día para una ruta (tabla price_calendar).
+    
+    No llama al proveedor: devuelve lo que han encontrado las búsquedas
+    anteriores de cualquier usuario, con la hora de la última actualización.
+    """
+    try:
+        start = datetime.datetime.strptime(date_from, "%d/%m/%Y").date()
+        end = datetime.datetime.strptime(date_to, "%d/%m/%Y").date() if date_to else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido (DD/MM/YYYY)")
+    if end < start or (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido (máximo un año)")
+    
+    entries = price_calendar_store.read(origin, destination, start, end, max_age_seconds=None)
+    return {
+        "success": True,
+        "origin": origin.upper(),
+        "destination": destination.upper(),
+        "days": [
+            {
+                "date": day.strftime("%d/%m/%Y"),
+                "price_euros": entry.flight.price_euros,
+                "airline": entry.flight.airline,
+                "stops": entry.flight.stops,
+                "booking_link": entry.flight.booking_link,
+                "updated_at": entry.updated_at.isoformat()
+            }
+            for day, entry in entries.items()
+        ]
+    }
+
+@app.get("/flights/flex-search")
+def flex_search_flights(
+    origin: str = Query(..., min_length=3, max_length=3, description="Código IATA de origen"),
+    destination: str = Query(..., min_length=3, max_length=3, description="Código IATA de destino"),
+    date_from: str = Query(..., description="Fecha de salida deseada (DD/MM/YYYY)"),
+    days: int = Query(3, ge=1, le=15, description="Días de margen antes y después"),
+    limit: int = Query(5, ge=1, le=30, description="Número máximo de alternativas")
+):
+    """
+    Busca fechas cercanas más baratas (±days días).
+    
+    Usa búsquedas por rango de fechas (una llamada por cada bloque de días que
+    no esté ya en caché) y devuelve las alternativas ordenadas por precio y cercanía.
+    """
+    try:
+        center = datetime.datetime.strptime(date_from, "%d/%m/%Y").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido (DD/MM/YYYY)")
+    if origin.upper() == destination.upper():
+        raise HTTPException(status_code=400, detail="El origen y destino no pueden ser iguales")
+    
+    result = flex_search.alternatives(origin, destination, center, days=days, limit=limit)
+    center_flight = result['center_flight']
+    return {
+        "success": True,
+        "date_from": date_from,
+        "price_for_date_euros": center_flight.price_euros if center_flight else None,
+        "alternatives": [
+            {
+                "date": option['date'].strftime("%d/%m/%Y"),
+                "days_from_target": option['days_from_target'],
+                "price_euros": option['flight'].price_euros,
+                "flight": option['flight'].to_dict()
+            }
+            for option in result['alternatives']
+        ],
+        "upstream_calls": result['upstream_calls'],
+        "complete": result['complete']
+    }
+
 @app.get("/flights/locations")
 def search_locations(query: str = Query(..., description="Nombre de ciudad o aeropuerto para buscar")):
     """
@@ -456,109 +721,22 @@ def search_locations(query: str = Query(..., description="Nombre de ciudad o aer
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
-@app.post("/alerts/{alert_id}/search-real")
-def search_flights_for_alert_endpoint(alert_id: int):
+@app.post("/alerts/{alert_id}/search-real", status_code=202)
+def search_flights_for_alert_endpoint(alert_id: int, notify: bool = Query(False, description="Enviar el resultado al chat de Telegram")):
     """
-    Busca vuelos reales para una alerta específica y guarda el resultado.
+    Encola una búsqueda de vuelos reales para una alerta específica.
     
-    Este endpoint toma los parámetros de una alerta existente y busca vuelos
-    reales usando la API de Tequila, guardando los resultados en el historial.
+    El trabajo toma los parámetros de la alerta, busca vuelos reales y guarda
+    el resultado en el historial. Devuelve un job_id para consultar en GET /jobs/{job_id}.
     """
-    conn = db.get_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Obtener datos de la alerta
-        cur.execute("""
-            SELECT user_id, origin, destination, date_from, date_to, max_stops 
-            FROM alerts WHERE id = %s AND is_active = true
-        """, (alert_id,))
-        
-        alert_data = cur.fetchone()
-        if not alert_data:
-            raise HTTPException(status_code=404, detail="Alerta no encontrada o inactiva")
-        
-        user_id, origin, destination, date_from, date_to, max_stops = alert_data
-        
-        # Buscar vuelos reales
-        search_result = flights_api.search_flights(
-            origin=origin,
-            destination=destination,
-            date_from=date_from.strftime('%d/%m/%Y'),
-            return_from=date_to.strftime('%d/%m/%Y') if date_to else None,
-            max_stopovers=max_stops or 2,
-            limit=5
-        )
-        
-        if not search_result['success']:
-            raise HTTPException(status_code=500, detail=f"Error buscando vuelos: {search_result.get('error')}")
-        
-        flights = search_result['flights']
-        if not flights:
-            # Guardar búsqueda sin resultados
-            cur.execute("""
-                INSERT INTO search_snapshots (alert_id, price_cents, found_at, details)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id
-            """, (alert_id, None, datetime.datetime.now(), json.dumps({"message": "No flights found"})))
-            
-            snapshot_id = cur.fetchone()[0]
-            conn.commit()
-            
-            return {
-                "success": True,
-                "message": "Búsqueda completada pero no se encontraron vuelos",
-                "flights_found": 0,
-                "snapshot_id": snapshot_id,
-                "api_used": search_result.get('api_used')
-            }
-        
-        # Guardar el mejor precio encontrado
-        best_flight = min(flights, key=lambda x: x.get('price_euros', 9999))
-        best_price_cents = int(best_flight['price_euros'] * 100)
-        
-        # Guardar en historial
-        cur.execute("""
-            INSERT INTO search_snapshots (alert_id, price_cents, found_at, details)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-        """, (alert_id, best_price_cents, datetime.datetime.now(), json.dumps({
-            "flights_found": len(flights),
-            "best_price_euros": best_flight['price_euros'],
-            "best_flight": best_flight,
-            "api_used": search_result.get('api_used'),
-            "total_results": len(flights)
-        })))
-        
-        snapshot_id = cur.fetchone()[0]
-        conn.commit()
-        
-        return {
-            "success": True,
-            "message": f"Búsqueda completada para alerta {alert_id}",
-            "flights_found": len(flights),
-            "best_price_euros": best_flight['price_euros'],
-            "best_flight": {
-                "price": best_flight['price_euros'],
-                "origin": best_flight['origin'],
-                "destination": best_flight['destination'],
-                "departure": best_flight['departure_time'],
-                "airline": best_flight['airlines'][0] if best_flight['airlines'] else 'Unknown',
-                "stops": best_flight['stops']
-            },
-            "snapshot_id": snapshot_id,
-            "api_used": search_result.get('api_used')
-        }
-        
-    except HTTPException:
-        conn.rollback()
-        raise
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cur.close()
-        conn.close()
+    _ensure_active_alert(alert_id)
+    job_id = jobs.job_queue.submit("search_real", jobs.run_alert_search, alert_id, notify)
+    return {
+        "success": True,
+        "message": f"Búsqueda encolada para alerta {alert_id}",
+        "job_id": job_id,
+        "status": "queued"
+    }
 
 # lanzo server
 if __name__ == "__main__":
@@ -0,0 +1,371 @@
+# ============================================================================
+# OUTBOX TRANSACCIONAL DE NOTIFICACIONES (TABLA notification_outbox)
+# ============================================================================
+# El worker ya no envía a Telegram ni registra notifications_sent por su
+# cuenta: escribe la notificación en notification_outbox en la MISMA
+# transacción que el snapshot (si el snapshot no se guarda, no hay aviso; si
+# se guarda, el aviso no se pierde). Un relay en otro hilo:
+# - reclama lotes con FOR UPDATE SKIP LOCKED y un lease (varios workers
+#   pueden drenar a la vez y una fila de un proceso caído se retoma al
+#   caducar su lease); mientras las filas esperan en la cola del despachador
+#   (límites de envío, 429) el relay renueva su lease cada tercio de
+#   OUTBOX_LEASE_SECONDS, así que otro relay no las reclama mientras este
+#   proceso siga vivo,
+# - los pasa al TelegramDispatcher con la clave de idempotencia de la fila,
+# - cuando Telegram acepta el mensaje marca la fila como enviada, registra
+#   notifications_sent y publica el evento, todo en una transacción,
+# - si falla, reintenta con backoff hasta OUTBOX_MAX_ATTEMPTS.
+# La clave de idempotencia (tipo, alerta, precio, día) evita que dos ciclos o
+# dos workers encolen el mismo aviso. La entrega es "al menos una vez": un
+# mensaje se repite si el proceso cae (o se queda colgado más que el lease)
+# entre el envío y el commit, o si al parar se cancela un envío en vuelo (se
+# devuelve al outbox por si no llegó). Fuera de esos casos sale una sola vez.
+# ============================================================================
+
+import os
+import time
+import select
+import logging
+import threading
+from datetime import date
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from backend import events
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "notification_outbox"
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', '5'))
+
+# Mensajes reclamados que puede haber a la vez en la cola del despachador
+OUTBOX_MAX_QUEUED = int(os.getenv('OUTBOX_MAX_QUEUED', '500'))
+
+# Una alerta no recibe más de un aviso en este intervalo
+RECENT_NOTIFICATION_HOURS = 24
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    idempotency_key: str
+    alert_id: int
+    user_id: Optional[int]
+    chat_id: int
+    kind: str
+    price_cents: Optional[int]
+    message: str
+    attempts: int
+
+
+def idempotency_key(kind: str, alert_id: int, price_cents: Optional[int], day: Optional[date] = None) -> str:
+    return f"{kind}:{alert_id}:{price_cents}:{(day or date.today()).isoformat()}"
+
+
+# ============================================================================
+# ESCRITURA (EN LA TRANSACCIÓN DEL SNAPSHOT)
+# ============================================================================
+
+def recently_notified(cur, alert_id: int, hours: int = RECENT_NOTIFICATION_HOURS) -> bool:
+    """Aviso enviado en las últimas `hours` horas o todavía pendiente de enviar"""
+    cur.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM notifications_sent
+            WHERE alert_id = %s AND sent_at >= NOW() - make_interval(hours => %s)
+        ) OR EXISTS (
+            SELECT 1 FROM notification_outbox
+            WHERE alert_id = %s AND status IN ('pending', 'sending')
+        )
+        """,
+        (alert_id, hours, alert_id)
+    )
+    return cur.fetchone()[0]
+
+
+def enqueue(cur, key: str, alert_id: int, user_id: Optional[int], chat_id: int, kind: str,
+            price_cents: Optional[int], message: str) -> bool:
+    """Añade el aviso al outbox; False si ya existía uno con la misma clave"""
+    cur.execute(
+        """
+        INSERT INTO notification_outbox (idempotency_key, alert_id, user_id, chat_id, kind, price_cents, message)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id
+        """,
+        (key, alert_id, user_id, chat_id, kind, price_cents, message)
+    )
+    if cur.fetchone() is None:
+        return False
+    # Despierta al relay cuando se haga commit
+    cur.execute("SELECT pg_notify(%s, '');", (CHANNEL,))
+    return True
+
+
+# ============================================================================
+# DRENADO
+# ============================================================================
+
+def claim_batch(cur, limit: int = OUTBOX_BATCH_SIZE, lease_seconds: int = OUTBOX_LEASE_SECONDS) -> List[OutboxEntry]:
+    """Reclama filas pendientes (o con el lease caducado) sin bloquear a otros relays"""
+    cur.execute(
+        """
+        UPDATE notification_outbox o
+        SET status = 'sending',
+            attempts = o.attempts + 1,
+            locked_until = NOW() + make_interval(secs => %s)
+        WHERE o.id IN (
+            SELECT id FROM notification_outbox
+            WHERE (status = 'pending' AND next_attempt_at <= NOW())
+               OR (status = 'sending' AND locked_until < NOW())
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING o.id, o.idempotency_key, o.alert_id, o.user_id, o.chat_id, o.kind, o.price_cents, o.message, o.attempts
+        """,
+        (lease_seconds, limit)
+    )
+    return sorted((OutboxEntry(*row) for row in cur.fetchall()), key=lambda entry: entry.id)
+
+
+def renew_leases(cur, ids: List[int], lease_seconds: int = OUTBOX_LEASE_SECONDS) -> int:
+    """Alarga el lease de filas reclamadas que siguen esperando en la cola; devuelve cuántas"""
+    cur.execute(
+        """
+        UPDATE notification_outbox
+        SET locked_until = NOW() + make_interval(secs => %s)
+        WHERE id = ANY(%s) AND status = 'sending'
+        """,
+        (lease_seconds, list(ids))
+    )
+    return cur.rowcount
+
+
+def backlog(cur) -> Dict[str, int]:
+    """Filas por entregar por estado ('pending' y 'sending')"""
+    cur.execute("""
+        SELECT status, COUNT(*) FROM notification_outbox
+        WHERE status IN ('pending', 'sending')
+        GROUP BY status
+    """)
+    counts = {'pending': 0, 'sending': 0}
+    counts.update(dict(cur.fetchall()))
+    return counts
+
+
+def mark_sent(cur, entry: OutboxEntry):
+    """Fila enviada + notifications_sent + evento SSE, en la transacción del cursor"""
+    cur.execute(
+        "UPDATE notification_outbox SET status = 'sent', sent_at = NOW(), locked_until = NULL WHERE id = %s",
+        (entry.id,)
+    )
+    cur.execute(
+        "INSERT INTO notifications_sent (alert_id, price_cents, sent_at) VALUES (%s, %s, NOW())",
+        (entry.alert_id, entry.price_cents)
+    )
+    if entry.user_id is not None:
+        events.notify_price_event(cur, entry.user_id, entry.alert_id, entry.kind, entry.price_cents)
+
+
+def mark_failed(cur, entry: OutboxEntry, error: str, retryable: bool = True):
+    """Vuelve a 'pending' con backoff exponencial, o 'failed' si no hay más intentos"""
+    if retryable and entry.attempts < OUTBOX_MAX_ATTEMPTS:
+        cur.execute(
+            """
+            UPDATE notification_outbox
+            SET status = 'pending', locked_until = NULL, last_error = %s,
+                next_attempt_at = NOW() + make_interval(secs => %s)
+            WHERE id = %s
+            """,
+            (error[:500], 30 * 2 ** (entry.attempts - 1), entry.id)
+        )
+    else:
+        cur.execute(
+            "UPDATE notification_outbox SET status = 'failed', locked_until = NULL, last_error = %s WHERE id = %s",
+            (error[:500], entry.id)
+        )
+
+
+def release(cur, ids: List[int]):
+    """Devuelve a 'pending' filas reclamadas que no se llegaron a enviar, sin gastar intento"""
+    cur.execute(
+        """
+        UPDATE notification_outbox
+        SET status = 'pending', locked_until = NULL, next_attempt_at = NOW(),
+            attempts = GREATEST(attempts - 1, 0)
+        WHERE id = ANY(%s) AND status = 'sending'
+        """,
+        (list(ids),)
+    )
+    if cur.rowcount:
+        cur.execute("SELECT pg_notify(%s, '');", (CHANNEL,))
+
+
+class OutboxRelay:
+    """
+    Hilo que drena notification_outbox hacia un TelegramDispatcher. Se despierta
+    con LISTEN en cuanto se confirma un aviso y, por si acaso, cada OUTBOX_POLL_SECONDS.
+    """
+
+    def __init__(self, get_connection: Callable, dispatcher, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_seconds: float = OUTBOX_POLL_SECONDS):
+        self.get_connection = get_connection
+        self.dispatcher = dispatcher
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Reclamados y pasados a la cola, por clave, hasta que se marcan
+        self._claimed: Dict[str, OutboxEntry] = {}
+        # Enviados (o descartados) cuyo resultado no se pudo guardar todavía
+        self._unfinished: Dict[str, Tuple[OutboxEntry, Optional[str], bool]] = {}
+        self._leases_renewed_at = time.monotonic()
+        # Para que stop() no espere al siguiente sondeo
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        os.write(self._wakeup_w, b'x')
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        listen_conn = None
+        while not self._stop.is_set():
+            try:
+                if listen_conn is None:
+                    listen_conn = self.get_connection()
+                    listen_conn.autocommit = True
+                    listen_conn.cursor().execute(f"LISTEN {CHANNEL};")
+                self.retry_unfinished()
+                self.renew_leases()
+                self.drain()
+                # Esperar un aviso nuevo (o el siguiente sondeo)
+                ready = select.select([listen_conn, self._wakeup_r], [], [], self.poll_seconds)[0]
+                if listen_conn in ready:
+                    listen_conn.poll()
+                    listen_conn.notifies.clear()
+                if self._wakeup_r in ready:
+                    os.read(self._wakeup_r, 64)
+            except Exception as e:
+                logger.error(f"❌ Error en el relay del outbox: {e}")
+                if listen_conn is not None:
+                    listen_conn.close()
+                    listen_conn = None
+                self._stop.wait(self.poll_seconds)
+        if listen_conn is not None:
+            listen_conn.close()
+
+    def drain(self) -> int:
+        """Reclama y encola avisos mientras haya y quepan en el despachador; devuelve cuántos"""
+        claimed = 0
+        while self.dispatcher.pending() < OUTBOX_MAX_QUEUED:
+            conn = self.get_connection()
+            if not conn:
+                break   # sin BD: se reintenta en el siguiente sondeo
+            try:
+                with conn.cursor() as cur:
+                    batch = claim_batch(cur, self.batch_size)
+                conn.commit()
+            finally:
+                conn.close()
+
+            for entry in batch:
+                self._claimed[entry.idempotency_key] = entry
+                self.dispatcher.submit(
+                    entry.chat_id, entry.message, key=entry.idempotency_key,
+                    on_sent=partial(self._finish, entry, None, False),
+                    on_failed=partial(self._finish, entry)
+                )
+            claimed += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        return claimed
+
+    def renew_leases(self) -> int:
+        """Cada tercio del lease, lo renueva para los avisos que siguen en la cola"""
+        if time.monotonic() - self._leases_renewed_at < OUTBOX_LEASE_SECONDS / 3:
+            return 0
+        ids = [entry.id for entry in list(self._claimed.values())]
+        renewed = 0
+        if ids:
+            conn = self.get_connection()
+            if not conn:
+                return 0   # sin BD: se reintenta en el siguiente sondeo
+            try:
+                with conn.cursor() as cur:
+                    renewed = renew_leases(cur, ids)
+                conn.commit()
+            finally:
+                conn.close()
+        self._leases_renewed_at = time.monotonic()
+        return renewed
+
+    def release(self, messages) -> int:
+        """
+        Devuelve al outbox los avisos que la cola no llegó a enviar al parar
+        (TelegramDispatcher.stop), para que otro worker los entregue ya en vez
+        de esperar a que caduque el lease. Devuelve cuántos.
+        """
+        entries = [self._claimed[m.key] for m in messages if m.key in self._claimed]
+        if not entries:
+            return 0
+        conn = self.get_connection()
+        if not conn:
+            raise RuntimeError("Sin conexión a la BD para devolver los avisos")
+        try:
+            with conn.cursor() as cur:
+                release(cur, [entry.id for entry in entries])
+            conn.commit()
+        finally:
+            conn.close()
+        for entry in entries:
+            self._claimed.pop(entry.idempotency_key, None)
+        logger.info(f"↩️ {len(entries)} avisos sin enviar devueltos al outbox")
+        return len(entries)
+
+    def _finish(self, entry: OutboxEntry, error: Optional[str], retryable: bool):
+        """
+        Apunta el resultado del envío. Si no se puede guardar, la fila sigue
+        reclamada (con su lease renovado, así que nadie la reenvía) y el relay
+        lo vuelve a intentar en cada sondeo (retry_unfinished).
+        """
+        conn = self.get_connection()
+        try:
+            if not conn:
+                raise RuntimeError("sin conexión a la BD")
+            with conn.cursor() as cur:
+                if error is None:
+                    mark_sent(cur, entry)
+                else:
+                    mark_failed(cur, entry, error, retryable)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"❌ No se pudo guardar el resultado de {entry.idempotency_key}, se reintentará: {e}")
+            self._unfinished[entry.idempotency_key] = (entry, error, retryable)
+            return
+        finally:
+            if conn:
+                conn.close()
+        self._unfinished.pop(entry.idempotency_key, None)
+        self._claimed.pop(entry.idempotency_key, None)
+        if error is None:
+            logger.info(f"📬 Notificación {entry.idempotency_key} entregada")
+        else:
+            logger.warning(f"⚠️ Notificación {entry.idempotency_key} no entregada: {error}")
+
+    def retry_unfinished(self):
+        """Vuelve a guardar los resultados de envío que fallaron al escribirse"""
+        for entry, error, retryable in list(self._unfinished.values()):
+            self._finish(entry, error, retryable)
@@ -0,0 +1,160 @@
+# ============================================================================
+# CALENDARIO DE PRECIOS POR RUTA (TABLA price_calendar)
+# ============================================================================
+# Cada búsqueda al proveedor devuelve vuelos de varios días y hasta ahora solo
+# nos quedábamos con el más barato. Aquí se guarda, por (origen, destino, día),
+# el vuelo más barato visto en cualquier búsqueda (worker, /flights/search,
+# jobs, fechas flexibles) con un upsert incremental, y se lee antes de volver
+# a llamar al proveedor:
+# - el worker reutiliza el precio de un día si otra alerta de la misma ruta lo
+#   ha buscado hace poco,
+# - las fechas flexibles solo piden al proveedor los días que no están,
+# - el bot y la API consultan GET /flights/calendar sin gastar cuota.
+#
+# El calendario es una optimización: si la BD falla se registra el error y la
+# búsqueda sigue como antes.
+# ============================================================================
+
+import os
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from psycopg2.extras import execute_values
+
+from backend.flight_record import FlightRecord
+
+logger = logging.getLogger(__name__)
+
+# Antigüedad máxima de un precio del calendario para usarlo en lugar de buscar
+PRICE_CALENDAR_MAX_AGE_SECONDS = int(os.getenv('PRICE_CALENDAR_MAX_AGE_SECONDS', '900'))
+
+
+# Valor por defecto de max_age_seconds en PriceCalendarStore: la antigüedad
+# máxima del almacén (None significa sin límite, como en read_range)
+STORE_MAX_AGE = object()
+
+
+class CalendarEntry(NamedTuple):
+    flight: FlightRecord
+    updated_at: datetime
+
+
+def cheapest_per_day(flights: Iterable[FlightRecord]) -> Dict[date, FlightRecord]:
+    """Vuelo más barato de cada día de salida"""
+    cheapest: Dict[date, FlightRecord] = {}
+    for flight in flights:
+        try:
+            day = date.fromisoformat(flight.departure_time[:10])
+        except (TypeError, ValueError):
+            continue
+        current = cheapest.get(day)
+        if current is None or flight.price_cents < current.price_cents:
+            cheapest[day] = flight
+    return cheapest
+
+
+def record_flights(cur, origin: str, destination: str, flights: Iterable[FlightRecord],
+                   observed_at: Optional[datetime] = None) -> int:
+    """
+    Upsert del vuelo más barato de cada día en la transacción del cursor.
+    El dato más reciente gana; una observación más antigua no pisa una nueva.
+    Devuelve cuántos días se han escrito.
+    """
+    observed_at = observed_at or datetime.now()
+    rows = [
+        (origin.upper(), destination.upper(), day, flight.price_cents, json.dumps(flight.to_storage()), observed_at)
+        for day, flight in sorted(cheapest_per_day(flights).items())
+    ]
+    if not rows:
+        return 0
+    execute_values(
+        cur,
+        """
+        INSERT INTO price_calendar (origin, destination, departure_date, price_cents, details, updated_at)
+        VALUES %s
+        ON CONFLICT (origin, destination, departure_date) DO UPDATE
+        SET price_cents = EXCLUDED.price_cents,
+            details = EXCLUDED.details,
+            updated_at = EXCLUDED.updated_at
+        WHERE price_calendar.updated_at <= EXCLUDED.updated_at
+        """,
+        rows
+    )
+    return len(rows)
+
+
+def read_range(cur, origin: str, destination: str, start: date, end: date,
+               max_age_seconds: Optional[int] = PRICE_CALENDAR_MAX_AGE_SECONDS) -> Dict[date, CalendarEntry]:
+    """Precios conocidos entre start y end (ambos incluidos), solo los más recientes que max_age_seconds"""
+    query = """
+        SELECT departure_date, details, updated_at
+        FROM price_calendar
+        WHERE origin = %s AND destination = %s
+          AND departure_date BETWEEN %s AND %s
+    """
+    params = [origin.upper(), destination.upper(), start, end]
+    if max_age_seconds is not None:
+        query += " AND updated_at >= %s"
+        params.append(datetime.now() - timedelta(seconds=max_age_seconds))
+    cur.execute(query + " ORDER BY departure_date", params)
+
+    return {
+        day: CalendarEntry(FlightRecord.from_storage(details), updated_at)
+        for day, details, updated_at in cur.fetchall()
+    }
+
+
+class PriceCalendarStore:
+    """
+    Acceso al calendario con conexiones propias y cortas (la fábrica de
+    conexiones es la de cada proceso: db.get_connection o la del worker).
+    """
+
+    def __init__(self, get_connection: Callable, max_age_seconds: int = PRICE_CALENDAR_MAX_AGE_SECONDS):
+        self.get_connection = get_connection
+        self.max_age_seconds = max_age_seconds
+
+    def read(self, origin: str, destination: str, start: date, end: Optional[date] = None,
+             max_age_seconds: Optional[int] = STORE_MAX_AGE) -> Dict[date, CalendarEntry]:
+        """Precios conocidos del rango; max_age_seconds=None los devuelve todos, sin filtrar por antigüedad"""
+        if max_age_seconds is STORE_MAX_AGE:
+            max_age_seconds = self.max_age_seconds
+        conn = None
+        try:
+            conn = self.get_connection()
+            if not conn:
+                return {}
+            with conn.cursor() as cur:
+                return read_range(cur, origin, destination, start, end or start, max_age_seconds)
+        except Exception as e:
+            logger.error(f"❌ Error leyendo calendario de precios {origin} → {destination}: {e}")
+            return {}
+        finally:
+            if conn:
+                conn.close()
+
+    def read_day(self, origin: str, destination: str, day: date,
+                 max_age_seconds: Optional[int] = STORE_MAX_AGE) -> Optional[CalendarEntry]:
+        return self.read(origin, destination, day, day, max_age_seconds).get(day)
+
+    def record(self, origin: str, destination: str, flights: List[FlightRecord],
+               observed_at: Optional[datetime] = None) -> int:
+        if not flights:
+            return 0
+        conn = None
+        try:
+            conn = self.get_connection()
+            if not conn:
+                return 0
+            with conn.cursor() as cur:
+                written = record_flights(cur, origin, destination, flights, observed_at)
+            conn.commit()
+            return written
+        except Exception as e:
+            logger.error(f"❌ Error actualizando calendario de precios {origin} → {destination}: {e}")
+            return 0
+        finally:
+            if conn:
+                conn.close()
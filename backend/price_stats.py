@@ -0,0 +1,327 @@
+# ============================================================================
+# ESTADÍSTICAS DE PRECIO INCREMENTALES POR ALERTA Y POR RUTA
+# ============================================================================
+# Cada vez que se guarda un snapshot se actualiza, en la misma transacción,
+# un resumen por alerta (alert_price_stats) y por ruta (route_price_stats):
+# - mínimo, máximo y último precio (con su fecha) y número de observaciones,
+# - EWMA del precio y varianza exponencial (volatilidad = desviación / EWMA),
+# - mínimo de cada uno de los últimos WINDOW_DAYS días (para "mínimo en 30
+#   días" sin recorrer el histórico),
+# - un sketch de percentiles de error relativo acotado (estilo DDSketch:
+#   cubos logarítmicos con sus contadores).
+# Así la API y el bot responden tendencias y mínimos en O(1) en lugar de
+# agregar search_snapshots.
+#
+# Con el mismo resumen se detectan "chollos": una bajada anómala respecto a la
+# distribución reciente de la ruta (z-score sobre la EWMA y su desviación
+# exponencial, calculado antes de añadir el precio nuevo) que además queda en
+# la cola baja de todo lo visto en la ruta (percentil del sketch), para no
+# avisar de precios que solo son bajos frente a una racha cara.
+#
+# Varias alertas de una ruta ven en el mismo ciclo el mismo vuelo (el worker
+# reutiliza el precio del calendario). Con una clave de observación (ciclo,
+# vuelo y precio) la ruta cuenta cada observación una sola vez, y el chollo
+# calculado para la primera alerta se devuelve también a las demás.
+# ============================================================================
+
+import os
+import math
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Peso de la última observación en la EWMA
+EWMA_ALPHA = float(os.getenv('PRICE_STATS_EWMA_ALPHA', '0.2'))
+
+# Días con mínimo diario guardado
+WINDOW_DAYS = 30
+
+# Error relativo máximo de los percentiles del sketch (1%)
+SKETCH_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Variación del último precio frente a la EWMA para hablar de tendencia
+TREND_THRESHOLD = 0.02
+
+# Chollo: z-score <= -DEAL_Z_THRESHOLD y al menos DEAL_MIN_DROP_PCT % bajo la
+# EWMA, con un mínimo de observaciones previas de la ruta
+DEAL_Z_THRESHOLD = float(os.getenv('DEAL_Z_THRESHOLD', '3'))
+DEAL_MIN_DROP_PCT = float(os.getenv('DEAL_MIN_DROP_PCT', '10'))
+DEAL_MIN_OBSERVATIONS = int(os.getenv('DEAL_MIN_OBSERVATIONS', '10'))
+DEAL_MAX_PERCENTILE = float(os.getenv('DEAL_MAX_PERCENTILE', '0.02'))
+
+# Desviación mínima (relativa a la EWMA) para que una ruta de precio casi
+# constante no dispare z-scores enormes con cualquier céntimo
+MIN_RELATIVE_DEVIATION = 0.01
+
+ALERT_TABLE = 'alert_price_stats'
+ROUTE_TABLE = 'route_price_stats'
+
+# Claves de observación recientes que se recuerdan por ruta (con su chollo)
+ROUTE_OBSERVATIONS_KEPT = 200
+
+STATS_COLUMNS = (
+    'observations', 'min_cents', 'min_at', 'max_cents', 'max_at', 'last_cents', 'last_at',
+    'ewma', 'ewm_var', 'daily_min', 'daily_min_start', 'sketch',
+)
+
+
+class Deal(NamedTuple):
+    price_cents: int
+    baseline_cents: int   # EWMA de la ruta antes de este precio
+    zscore: float
+    drop_pct: float
+
+
+class PriceStats:
+    """
+    Resumen incremental de una serie de precios (en céntimos).
+    """
+
+    __slots__ = STATS_COLUMNS
+
+    def __init__(self):
+        self.observations = 0
+        self.min_cents: Optional[int] = None
+        self.min_at: Optional[datetime] = None
+        self.max_cents: Optional[int] = None
+        self.max_at: Optional[datetime] = None
+        self.last_cents: Optional[int] = None
+        self.last_at: Optional[datetime] = None
+        self.ewma: Optional[float] = None
+        self.ewm_var = 0.0
+        self.daily_min: List[Optional[int]] = []
+        self.daily_min_start: Optional[date] = None
+        self.sketch: Dict[int, int] = {}
+
+    def update(self, price_cents: int, observed_at: datetime):
+        self.observations += 1
+        if self.min_cents is None or price_cents < self.min_cents:
+            self.min_cents, self.min_at = price_cents, observed_at
+        if self.max_cents is None or price_cents > self.max_cents:
+            self.max_cents, self.max_at = price_cents, observed_at
+        if self.last_at is None or observed_at >= self.last_at:
+            self.last_cents, self.last_at = price_cents, observed_at
+
+        # EWMA y varianza exponencial (actualización incremental de Finch)
+        if self.ewma is None:
+            self.ewma = float(price_cents)
+        else:
+            diff = price_cents - self.ewma
+            increment = EWMA_ALPHA * diff
+            self.ewma += increment
+            self.ewm_var = (1 - EWMA_ALPHA) * (self.ewm_var + diff * increment)
+
+        self._update_daily_min(price_cents, observed_at.date())
+
+        if price_cents > 0:
+            bucket = math.ceil(math.log(price_cents) / _LOG_GAMMA)
+            self.sketch[bucket] = self.sketch.get(bucket, 0) + 1
+
+    def _update_daily_min(self, price_cents: int, day: date):
+        if self.daily_min_start is None:
+            self.daily_min_start, self.daily_min = day, [price_cents]
+            return
+        offset = (day - self.daily_min_start).days
+        if offset < 0:
+            return  # observación más antigua que la ventana
+        if offset >= WINDOW_DAYS:
+            shift = offset - WINDOW_DAYS + 1
+            self.daily_min = self.daily_min[shift:]
+            self.daily_min_start += timedelta(days=shift)
+            offset -= shift
+        if offset >= len(self.daily_min):
+            self.daily_min.extend([None] * (offset + 1 - len(self.daily_min)))
+        current = self.daily_min[offset]
+        if current is None or price_cents < current:
+            self.daily_min[offset] = price_cents
+
+    # ------------------------------------------------------------------------
+    # Consultas O(1)
+    # ------------------------------------------------------------------------
+
+    @property
+    def volatility(self) -> Optional[float]:
+        """Desviación exponencial relativa a la EWMA (0.05 = ±5%)"""
+        if not self.ewma:
+            return None
+        return math.sqrt(self.ewm_var) / self.ewma
+
+    @property
+    def trend(self) -> Optional[str]:
+        """'bajando', 'subiendo' o 'estable' según el último precio frente a la EWMA"""
+        if self.ewma is None or self.observations < 2:
+            return None
+        change = (self.last_cents - self.ewma) / self.ewma
+        if change <= -TREND_THRESHOLD:
+            return 'bajando'
+        if change >= TREND_THRESHOLD:
+            return 'subiendo'
+        return 'estable'
+
+    def zscore(self, price_cents: int) -> Optional[float]:
+        """Desviaciones (exponenciales) de un precio respecto a la EWMA actual"""
+        if not self.ewma:
+            return None
+        deviation = max(math.sqrt(self.ewm_var), self.ewma * MIN_RELATIVE_DEVIATION)
+        return (price_cents - self.ewma) / deviation
+
+    def detect_deal(self, price_cents: int) -> Optional[Deal]:
+        """Chollo si el precio es una bajada anómala; se llama ANTES de update()"""
+        if self.observations < DEAL_MIN_OBSERVATIONS:
+            return None
+        zscore = self.zscore(price_cents)
+        drop_pct = (self.ewma - price_cents) / self.ewma * 100
+        if (zscore <= -DEAL_Z_THRESHOLD and drop_pct >= DEAL_MIN_DROP_PCT
+                and price_cents <= self.percentile(DEAL_MAX_PERCENTILE)):
+            return Deal(price_cents, round(self.ewma), zscore, drop_pct)
+        return None
+
+    def min_last_days(self, days: int = WINDOW_DAYS, today: Optional[date] = None) -> Optional[int]:
+        """Mínimo de los últimos `days` días (como mucho WINDOW_DAYS)"""
+        if self.daily_min_start is None:
+            return None
+        first_day = (today or date.today()) - timedelta(days=min(days, WINDOW_DAYS) - 1)
+        skip = max(0, (first_day - self.daily_min_start).days)
+        values = [value for value in self.daily_min[skip:] if value is not None]
+        return min(values) if values else None
+
+    def percentile(self, q: float) -> Optional[int]:
+        """Percentil q (0-1) con error relativo <= SKETCH_RELATIVE_ACCURACY"""
+        total = sum(self.sketch.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for bucket in sorted(self.sketch):
+            seen += self.sketch[bucket]
+            if seen > rank:
+                return round(2 * _GAMMA ** bucket / (_GAMMA + 1))
+        return round(2 * _GAMMA ** max(self.sketch) / (_GAMMA + 1))
+
+    def to_public(self) -> Dict[str, Any]:
+        euros = lambda cents: round(cents / 100, 2) if cents is not None else None
+        return {
+            'observations': self.observations,
+            'min_euros': euros(self.min_cents),
+            'min_at': self.min_at.isoformat() if self.min_at else None,
+            'max_euros': euros(self.max_cents),
+            'last_euros': euros(self.last_cents),
+            'last_at': self.last_at.isoformat() if self.last_at else None,
+            'min_30d_euros': euros(self.min_last_days(WINDOW_DAYS)),
+            'ewma_euros': euros(self.ewma),
+            'volatility': round(self.volatility, 4) if self.volatility is not None else None,
+            'p10_euros': euros(self.percentile(0.1)),
+            'p50_euros': euros(self.percentile(0.5)),
+            'p90_euros': euros(self.percentile(0.9)),
+            'trend': self.trend,
+        }
+
+    # ------------------------------------------------------------------------
+    # Filas de BD
+    # ------------------------------------------------------------------------
+
+    def to_row(self) -> Tuple:
+        return tuple(
+            json.dumps(self.sketch) if name == 'sketch' else getattr(self, name)
+            for name in STATS_COLUMNS
+        )
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> 'PriceStats':
+        stats = cls()
+        for name, value in zip(STATS_COLUMNS, row):
+            if name == 'sketch':
+                value = {int(bucket): count for bucket, count in (value or {}).items()}
+            elif name == 'daily_min':
+                value = list(value or [])
+            elif name == 'ewm_var':
+                value = value or 0.0
+            elif name == 'observations':
+                value = value or 0
+            setattr(stats, name, value)
+        return stats
+
+
+# ============================================================================
+# ACCESO A BD (DENTRO DE LA TRANSACCIÓN DEL SNAPSHOT)
+# ============================================================================
+
+def _locked_stats(cur, table: str, key_columns: Tuple[str, ...], key: Tuple) -> PriceStats:
+    """Crea la fila si no existe y la bloquea hasta el commit"""
+    where = ' AND '.join(f"{column} = %s" for column in key_columns)
+    cur.execute(
+        f"INSERT INTO {table} ({', '.join(key_columns)}) VALUES ({', '.join(['%s'] * len(key))}) "
+        f"ON CONFLICT DO NOTHING",
+        key
+    )
+    cur.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM {table} WHERE {where} FOR UPDATE", key)
+    return PriceStats.from_row(cur.fetchone())
+
+
+def _save_stats(cur, table: str, key_columns: Tuple[str, ...], key: Tuple, stats: PriceStats):
+    assignments = ', '.join(f"{column} = %s" for column in STATS_COLUMNS)
+    where = ' AND '.join(f"{column} = %s" for column in key_columns)
+    cur.execute(f"UPDATE {table} SET {assignments}, updated_at = NOW() WHERE {where}", stats.to_row() + key)
+
+
+def update_stats(cur, alert_id: int, origin: str, destination: str, price_cents: Optional[int],
+                 observed_at: Optional[datetime] = None, observation: Optional[str] = None) -> Optional[Deal]:
+    """
+    Añade un precio a las estadísticas de la alerta y de su ruta. Siempre en el
+    mismo orden (alerta y luego ruta) para que dos transacciones no se bloqueen mutuamente.
+    Devuelve el chollo si el precio es una bajada anómala para la ruta. Si la ruta
+    ya contó la misma observation, no se vuelve a sumar y se devuelve su chollo.
+    """
+    if price_cents is None:
+        return None
+    observed_at = observed_at or datetime.now()
+
+    alert_key = (alert_id,)
+    stats = _locked_stats(cur, ALERT_TABLE, ('alert_id',), alert_key)
+    stats.update(price_cents, observed_at)
+    _save_stats(cur, ALERT_TABLE, ('alert_id',), alert_key, stats)
+
+    route_columns, route_key = ('origin', 'destination'), (origin.upper(), destination.upper())
+    stats = _locked_stats(cur, ROUTE_TABLE, route_columns, route_key)
+    recent = _recent_observations(cur, route_key) if observation is not None else []
+    for key, stored in recent:
+        if key == observation:
+            return Deal(*stored) if stored else None
+
+    deal = stats.detect_deal(price_cents)
+    stats.update(price_cents, observed_at)
+    _save_stats(cur, ROUTE_TABLE, route_columns, route_key, stats)
+    if observation is not None:
+        recent = (recent + [[observation, list(deal) if deal else None]])[-ROUTE_OBSERVATIONS_KEPT:]
+        cur.execute(
+            f"UPDATE {ROUTE_TABLE} SET recent_observations = %s WHERE origin = %s AND destination = %s",
+            (json.dumps(recent),) + route_key
+        )
+    return deal
+
+
+def _recent_observations(cur, route_key: Tuple[str, str]) -> List[List]:
+    """[clave, chollo o None] de las últimas observaciones de la ruta (fila ya bloqueada)"""
+    cur.execute(
+        f"SELECT recent_observations FROM {ROUTE_TABLE} WHERE origin = %s AND destination = %s",
+        route_key
+    )
+    row = cur.fetchone()
+    return list(row[0] or []) if row else []
+
+
+def get_alert_stats(cur, alert_id: int) -> Optional[PriceStats]:
+    cur.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM {ALERT_TABLE} WHERE alert_id = %s", (alert_id,))
+    row = cur.fetchone()
+    return PriceStats.from_row(row) if row else None
+
+
+def get_route_stats(cur, origin: str, destination: str) -> Optional[PriceStats]:
+    cur.execute(
+        f"SELECT {', '.join(STATS_COLUMNS)} FROM {ROUTE_TABLE} WHERE origin = %s AND destination = %s",
+        (origin.upper(), destination.upper())
+    )
+    row = cur.fetchone()
+    return PriceStats.from_row(row) if row else None
@@ -0,0 +1,82 @@
+# ============================================================================
+# PURGA EN SEGUNDO PLANO DEL HISTÓRICO DE ALERTAS ELIMINADAS
+# ============================================================================
+# DELETE /alerts/{id} solo marca la alerta con deleted_at. El histórico
+# (search_snapshots, notifications_sent) se borra aquí en lotes pequeños,
+# cada uno en su propia transacción, para no bloquear los inserts del worker.
+# ============================================================================
+
+import os
+import time
+import logging
+from typing import List
+
+from backend import db
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "1000"))
+PURGE_PAUSE_SECONDS = float(os.getenv("PURGE_PAUSE_SECONDS", "0.05"))
+
+# Tablas hijas de alerts que se purgan por lotes (la tabla es fija, nunca viene del usuario)
+HISTORY_TABLES = ("notifications_sent", "search_snapshots")
+
+
+def purge_alert_history(alert_id: int, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+    """
+    Borra por lotes el histórico de una alerta eliminada y después la propia alerta.
+    Devuelve el número de filas de histórico borradas.
+    """
+    conn = db.get_connection()
+    cur = conn.cursor()
+    total_deleted = 0
+    try:
+        for table in HISTORY_TABLES:
+            while True:
+                cur.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table} WHERE alert_id = %s LIMIT %s
+                    );
+                    """,
+                    (alert_id, chunk_size)
+                )
+                deleted = cur.rowcount
+                conn.commit()
+                total_deleted += deleted
+                if deleted < chunk_size:
+                    break
+                # Pequeña pausa entre lotes para dejar pasar al worker
+                time.sleep(PURGE_PAUSE_SECONDS)
+
+        # Lo que el worker haya insertado mientras tanto cae por ON DELETE CASCADE
+        cur.execute("DELETE FROM alerts WHERE id = %s AND deleted_at IS NOT NULL;", (alert_id,))
+        conn.commit()
+        logger.info(f"🧹 Alerta {alert_id} purgada ({total_deleted} filas de histórico)")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"❌ Error purgando alerta {alert_id}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+    return total_deleted
+
+
+def purge_pending_deletions() -> List[int]:
+    """
+    Termina las purgas que quedaron a medias (por ejemplo tras un reinicio del backend).
+    """
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id FROM alerts WHERE deleted_at IS NOT NULL ORDER BY deleted_at ASC;")
+        alert_ids = [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+    for alert_id in alert_ids:
+        purge_alert_history(alert_id)
+    return alert_ids
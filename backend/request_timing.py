@@ -0,0 +1,86 @@
+# ============================================================================
+# TIEMPOS POR PETICIÓN (BD, PROVEEDOR DE VUELOS, SERIALIZACIÓN)
+# ============================================================================
+# El middleware de backend/http_metrics.py abre un RequestTimings por petición
+# (contextvar, que Starlette copia al threadpool de los endpoints síncronos) y
+# el código que hace E/S suma su tiempo con track(fase):
+# - db.get_connection conecta dentro de track('db') y sus cursores (TimedCursor)
+#   cuentan execute/fetch como 'db',
+# - flights_api mide las llamadas a RapidAPI como 'upstream'.
+# Fuera de una petición (worker, scripts) track() no hace nada.
+# ============================================================================
+
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2.extensions
+
+PHASES = ('db', 'upstream', 'serialize')
+
+
+class RequestTimings:
+    """Segundos acumulados por fase durante una petición"""
+
+    __slots__ = ('phases', 'threads')
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        # Hilos que ejecutan el endpoint (los muestrea el profiler de peticiones lentas)
+        self.threads = set()
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar('request_timings', default=None)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def begin() -> contextvars.Token:
+    return _current.set(RequestTimings())
+
+
+def end(token: contextvars.Token):
+    _current.reset(token)
+
+
+@contextmanager
+def track(phase: str):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor que suma a la fase 'db' de la petición el tiempo de las consultas y lecturas"""
+
+    def execute(self, query, vars=None):
+        with track('db'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with track('db'):
+            return super().executemany(query, vars_list)
+
+    def fetchone(self):
+        with track('db'):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with track('db'):
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        with track('db'):
+            return super().fetchall()
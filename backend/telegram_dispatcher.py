@@ -0,0 +1,398 @@
+# ============================================================================
+# DESPACHADOR DE MENSAJES DE TELEGRAM CON LÍMITES DE ENVÍO
+# ============================================================================
+# Cola de salida asíncrona (asyncio en un hilo propio) para no enviar en
+# medio del procesamiento de alertas:
+# - respeta el límite global del bot (~30 mensajes/s, token bucket) y el de
+#   cada chat (1 mensaje/s),
+# - ante un 429 espera el retry_after que indica Telegram antes de volver a
+#   escribir en ese chat; los errores de red y 5xx se reintentan con backoff,
+# - los mensajes pendientes de un mismo chat se juntan en uno solo (hasta el
+#   máximo de 4096 caracteres de Telegram), así que cuando baja una ruta con
+#   muchas alertas del mismo usuario le llega un mensaje y no veinte,
+# - cada mensaje puede llevar una clave (para no encolarlo dos veces) y
+#   callbacks para cuando Telegram lo acepta o se da por perdido (los usa el
+#   relay de backend/outbox.py para marcar la fila del outbox),
+# - observe(segundos, resultado) se llama tras cada envío (métricas del worker).
+#
+# El worker encola con submit() desde su hilo y sigue buscando.
+# ============================================================================
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Límites de Telegram para un bot
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))   # mensajes/s en total
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))        # mensajes/s por chat
+
+# Envíos en vuelo a la vez y reintentos de errores transitorios
+MAX_IN_FLIGHT = int(os.getenv('TELEGRAM_MAX_IN_FLIGHT', '16'))
+MAX_ATTEMPTS = int(os.getenv('TELEGRAM_MAX_ATTEMPTS', '5'))
+
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class SendResult(NamedTuple):
+    ok: bool
+    retry_after: Optional[float] = None   # 429: segundos a esperar
+    retryable: bool = False               # error de red o 5xx
+    description: str = ''
+
+
+class OutgoingMessage:
+    """
+    Mensaje encolado; attempts cuenta los envíos fallidos. on_failed recibe el
+    error y si merece la pena reintentarlo más adelante.
+    """
+
+    __slots__ = ('chat_id', 'text', 'parse_mode', 'key', 'on_sent', 'on_failed', 'attempts')
+
+    def __init__(self, chat_id: int, text: str, parse_mode: Optional[str] = 'Markdown',
+                 key: Optional[str] = None, on_sent: Optional[Callable[[], None]] = None,
+                 on_failed: Optional[Callable[[str, bool], None]] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.key = key
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.attempts = 0
+
+
+class TokenBucket:
+    """
+    rate tokens por segundo con ráfagas de hasta capacity. Con capacity=1 los
+    envíos quedan espaciados y ninguna ventana de 1 s supera rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Segundos hasta que haya un token (0 si ya lo hay)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+SendFunction = Callable[[int, str, Optional[str]], Awaitable[SendResult]]
+
+
+class TelegramDispatcher:
+    """
+    Cola de salida de Telegram. start() arranca el hilo con su bucle asyncio,
+    submit() encola desde cualquier hilo y stop() vacía la cola (con límite de tiempo).
+    """
+
+    def __init__(self, token: Optional[str] = None, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, send: Optional[SendFunction] = None,
+                 observe: Optional[Callable[[float, SendResult], None]] = None):
+        self.token = token
+        self.observe = observe
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_interval = 1.0 / chat_rate
+        self._send_override = send
+
+        self._pending: Dict[int, Deque[OutgoingMessage]] = {}
+        self._keys: Set[str] = set()
+        self._chat_ready_at: Dict[int, float] = {}
+        self._schedule: List = []   # heap (listo_en, secuencia, chat_id)
+        self._sequence = 0
+        self._in_flight: Set[asyncio.Task] = set()
+        # Lotes cuyo envío se canceló al abandonar la cola en stop()
+        self._cancelled: List[OutgoingMessage] = []
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._stopping = False
+        self._abandoned = False
+        self._lock = threading.Lock()
+
+        self.stats = {'queued': 0, 'sent': 0, 'messages_sent': 0, 'rate_limited': 0, 'retried': 0, 'dropped': 0}
+
+    # ------------------------------------------------------------------------
+    # API pública (desde cualquier hilo)
+    # ------------------------------------------------------------------------
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()),
+                                        name='telegram-dispatcher', daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def submit(self, chat_id: int, text: str, parse_mode: Optional[str] = 'Markdown',
+               key: Optional[str] = None, on_sent: Optional[Callable[[], None]] = None,
+               on_failed: Optional[Callable[[str, bool], None]] = None) -> bool:
+        """Encola un mensaje. False si ya hay uno pendiente con la misma clave o está parado."""
+        if not self._loop or self._stopping:
+            return False
+        with self._lock:
+            if key is not None:
+                if key in self._keys:
+                    return False
+                self._keys.add(key)
+        message = OutgoingMessage(chat_id, text, parse_mode, key, on_sent, on_failed)
+        self._loop.call_soon_threadsafe(self._enqueue, message)
+        return True
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in list(self._pending.values()))
+
+    def stop(self, timeout: float = 10.0) -> List[OutgoingMessage]:
+        """
+        Deja de aceptar mensajes y espera (como mucho timeout) a que se envíen los
+        pendientes. Si no da tiempo, cancela los envíos en vuelo y devuelve los
+        mensajes que no llegaron a salir (sus callbacks no se llaman): primero los
+        cancelados, que Telegram puede haber recibido ya, y luego los de la cola.
+        """
+        if not self._thread:
+            return []
+        self._stopping = True
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            try:
+                self._loop.call_soon_threadsafe(self._abandon)
+            except RuntimeError:
+                pass   # el bucle acaba de cerrarse
+            self._thread.join(1.0)
+        unsent = self._cancelled + [message for queue in list(self._pending.values()) for message in queue]
+        if unsent:
+            logger.warning(f"⚠️ Despachador de Telegram detenido con {len(unsent)} mensajes sin enviar")
+        self._thread = None
+        return unsent
+
+    # ------------------------------------------------------------------------
+    # Bucle asyncio
+    # ------------------------------------------------------------------------
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+        async with httpx.AsyncClient(timeout=10) as client:
+            self._client = client
+            self._started.set()
+            await self._run()
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _enqueue(self, message: OutgoingMessage, front: bool = False):
+        queue = self._pending.get(message.chat_id)
+        if queue is None:
+            queue = self._pending[message.chat_id] = deque()
+            self._schedule_chat(message.chat_id, self._chat_ready_at.get(message.chat_id, 0.0))
+        if front:
+            queue.appendleft(message)
+        else:
+            queue.append(message)
+            self.stats['queued'] += 1
+        self._wakeup.set()
+
+    def _schedule_chat(self, chat_id: int, ready_at: float):
+        self._sequence += 1
+        heapq.heappush(self._schedule, (ready_at, self._sequence, chat_id))
+
+    def _abandon(self):
+        self._abandoned = True
+        for task in self._in_flight:
+            task.cancel()
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if self._abandoned:
+                return
+            if self._stopping and not self._pending and not self._in_flight:
+                return
+            now = time.monotonic()
+
+            if not self._schedule or self._schedule[0][0] > now:
+                await self._wait_for_wakeup(self._schedule[0][0] - now if self._schedule else None)
+                continue
+
+            ready_at, _, chat_id = heapq.heappop(self._schedule)
+            if chat_id not in self._pending:
+                continue
+            # El chat se bloqueó después de programarlo (429 o envío reciente)
+            if self._chat_ready_at.get(chat_id, 0.0) > now:
+                self._schedule_chat(chat_id, self._chat_ready_at[chat_id])
+                continue
+
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                heapq.heappush(self._schedule, (ready_at, _, chat_id))
+                await self._wait_for_wakeup(global_wait)
+                continue
+
+            await self._semaphore.acquire()
+            self.global_bucket.take(time.monotonic())
+            batch = self._take_batch(chat_id)
+            self._chat_ready_at[chat_id] = time.monotonic() + self.chat_interval
+            if chat_id in self._pending:
+                self._schedule_chat(chat_id, self._chat_ready_at[chat_id])
+
+            task = asyncio.create_task(self._deliver(chat_id, batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._send_finished)
+            self._forget_idle_chats(now)
+
+    async def _wait_for_wakeup(self, timeout: Optional[float]):
+        """Espera como mucho timeout; un mensaje nuevo o stop() la cortan"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _send_finished(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        # Al parar, el bucle espera a que terminen los envíos en vuelo
+        self._wakeup.set()
+
+    def _take_batch(self, chat_id: int) -> List[OutgoingMessage]:
+        """Mensajes pendientes del chat que caben en uno (mismo parse_mode)"""
+        queue = self._pending[chat_id]
+        batch = [queue.popleft()]
+        length = len(batch[0].text)
+        while queue and queue[0].parse_mode == batch[0].parse_mode:
+            length += len(COALESCE_SEPARATOR) + len(queue[0].text)
+            if length > MAX_MESSAGE_LENGTH:
+                break
+            batch.append(queue.popleft())
+        if not queue:
+            del self._pending[chat_id]
+        return batch
+
+    def _forget_idle_chats(self, now: float):
+        """Los chats sin pendientes y ya libres no necesitan recordar su último envío"""
+        if len(self._chat_ready_at) > 10000:
+            for chat_id in [c for c, t in self._chat_ready_at.items() if t <= now and c not in self._pending]:
+                del self._chat_ready_at[chat_id]
+
+    async def _deliver(self, chat_id: int, batch: List[OutgoingMessage]):
+        started = time.perf_counter()
+        try:
+            text = COALESCE_SEPARATOR.join(message.text for message in batch)
+            result = await self._send(chat_id, text, batch[0].parse_mode)
+        except asyncio.CancelledError:
+            # stop() sin tiempo: el lote vuelve con los pendientes, aunque puede haber llegado
+            self._cancelled.extend(batch)
+            raise
+        except Exception as e:
+            result = SendResult(False, retryable=True, description=str(e))
+        finally:
+            self._semaphore.release()
+        if self.observe:
+            self.observe(time.perf_counter() - started, result)
+
+        if result.ok:
+            self.stats['sent'] += 1
+            self.stats['messages_sent'] += len(batch)
+            self._finish(batch)
+            for message in batch:
+                if message.on_sent:
+                    await self._loop.run_in_executor(None, self._run_callback, message, message.on_sent)
+            return
+
+        if result.retry_after is not None:
+            self.stats['rate_limited'] += 1
+            logger.warning(f"⏳ Telegram pide esperar {result.retry_after}s para el chat {chat_id}")
+            self._requeue(chat_id, batch, time.monotonic() + result.retry_after)
+            return
+
+        if result.retryable:
+            for message in batch:
+                message.attempts += 1
+            retry = [message for message in batch if message.attempts < MAX_ATTEMPTS]
+            self._drop([message for message in batch if message.attempts >= MAX_ATTEMPTS], result.description,
+                       retryable=True)
+            if retry:
+                self.stats['retried'] += 1
+                self._requeue(chat_id, retry, time.monotonic() + min(60.0, 2 ** retry[0].attempts))
+            return
+
+        # 400/403: chat inexistente, bot bloqueado... no tiene sentido reintentar
+        self._drop(batch, result.description, retryable=False)
+
+    def _requeue(self, chat_id: int, batch: List[OutgoingMessage], ready_at: float):
+        self._chat_ready_at[chat_id] = max(self._chat_ready_at.get(chat_id, 0.0), ready_at)
+        for message in reversed(batch):
+            self._enqueue(message, front=True)
+
+    def _drop(self, batch: List[OutgoingMessage], reason: str, retryable: bool):
+        if not batch:
+            return
+        self.stats['dropped'] += len(batch)
+        logger.error(f"❌ Descartados {len(batch)} mensajes para el chat {batch[0].chat_id}: {reason}")
+        self._finish(batch)
+        for message in batch:
+            if message.on_failed:
+                self._loop.run_in_executor(None, self._run_callback, message, message.on_failed, reason, retryable)
+
+    def _finish(self, batch: List[OutgoingMessage]):
+        with self._lock:
+            for message in batch:
+                self._keys.discard(message.key)
+
+    @staticmethod
+    def _run_callback(message: OutgoingMessage, callback: Callable, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"❌ Error tras enviar mensaje al chat {message.chat_id}: {e}")
+
+    # ------------------------------------------------------------------------
+    # Envío real (Bot API)
+    # ------------------------------------------------------------------------
+
+    async def _send(self, chat_id: int, text: str, parse_mode: Optional[str]) -> SendResult:
+        if self._send_override:
+            return await self._send_override(chat_id, text, parse_mode)
+
+        payload = {'chat_id': chat_id, 'text': text, 'disable_web_page_preview': False}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        try:
+            response = await self._client.post(f"{TELEGRAM_API_URL}/bot{self.token}/sendMessage", json=payload)
+        except httpx.HTTPError as e:
+            return SendResult(False, retryable=True, description=str(e))
+
+        if response.status_code == 200:
+            return SendResult(True)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        description = body.get('description', response.text[:200])
+        if response.status_code == 429:
+            retry_after = (body.get('parameters') or {}).get('retry_after', 1)
+            return SendResult(False, retry_after=float(retry_after), description=description)
+        return SendResult(False, retryable=response.status_code >= 500, description=description)
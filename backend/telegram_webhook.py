@@ -0,0 +1,217 @@
+# ============================================================================
+# WEBHOOK DEL BOT DE TELEGRAM (APP ASGI)
+# ============================================================================
+# Alternativa al polling: Telegram hace POST de cada update a una URL pública
+# y esta app ASGI (Starlette, la misma base que FastAPI) lo procesa:
+# - comprueba la cabecera X-Telegram-Bot-Api-Secret-Token contra
+#   TELEGRAM_WEBHOOK_SECRET (sin secreto no arranca: cualquiera podría
+#   inyectar updates falsos),
+# - responde 200 en cuanto el update está en marcha y lo procesa en una tarea;
+#   los updates de chats distintos van en paralelo (hasta
+#   WEBHOOK_CONCURRENT_UPDATES) y los de un mismo chat en orden de llegada,
+# - con más de WEBHOOK_MAX_PENDING updates sin terminar contesta 503 y
+#   Telegram lo reintenta más tarde,
+# - no guarda estado propio: se pueden levantar varias réplicas detrás de un
+#   balanceador. Si TELEGRAM_WEBHOOK_URL está definida, cada réplica registra
+#   el webhook al arrancar (setWebhook es idempotente).
+#
+# Se sirve sola (BOT_MODE=webhook en bot/bot.py, o
+# `uvicorn --factory backend.telegram_webhook:create_app`) o montada en el
+# backend con BOT_WEBHOOK_MOUNT=true (ver backend/main.py).
+# ============================================================================
+
+import os
+import hmac
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional, Set
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/webhook')
+
+# Updates procesándose a la vez y máximo sin terminar antes de responder 503
+WEBHOOK_CONCURRENT_UPDATES = int(os.getenv('WEBHOOK_CONCURRENT_UPDATES', '64'))
+WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', '1000'))
+
+# Conexiones simultáneas que Telegram abre hacia el webhook (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# update_id recientes para ignorar reentregas de Telegram
+RECENT_UPDATES = 10000
+
+
+class TelegramWebhook:
+    """
+    Recibe updates por HTTP y los pasa a una Application de python-telegram-bot.
+    start()/stop() inicializan y paran la Application; asgi_app() los engancha
+    al lifespan, o los llama el backend si monta la app.
+    """
+
+    def __init__(self, application: Application, secret_token: str = WEBHOOK_SECRET,
+                 webhook_url: str = WEBHOOK_URL, max_pending: int = WEBHOOK_MAX_PENDING):
+        if not secret_token:
+            raise RuntimeError("TELEGRAM_WEBHOOK_SECRET es obligatorio en modo webhook")
+        self.application = application
+        self.secret_token = secret_token
+        self.webhook_url = webhook_url
+        self.max_pending = max_pending
+        self.pending = 0
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+        self._recent: Deque[int] = deque()
+        self._recent_ids: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {'received': 0, 'processed': 0, 'duplicates': 0, 'rejected': 0, 'overloaded': 0}
+
+    async def start(self):
+        await self.application.initialize()
+        await self.application.start()
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                self.webhook_url, secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES, max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"🔗 Webhook registrado en {self.webhook_url}")
+        logger.info("🤖 Webhook del bot listo")
+
+    async def stop(self):
+        # Terminar los updates en curso antes de cerrar la Application
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.application.stop()
+        await self.application.shutdown()
+
+    # ------------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------------
+
+    async def handle_update(self, request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.stats['rejected'] += 1
+            return Response(status_code=403)
+        if self.pending >= self.max_pending:
+            self.stats['overloaded'] += 1
+            return Response(status_code=503)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logger.warning(f"⚠️ Update no válido: {e}")
+            return Response(status_code=400)
+
+        self.stats['received'] += 1
+        if not self._remember(update.update_id):
+            self.stats['duplicates'] += 1
+            return Response(status_code=200)
+
+        self.pending += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return Response(status_code=200)
+
+    async def health(self, request: Request) -> Response:
+        return JSONResponse({"status": "ok", "pending": self.pending, **self.stats})
+
+    def asgi_app(self, lifespan: bool = True) -> Starlette:
+        """App ASGI con el webhook; sin lifespan cuando la monta otra app que llama a start()/stop()"""
+        @asynccontextmanager
+        async def run(app):
+            await self.start()
+            try:
+                yield
+            finally:
+                await self.stop()
+
+        return Starlette(
+            routes=[
+                Route(WEBHOOK_PATH, self.handle_update, methods=["POST"]),
+                Route("/health", self.health, methods=["GET"]),
+            ],
+            lifespan=run if lifespan else None
+        )
+
+    # ------------------------------------------------------------------------
+    # PROCESADO
+    # ------------------------------------------------------------------------
+
+    def _remember(self, update_id: int) -> bool:
+        """False si el update ya se recibió (Telegram lo reentrega si tardamos en responder)"""
+        if update_id in self._recent_ids:
+            return False
+        self._recent.append(update_id)
+        self._recent_ids.add(update_id)
+        if len(self._recent) > RECENT_UPDATES:
+            self._recent_ids.discard(self._recent.popleft())
+        return True
+
+    async def _process(self, update: Update):
+        chat_id = _chat_key(update)
+        try:
+            if chat_id is None:
+                await self._run(update)
+                return
+            # Los updates de un chat esperan su turno (asyncio.Lock respeta el orden
+            # de llegada) antes de ocupar uno de los huecos de concurrencia
+            lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+            self._chat_waiters[chat_id] = self._chat_waiters.get(chat_id, 0) + 1
+            try:
+                async with lock:
+                    await self._run(update)
+            finally:
+                self._chat_waiters[chat_id] -= 1
+                if not self._chat_waiters[chat_id]:
+                    del self._chat_waiters[chat_id]
+                    del self._chat_locks[chat_id]
+        finally:
+            self.pending -= 1
+            self.stats['processed'] += 1
+
+    async def _run(self, update: Update):
+        try:
+            await self.application.update_processor.process_update(
+                update, self.application.process_update(update)
+            )
+        except Exception as e:
+            logger.error(f"❌ Error procesando el update {update.update_id}: {e}")
+
+
+def _chat_key(update: Update) -> Optional[int]:
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+def create_webhook(token: str, build_application: Callable[..., Application],
+                   concurrent_updates: int = WEBHOOK_CONCURRENT_UPDATES, secret_token: str = WEBHOOK_SECRET,
+                   webhook_url: str = WEBHOOK_URL, **builder_options) -> TelegramWebhook:
+    """Webhook con la Application que construye build_application (la de bot/bot.py)"""
+    application = build_application(token, concurrent_updates=concurrent_updates, **builder_options)
+    return TelegramWebhook(application, secret_token=secret_token, webhook_url=webhook_url)
+
+
+def create_app() -> Starlette:
+    """Factoría para `uvicorn --factory backend.telegram_webhook:create_app`"""
+    from bot.bot import build_application
+
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    if not token:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN no definido")
+    return create_webhook(token, build_application).asgi_app()
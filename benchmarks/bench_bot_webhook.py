@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: BOT EN MODO WEBHOOK (backend/telegram_webhook.py)
+# ============================================================================
+# Generador de updates falsos de Telegram (/start, /help, /mis_alertas, /crear_alerta y
+# pulsaciones de botones repartidos entre muchos chats) que se envían por POST
+# al webhook con la cabecera del secreto. Dos modos:
+# - por defecto, en proceso: la app ASGI con los handlers reales de
+#   bot/bot.py, una Bot API falsa (sin red) y un backend falso, ambos con una
+#   latencia configurable. Compara procesar los updates de uno en uno frente a
+#   en paralelo: updates/s, latencia de la respuesta al POST y de cada update.
+# - con --url: carga contra un webhook desplegado (una o varias réplicas
+#   detrás de un balanceador); solo mide las respuestas HTTP.
+#
+# Uso:
+#   python benchmarks/bench_bot_webhook.py [--updates 2000] [--chats 500] [--concurrency 1,64]
+#   python benchmarks/bench_bot_webhook.py --url http://localhost:8080/webhook --secret $TELEGRAM_WEBHOOK_SECRET
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from telegram.request import BaseRequest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.telegram_webhook import SECRET_HEADER, WEBHOOK_PATH, TelegramWebhook, create_webhook
+
+SECRET = "bench-secret"
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BenchBot", "username": "bench_bot"}
+COMMANDS = ["/start", "/help", "/mis_alertas", "/crear_alerta"]
+
+
+# ============================================================================
+# GENERADOR DE UPDATES FALSOS
+# ============================================================================
+
+def fake_updates(count: int, chats: int, seed: int = 7, first_id: int = 1):
+    """Updates con la forma de la Bot API: comandos y callback_query del menú"""
+    rng = random.Random(seed)
+    for update_id in range(first_id, first_id + count):
+        chat_id = 100_000 + rng.randrange(chats)
+        user = {"id": chat_id, "is_bot": False, "first_name": f"Usuario{chat_id}"}
+        chat = {"id": chat_id, "type": "private", "first_name": user["first_name"]}
+        message = {"message_id": update_id, "date": int(time.time()), "chat": chat, "from": user}
+        if rng.random() < 0.25:
+            message = {**message, "from": BOT_USER, "text": "menú"}
+            yield {"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(chat_id),
+                "data": "help", "message": message
+            }}
+        else:
+            command = rng.choice(COMMANDS)
+            yield {"update_id": update_id, "message": {
+                **message, "text": command,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            }}
+
+
+# ============================================================================
+# BOT API Y BACKEND FALSOS
+# ============================================================================
+
+class FakeBotRequest(BaseRequest):
+    """Bot API en memoria: responde a cada método tras `latency` segundos"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        self.calls += 1
+        api_method = url.rsplit('/', 1)[-1]
+        await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method in ('sendMessage', 'editMessageText'):
+            chat_id = params.get('chat_id', 0)
+            result = {"message_id": 1, "date": int(time.time()), "text": params.get('text', ''),
+                      "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def start_fake_backend(latency: float) -> ThreadingHTTPServer:
+    """Backend con /users y /alerts vacíos, para que los handlers hagan sus llamadas"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, payload):
+            time.sleep(latency)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply({"users": []} if self.path.startswith('/users') else {"alerts": []})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self._reply({"user_id": 1})
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ============================================================================
+# CARGA
+# ============================================================================
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def post_updates(client: httpx.AsyncClient, url: str, secret: str, updates, connections: int):
+    """Envía los updates con `connections` POST a la vez (reintentando los 503); devuelve latencias y códigos"""
+    queue = list(updates)
+    queue.reverse()
+    latencies, statuses = [], {}
+
+    async def sender():
+        while queue:
+            update = queue.pop()
+            while True:
+                started = time.perf_counter()
+                response = await client.post(url, json=update, headers={SECRET_HEADER: secret})
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code != 503:
+                    break
+                # Webhook saturado: Telegram reintentaría más tarde
+                await asyncio.sleep(0.1)
+
+    await asyncio.gather(*(sender() for _ in range(connections)))
+    return latencies, statuses
+
+
+async def run_inprocess(args, concurrency: int) -> dict:
+    from bot.bot import build_application
+
+    bot_api = FakeBotRequest(args.api_latency_ms / 1000)
+    webhook: TelegramWebhook = create_webhook(
+        "123456:BENCH", build_application, concurrent_updates=concurrency, secret_token=SECRET,
+        webhook_url='', request=bot_api, get_updates_request=FakeBotRequest(0)
+    )
+    await webhook.start()
+
+    transport = httpx.ASGITransport(app=webhook.asgi_app(lifespan=False))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+            started = time.perf_counter()
+            latencies, statuses = await post_updates(
+                client, WEBHOOK_PATH, SECRET, fake_updates(args.updates, args.chats), args.connections
+            )
+            acked = time.perf_counter() - started
+            while webhook.pending:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - started
+    finally:
+        await webhook.stop()
+
+    return {
+        "concurrency": concurrency,
+        "updates_per_s": round(args.updates / elapsed, 1),
+        "ack_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "ack_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "acked_s": round(acked, 2),
+        "total_s": round(elapsed, 2),
+        "bot_api_calls": bot_api.calls,
+        "statuses": statuses,
+    }
+
+
+async def run_remote(args) -> dict:
+    async with httpx.AsyncClient(timeout=30) as client:
+        started = time.perf_counter()
+        latencies, statuses = await post_updates(
+            client, args.url, args.secret, fake_updates(args.updates, args.chats, first_id=args.first_id),
+            args.connections
+        )
+        elapsed = time.perf_counter() - started
+    return {
+        "url": args.url,
+        "requests_per_s": round(args.updates / elapsed, 1),
+        "ack_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "ack_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del bot en modo webhook")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--connections', type=int, default=40, help="POST simultáneos (max_connections de Telegram)")
+    parser.add_argument('--concurrency', default='1,64', help="Updates procesándose a la vez, separados por comas")
+    parser.add_argument('--api-latency-ms', type=float, default=30, help="Latencia de la Bot API falsa")
+    parser.add_argument('--backend-latency-ms', type=float, default=10, help="Latencia del backend falso")
+    parser.add_argument('--url', help="Webhook desplegado al que enviar los updates (modo remoto)")
+    parser.add_argument('--secret', default=os.getenv('TELEGRAM_WEBHOOK_SECRET', ''))
+    parser.add_argument('--first-id', type=int, default=int(time.time()), help="update_id inicial (modo remoto)")
+    parser.add_argument('--json', help="Guardar resultados en este fichero")
+    args = parser.parse_args()
+
+    if args.url:
+        results = [asyncio.run(run_remote(args))]
+    else:
+        # El bot lee BACKEND_URL al importarse
+        backend = start_fake_backend(args.backend_latency_ms / 1000)
+        os.environ['BACKEND_URL'] = f"http://127.0.0.1:{backend.server_address[1]}"
+        results = [asyncio.run(run_inprocess(args, int(c))) for c in args.concurrency.split(',')]
+        backend.shutdown()
+
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
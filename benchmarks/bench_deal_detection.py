@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: DETECCIÓN DE CHOLLOS EN STREAMING (backend/price_stats.py)
+# ============================================================================
+# Reproduce en orden cronológico un histórico sintético (price_history.py) con
+# bajadas de precio inyectadas y pasa cada snapshot por las estadísticas de su
+# ruta, como hace el worker al guardar. Mide:
+# - coste por snapshot solo de actualizar las estadísticas
+# - coste por snapshot de detectar + actualizar (lo que se añade al ciclo)
+# - chollos detectados frente a bajadas inyectadas (acierto y falsos positivos)
+#
+# Uso:
+#   python benchmarks/bench_deal_detection.py [--snapshots 1000000] [--routes 200] [--deal-rate 0.001]
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.price_history import generate_snapshots
+from backend.price_stats import PriceStats
+
+
+def build_stream(snapshots: int, routes: int, deal_rate: float, deal_factor: float, seed: int = 7):
+    history = generate_snapshots(snapshots, routes=routes).sort_values('found_at', kind='stable')
+    rng = np.random.default_rng(seed)
+    injected = rng.random(len(history)) < deal_rate
+    prices = history['price'].to_numpy(dtype=np.float64)
+    prices = np.where(injected, prices * deal_factor, prices).round().astype(np.int64)
+    return (
+        history['route'].cat.codes.to_numpy().tolist(),
+        prices.tolist(),
+        history['found_at'].dt.to_pydatetime().tolist(),
+        injected.tolist(),
+    )
+
+
+def replay(stream, detect: bool) -> tuple:
+    route_ids, prices, found_at, injected = stream
+    stats = {}
+    hits = false_positives = 0
+    start = time.perf_counter()
+    for route, price, observed_at, is_injected in zip(route_ids, prices, found_at, injected):
+        route_stats = stats.get(route)
+        if route_stats is None:
+            route_stats = stats[route] = PriceStats()
+        if detect and route_stats.detect_deal(price):
+            if is_injected:
+                hits += 1
+            else:
+                false_positives += 1
+        route_stats.update(price, observed_at)
+    return time.perf_counter() - start, hits, false_positives
+
+
+def run(snapshots: int, routes: int, deal_rate: float, deal_factor: float) -> dict:
+    stream = build_stream(snapshots, routes, deal_rate, deal_factor)
+    injected = sum(stream[3])
+
+    update_s, _, _ = replay(stream, detect=False)
+    detect_s, hits, false_positives = replay(stream, detect=True)
+    return {
+        'snapshots': snapshots,
+        'routes': routes,
+        'injected_deals': injected,
+        'update_only_s': round(update_s, 2),
+        'update_us_per_snapshot': round(update_s / snapshots * 1e6, 2),
+        'detect_and_update_s': round(detect_s, 2),
+        'detect_us_per_snapshot': round((detect_s - update_s) / snapshots * 1e6, 2),
+        'detected_injected': hits,
+        'recall': round(hits / injected, 3) if injected else None,
+        'false_positives': false_positives,
+        'false_positive_rate': round(false_positives / snapshots, 5),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la detección de chollos en streaming")
+    parser.add_argument('--snapshots', type=int, default=1_000_000)
+    parser.add_argument('--routes', type=int, default=200)
+    parser.add_argument('--deal-rate', type=float, default=0.001, help="Fracción de snapshots con bajada inyectada")
+    parser.add_argument('--deal-factor', type=float, default=0.55, help="Precio del chollo respecto al normal")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.snapshots, args.routes, args.deal_rate, args.deal_factor)
+    for key, value in results.items():
+        print(f"{key:<24} {value}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
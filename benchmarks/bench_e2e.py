@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK DE CARGA DE EXTREMO A EXTREMO (SIN RED EXTERNA)
+# ============================================================================
+# Levanta todo el sistema contra dependencias falsas y mide:
+# - worker: un ciclo completo sobre N alertas (tiempo, alertas/s y desglose
+#   por fase de las métricas del worker) y lo que tarda el outbox en llegar a
+#   Telegram,
+# - backend: peticiones/s y latencias p50/p99 por endpoint con varias
+#   conexiones a la vez contra uvicorn en otro proceso, y qué parte del tiempo
+#   de cada ruta es BD (GET /metrics),
+# - bot: latencia de los handlers reales de bot/bot.py procesando updates
+#   falsos contra ese backend.
+#
+# Dependencias:
+# - Postgres: el de docker-compose.yml (--docker) o uno local (DB_HOST,
+#   DB_PORT, DB_USER, DB_PASSWORD). Se usa una base de datos propia
+#   (--db-name, se borra y se crea con db/schema.sql en cada ejecución).
+# - Kiwi RapidAPI falso (KIWI_API_URL): respuestas de kiwi_payloads.py con
+#   latencia log-normal y tasas de errores 5xx y 429 configurables. También
+#   se puede grabar el tráfico con el Kiwi real (--kiwi-record, con
+#   RAPIDAPI_KEY) y reproducirlo después (--kiwi-replay) con la misma
+#   --start-date para que las búsquedas coincidan (backend/flight_traffic.py).
+# - Telegram falso (TELEGRAM_API_URL): lo usan el despachador del worker y el bot.
+#
+# El resultado es un JSON con el commit; con --history se añade a un fichero
+# JSONL y se compara con la ejecución anterior para ver regresiones.
+#
+# Uso:
+#   python benchmarks/bench_e2e.py [--users 200] [--alerts-per-user 3] [--docker]
+#   python benchmarks/bench_e2e.py --history benchmarks/results/e2e.jsonl
+# ============================================================================
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import logging
+import subprocess
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.kiwi_payloads import generate_payload
+from benchmarks.bench_bot_webhook import BOT_USER, fake_updates, percentile
+
+AIRPORTS = ['MAD', 'BCN', 'LHR', 'CDG', 'FCO', 'AMS', 'LIS', 'BER', 'DUB', 'MXP']
+TELEGRAM_TOKEN = "123456:BENCH"
+FIRST_TELEGRAM_ID = 100_000   # los chats de fake_updates() empiezan aquí
+
+
+# ============================================================================
+# SERVIDORES FALSOS (KIWI Y TELEGRAM)
+# ============================================================================
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(handler) -> Server:
+    server = Server(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_fake_kiwi(latency_ms: float, sigma: float, error_rate: float, rate_limit_rate: float,
+                    seed: int = 7) -> Server:
+    """
+    Endpoint round-trip de Kiwi: la misma respuesta para la misma ruta y día,
+    tras una latencia log-normal de mediana latency_ms.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    payloads = {}
+    stats = {'requests': 0, 'errors': 0, 'rate_limited': 0}
+
+    def payload(key: str, size: int) -> bytes:
+        cache_key = (hash(key) % 64, size)
+        if cache_key not in payloads:
+            payloads[cache_key] = json.dumps(generate_payload(size, seed=cache_key[0])).encode()
+        return payloads[cache_key]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            with lock:
+                stats['requests'] += 1
+                delay = rng.lognormvariate(math.log(max(latency_ms, 0.001) / 1000), sigma)
+                roll = rng.random()
+                outcome = 'errors' if roll < error_rate else \
+                    'rate_limited' if roll < error_rate + rate_limit_rate else None
+                if outcome:
+                    stats[outcome] += 1
+            time.sleep(delay)
+            if outcome == 'errors':
+                self._reply(500, b'{"message": "upstream error"}')
+            elif outcome == 'rate_limited':
+                self._reply(429, b'{"message": "Too many requests"}')
+            else:
+                key = f"{params.get('source')}-{params.get('destination')}-{params.get('outboundDepartureDateStart')}"
+                self._reply(200, payload(key, min(int(params.get('limit', 10)), 200)))
+
+        def _reply(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = serve(Handler)
+    server.stats = stats
+    return server
+
+
+def start_fake_telegram(latency_ms: float) -> Server:
+    """Bot API por HTTP: getMe, sendMessage, editMessageText y el resto responde True"""
+    stats = {'requests': 0, 'messages': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                params = json.loads(body) if body else {}
+            except ValueError:
+                params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            method = self.path.rsplit('/', 1)[-1]
+            time.sleep(latency_ms / 1000)
+            with lock:
+                stats['requests'] += 1
+                if method == 'sendMessage':
+                    stats['messages'] += 1
+            if method == 'getMe':
+                result = BOT_USER
+            elif method in ('sendMessage', 'editMessageText'):
+                chat_id = int(params.get('chat_id', 0))
+                result = {"message_id": 1, "date": int(time.time()), "text": params.get('text', ''),
+                          "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER}
+            else:
+                result = True
+            payload = json.dumps({"ok": True, "result": result}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    server = serve(Handler)
+    server.stats = stats
+    return server
+
+
+# ============================================================================
+# BASE DE DATOS
+# ============================================================================
+
+def start_docker_postgres():
+    """Postgres de docker-compose.yml (puerto 5433) si no hay otro configurado"""
+    subprocess.run(['docker', 'compose', 'up', '-d', 'postgres'], cwd=ROOT, check=True)
+    os.environ.setdefault('DB_HOST', 'localhost')
+    os.environ.setdefault('DB_PORT', '5433')
+    os.environ.setdefault('DB_PASSWORD', 'postgres')
+
+
+def connect(dbname: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return psycopg2.connect(
+                host=os.getenv('DB_HOST', 'localhost'), port=os.getenv('DB_PORT', '5432'),
+                user=os.getenv('DB_USER', 'postgres'), password=os.getenv('DB_PASSWORD', 'postgres'),
+                dbname=dbname
+            )
+        except psycopg2.OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+
+
+def create_database(name: str):
+    admin = connect('postgres')
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+        cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    admin.close()
+
+    conn = connect(name)
+    with conn, conn.cursor() as cur, open(os.path.join(ROOT, 'db', 'schema.sql')) as f:
+        cur.execute(f.read())
+    conn.close()
+
+
+def seed(name: str, users: int, alerts_per_user: int, start: date, seed_value: int = 42) -> dict:
+    """Usuarios con telegram_id consecutivos y alertas de rutas, fechas y objetivos aleatorios"""
+    rng = random.Random(seed_value)
+    conn = connect(name)
+    with conn, conn.cursor() as cur:
+        user_ids = [row[0] for row in execute_values(
+            cur, "INSERT INTO users (telegram_id) VALUES %s RETURNING id",
+            [(FIRST_TELEGRAM_ID + i,) for i in range(users)], fetch=True
+        )]
+        rows = []
+        for user_id in user_ids:
+            for _ in range(alerts_per_user):
+                origin, destination = rng.sample(AIRPORTS, 2)
+                rows.append((user_id, origin, destination, start + timedelta(days=rng.randint(10, 120)),
+                             rng.randint(50, 300) * 100, rng.random() < 0.2))
+        alert_ids = [row[0] for row in execute_values(
+            cur, "INSERT INTO alerts (user_id, origin, destination, date_from, price_target_cents, notify_deals) "
+                 "VALUES %s RETURNING id", rows, fetch=True
+        )]
+    conn.close()
+    return {'user_ids': user_ids, 'alert_ids': alert_ids}
+
+
+# ============================================================================
+# MÉTRICAS PROMETHEUS (worker y backend)
+# ============================================================================
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (\S+)$')
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metric(text: str, name: str) -> list:
+    """[(etiquetas, valor)] de una métrica en formato de texto de Prometheus"""
+    samples = []
+    for line in text.splitlines():
+        match = SAMPLE_RE.match(line)
+        if match and match.group(1) == name:
+            samples.append((dict(LABEL_RE.findall(match.group(2) or '')), float(match.group(3))))
+    return samples
+
+
+def summarize_histogram(text: str, name: str, label: str) -> dict:
+    sums = {labels[label]: value for labels, value in parse_metric(text, f"{name}_sum")}
+    counts = {labels[label]: value for labels, value in parse_metric(text, f"{name}_count")}
+    return {key: {"count": int(counts[key]), "total_s": round(total, 3),
+                  "mean_ms": round(total / counts[key] * 1000, 2)}
+            for key, total in sorted(sums.items()) if counts.get(key)}
+
+
+# ============================================================================
+# ESCENARIOS
+# ============================================================================
+
+def run_worker(args, alert_count: int) -> dict:
+    import worker.worker as worker_module
+    from backend.flights_api import FlightSearchAPI
+    from backend import outbox
+
+    logging.getLogger().setLevel(logging.WARNING)
+    worker = worker_module.FlightAlertWorker(FlightSearchAPI())
+    try:
+        started = time.perf_counter()
+        worker.run_check_cycle()
+        cycle = time.perf_counter() - started
+
+        # El relay entrega el outbox a Telegram (límites global y por chat)
+        queued = sum(int(v) for _, v in parse_metric(worker.metrics.registry.render(),
+                                                     'worker_notifications_queued_total'))
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline:
+            conn = worker.get_db_connection()
+            with conn.cursor() as cur:
+                backlog = outbox.backlog(cur)
+            conn.close()
+            if not sum(backlog.values()) and not worker.notifier.pending():
+                break
+            time.sleep(0.2)
+        drained = time.perf_counter() - started - cycle
+    finally:
+        worker.shutdown()
+
+    text = worker.metrics.registry.render()
+    return {
+        "alerts": alert_count,
+        "cycle_s": round(cycle, 2),
+        "alerts_per_s": round(alert_count / cycle, 1),
+        "phases": summarize_histogram(text, 'worker_phase_duration_seconds', 'phase'),
+        "lane_wait": summarize_histogram(text, 'worker_lane_wait_seconds', 'lane'),
+        "provider": {f"{labels['provider']}:{labels['outcome']}": int(value)
+                     for labels, value in parse_metric(text, 'worker_provider_requests_total')},
+        "notifications_queued": queued,
+        "telegram_drain_s": round(drained, 2),
+        "kiwi_transport": {"mode": type(worker.flights_api.transport).__name__,
+                           **getattr(worker.flights_api.transport, 'stats', {})},
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_backend(workers: int) -> tuple:
+    port = free_port()
+    env = {**os.environ, 'PYTHONPATH': ROOT}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=ROOT, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("El backend no arrancó en 30 s")
+
+
+async def load_backend(args, url: str, ids: dict) -> dict:
+    rng = random.Random(3)
+    user_ids, alert_ids = ids['user_ids'], ids['alert_ids']
+    today = args.start_date
+
+    def calendar_query():
+        origin, destination = rng.sample(AIRPORTS, 2)
+        start = today + timedelta(days=rng.randint(10, 90))
+        return {"origin": origin, "destination": destination, "date_from": start.strftime('%d/%m/%Y'),
+                "date_to": (start + timedelta(days=30)).strftime('%d/%m/%Y')}
+
+    requests = [
+        ("GET /alerts", 4, lambda: ("/alerts", {"user_id": rng.choice(user_ids), "limit": 5})),
+        ("GET /alerts/{id}/stats", 2, lambda: (f"/alerts/{rng.choice(alert_ids)}/stats", None)),
+        ("GET /flights/calendar", 2, lambda: ("/flights/calendar", calendar_query())),
+        ("GET /health", 1, lambda: ("/health", None)),
+    ]
+    names = [name for name, weight, _ in requests for _ in range(weight)]
+    builders = {name: build for name, _, build in requests}
+    latencies = {name: [] for name, _, _ in requests}
+    errors = 0
+    deadline = time.monotonic() + args.backend_seconds
+
+    async def client_loop(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            name = rng.choice(names)
+            path, params = builders[name]()
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=args.backend_connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.backend_connections)))
+        elapsed = time.perf_counter() - started
+        metrics_text = (await client.get("/metrics")).text
+
+    every = [value for values in latencies.values() for value in values]
+    # Parte del tiempo de cada ruta que es BD (solo del proceso que respondió a /metrics con --workers > 1)
+    durations = {labels['route']: value for labels, value in parse_metric(metrics_text, 'http_request_duration_seconds_sum')}
+    db_share = {labels['route']: round(value / durations[labels['route']], 2)
+                for labels, value in parse_metric(metrics_text, 'http_request_phase_seconds_sum')
+                if labels['phase'] == 'db' and durations.get(labels['route'])}
+    return {
+        "requests": len(every),
+        "rps": round(len(every) / elapsed, 1),
+        "p50_ms": round(percentile(every, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(every, 0.99) * 1000, 2),
+        "errors": errors,
+        "routes": {name: {"count": len(values), "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                          "p99_ms": round(percentile(values, 0.99) * 1000, 2)}
+                   for name, values in latencies.items()},
+        "db_share": db_share,
+    }
+
+
+async def run_bot(args, chats: int) -> dict:
+    from telegram import Update
+    from bot.bot import build_application
+
+    application = build_application(TELEGRAM_TOKEN, connection_pool_size=args.bot_concurrency * 2)
+    await application.initialize()
+    updates = iter(list(fake_updates(args.bot_updates, chats)))
+    latencies = {}
+
+    async def handler_loop():
+        for data in updates:
+            kind = data['message']['text'] if 'message' in data else 'callback:' + data['callback_query']['data']
+            update = Update.de_json(data, application.bot)
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(handler_loop() for _ in range(args.bot_concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.shutdown()
+
+    every = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(every),
+        "updates_per_s": round(len(every) / elapsed, 1),
+        "p50_ms": round(percentile(every, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(every, 0.99) * 1000, 2),
+        "handlers": {kind: {"count": len(values), "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                            "p99_ms": round(percentile(values, 0.99) * 1000, 2)}
+                     for kind, values in sorted(latencies.items())},
+    }
+
+
+# ============================================================================
+# RESULTADOS
+# ============================================================================
+
+# (ruta en el JSON, True si más alto es mejor)
+KEY_METRICS = [
+    (("worker", "cycle_s"), False), (("worker", "alerts_per_s"), True),
+    (("backend", "rps"), True), (("backend", "p99_ms"), False),
+    (("bot", "updates_per_s"), True), (("bot", "p99_ms"), False),
+]
+
+
+def git_revision() -> dict:
+    def git(*command):
+        return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git('rev-parse', '--short', 'HEAD') or None, "dirty": bool(git('status', '--porcelain', '-uno'))}
+
+
+def compare(previous: dict, current: dict):
+    print(f"\nComparado con {previous.get('commit')} ({previous.get('timestamp')}):")
+    for path, higher_is_better in KEY_METRICS:
+        before, after = previous, current
+        for key in path:
+            before, after = (before or {}).get(key), (after or {}).get(key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        worse = change < 0 if higher_is_better else change > 0
+        flag = " ⚠️" if worse and abs(change) >= 10 else ""
+        print(f"  {'.'.join(path):<22} {before:>10} → {after:<10} ({change:+.1f}%){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de extremo a extremo con Kiwi y Telegram falsos")
+    parser.add_argument('--docker', action='store_true', help="Usar el Postgres de docker-compose.yml")
+    parser.add_argument('--db-name', default='vuelos_bench', help="Base de datos del benchmark (se recrea)")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--alerts-per-user', type=int, default=3)
+    parser.add_argument('--kiwi-latency-ms', type=float, default=300, help="Mediana de la latencia de Kiwi")
+    parser.add_argument('--kiwi-latency-sigma', type=float, default=0.5, help="Dispersión (log-normal)")
+    parser.add_argument('--kiwi-error-rate', type=float, default=0.02, help="Fracción de respuestas 500")
+    parser.add_argument('--kiwi-429-rate', type=float, default=0.01, help="Fracción de respuestas 429")
+    parser.add_argument('--start-date', type=date.fromisoformat, default=date.today(),
+                        help="Fechas de las alertas a partir de este día (fijarla para grabar y reproducir)")
+    parser.add_argument('--kiwi-record', help="Usar el Kiwi real (RAPIDAPI_KEY) y grabar su tráfico en este archivo")
+    parser.add_argument('--kiwi-replay', help="Reproducir este archivo de tráfico grabado en vez del Kiwi falso")
+    parser.add_argument('--replay-latency-scale', type=float, default=1.0,
+                        help="Factor sobre la latencia grabada (0 = sin espera)")
+    parser.add_argument('--telegram-latency-ms', type=float, default=30)
+    parser.add_argument('--alert-delay', type=float, default=0, help="WORKER_ALERT_DELAY_SECONDS del ciclo")
+    parser.add_argument('--drain-timeout', type=float, default=120, help="Espera máxima a que se vacíe el outbox")
+    parser.add_argument('--backend-workers', type=int, default=1)
+    parser.add_argument('--backend-connections', type=int, default=32)
+    parser.add_argument('--backend-seconds', type=float, default=15)
+    parser.add_argument('--bot-updates', type=int, default=500)
+    parser.add_argument('--bot-concurrency', type=int, default=8)
+    parser.add_argument('--skip', default='', help="Escenarios a saltar: worker,backend,bot")
+    parser.add_argument('--json', help="Guardar el resultado en este fichero")
+    parser.add_argument('--history', help="Fichero JSONL al que añadir el resultado y con el que comparar")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(',')))
+
+    if args.docker:
+        start_docker_postgres()
+    kiwi = start_fake_kiwi(args.kiwi_latency_ms, args.kiwi_latency_sigma, args.kiwi_error_rate, args.kiwi_429_rate)
+    telegram = start_fake_telegram(args.telegram_latency_ms)
+
+    # Los módulos leen la configuración al importarse: todo apunta a la BD y los servicios falsos
+    os.environ.update({
+        'DB_NAME': args.db_name,
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{telegram.server_address[1]}",
+        'TELEGRAM_BOT_TOKEN': TELEGRAM_TOKEN,
+        'WORKER_METRICS_PORT': '0',
+        'WORKER_ALERT_DELAY_SECONDS': str(args.alert_delay),
+    })
+    if args.kiwi_record:
+        if not os.getenv('RAPIDAPI_KEY'):
+            parser.error("--kiwi-record necesita RAPIDAPI_KEY")
+        os.environ.update({'FLIGHTS_API_MODE': 'record', 'FLIGHTS_API_ARCHIVE': os.path.abspath(args.kiwi_record)})
+    elif args.kiwi_replay:
+        os.environ.update({
+            'FLIGHTS_API_MODE': 'replay',
+            'FLIGHTS_API_ARCHIVE': os.path.abspath(args.kiwi_replay),
+            'FLIGHTS_REPLAY_LATENCY_SCALE': str(args.replay_latency_scale),
+        })
+    else:
+        os.environ.update({'RAPIDAPI_KEY': 'bench', 'KIWI_API_URL': f"http://127.0.0.1:{kiwi.server_address[1]}"})
+
+    create_database(args.db_name)
+    ids = seed(args.db_name, args.users, args.alerts_per_user, args.start_date)
+    result = {**git_revision(), "timestamp": datetime.now().isoformat(timespec='seconds'),
+              "params": {k: str(v) if isinstance(v, date) else v
+                         for k, v in vars(args).items() if k not in ('json', 'history')}}
+
+    if 'worker' not in skip:
+        print("⏱️  Worker: un ciclo completo...")
+        result["worker"] = run_worker(args, len(ids['alert_ids']))
+        if not (args.kiwi_record or args.kiwi_replay):
+            result["worker"]["kiwi"] = dict(kiwi.stats)
+        result["worker"]["telegram_messages"] = telegram.stats['messages']
+
+    backend = None
+    try:
+        if not skip >= {'backend', 'bot'}:
+            backend, url = start_backend(args.backend_workers)
+            os.environ['BACKEND_URL'] = url
+        if 'backend' not in skip:
+            print(f"⏱️  Backend: {args.backend_connections} conexiones durante {args.backend_seconds:.0f}s...")
+            result["backend"] = asyncio.run(load_backend(args, url, ids))
+        if 'bot' not in skip:
+            print(f"⏱️  Bot: {args.bot_updates} updates...")
+            result["bot"] = asyncio.run(run_bot(args, min(args.users, 500)))
+    finally:
+        if backend:
+            backend.terminate()
+            backend.wait()
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.history:
+        if os.path.exists(args.history):
+            with open(args.history) as f:
+                lines = [line for line in f if line.strip()]
+            if lines:
+                compare(json.loads(lines[-1]), result)
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
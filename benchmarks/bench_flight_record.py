@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: MEMORIA POR VUELO Y TAMAÑO POR SNAPSHOT
+# ============================================================================
+# Compara los dicts de ~20 claves del parser original con FlightRecord:
+# - bytes de memoria por vuelo (tracemalloc, vuelos vivos en una lista)
+# - bytes del JSON guardado en search_snapshots.details por snapshot
+#
+# Uso:
+#   python benchmarks/bench_flight_record.py [--responses 1000] [--json resultados.json]
+# ============================================================================
+
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.flights_api import FlightSearchAPI
+from benchmarks.kiwi_payloads import PAYLOAD_SIZES, generate_payload
+from benchmarks.legacy_kiwi_parser import legacy_process_kiwi_results
+
+
+def memory_per_flight(build: Callable[[], List]) -> Dict[str, float]:
+    """Memoria que ocupan los vuelos construidos por `build`, dividida por vuelo"""
+    tracemalloc.start()
+    flights = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'flights': len(flights), 'bytes_per_flight': round(current / len(flights), 1)}
+
+
+def run(responses: int) -> Dict[str, Dict]:
+    api = FlightSearchAPI()
+    # Respuestas distintas (semillas distintas) como en un ciclo real del worker
+    payloads = [generate_payload(PAYLOAD_SIZES['small'], seed=i) for i in range(responses)]
+
+    def build_legacy():
+        return [f for data in payloads for f in legacy_process_kiwi_results(data, 'MAD', 'BCN')]
+
+    def build_records():
+        return [f for data in payloads for f in api._process_kiwi_results(data, 'MAD', 'BCN')]
+
+    # Cada snapshot guarda el vuelo más barato de una respuesta
+    legacy_snapshots = [json.dumps(legacy_process_kiwi_results(d, 'MAD', 'BCN')[0]) for d in payloads]
+    record_snapshots = [json.dumps(api._process_kiwi_results(d, 'MAD', 'BCN')[0].to_storage()) for d in payloads]
+
+    return {
+        'legacy_dict': {
+            **memory_per_flight(build_legacy),
+            'snapshot_bytes': round(sum(map(len, legacy_snapshots)) / responses, 1),
+        },
+        'flight_record': {
+            **memory_per_flight(build_records),
+            'snapshot_bytes': round(sum(map(len, record_snapshots)) / responses, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por vuelo y tamaño de snapshot")
+    parser.add_argument('--responses', type=int, default=1000)
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.responses)
+    print(f"{'formato':<14} {'vuelos':>8} {'bytes/vuelo':>12} {'bytes/snapshot':>15}")
+    for name, r in results.items():
+        print(f"{name:<14} {r['flights']:>8} {r['bytes_per_flight']:>12} {r['snapshot_bytes']:>15}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: PARSEO DE RESPUESTAS DE KIWI
+# ============================================================================
+# Compara el parser original (legacy_kiwi_parser) con
+# FlightSearchAPI._process_kiwi_results sobre respuestas small/medium/huge.
+# Mide tiempo (json.loads + parser, y solo parser) y asignaciones de memoria
+# con tracemalloc.
+#
+# Uso:
+#   python benchmarks/bench_kiwi_parser.py [--repeat 20] [--json resultados.json]
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.flights_api import FlightSearchAPI, MAX_ITINERARIES
+from benchmarks.kiwi_payloads import PAYLOAD_SIZES, load_payload_bytes
+from benchmarks.legacy_kiwi_parser import legacy_process_kiwi_results
+
+
+def best_time_ms(fn: Callable[[], object], repeat: int) -> float:
+    """Mejor tiempo de `repeat` ejecuciones, en milisegundos"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def allocations(fn: Callable[[], object]) -> Dict[str, int]:
+    """Pico de memoria y bloques asignados que siguen vivos en el resultado"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    del result
+    return {
+        'peak_bytes': peak,
+        'retained_blocks': sum(stat.count_diff for stat in stats if stat.count_diff > 0),
+    }
+
+
+def run(repeat: int) -> Dict[str, Dict]:
+    api = FlightSearchAPI()
+    parsers = {
+        'legacy': legacy_process_kiwi_results,
+        'optimized': api._process_kiwi_results,
+    }
+    results = {}
+
+    for size in PAYLOAD_SIZES:
+        body = load_payload_bytes(size)
+        data = json.loads(body)
+        results[size] = {'itineraries': len(data.get('itineraries', [])), 'bytes': len(body)}
+
+        for name, parser in parsers.items():
+            end_to_end = lambda: parser(json.loads(body), 'MAD', 'BCN')
+            parse_only = lambda: parser(data, 'MAD', 'BCN')
+            results[size][name] = {
+                'json_plus_parse_ms': round(best_time_ms(end_to_end, repeat), 4),
+                'parse_only_ms': round(best_time_ms(parse_only, repeat * 10), 4),
+                **allocations(parse_only),
+            }
+
+        # Con 'limit' acotado la API solo devuelve MAX_ITINERARIES itinerarios:
+        # es el cuerpo que el parser optimizado recibe en producción
+        limited_body = json.dumps({**data, 'itineraries': data['itineraries'][:MAX_ITINERARIES]}).encode('utf-8')
+        results[size]['optimized']['limited_response_ms'] = round(
+            best_time_ms(lambda: parsers['optimized'](json.loads(limited_body), 'MAD', 'BCN'), repeat), 4
+        )
+
+        # Los dos parsers deben producir los mismos vuelos (salvo la marca de tiempo)
+        legacy = [{k: v for k, v in f.items() if k != 'found_at'} for f in parsers['legacy'](data, 'MAD', 'BCN')]
+        current = [f.to_dict() for f in parsers['optimized'](data, 'MAD', 'BCN')]
+        assert legacy == [{k: v for k, v in f.items() if k != 'found_at'} for f in current]
+
+    return results
+
+
+def print_table(results: Dict[str, Dict]):
+    print(f"{'tamaño':<8} {'parser':<10} {'json+parse ms':>14} {'parse ms':>10} {'pico bytes':>12} {'bloques':>8}")
+    for size, row in results.items():
+        for name in ('legacy', 'optimized'):
+            r = row[name]
+            print(f"{size:<8} {name:<10} {r['json_plus_parse_ms']:>14.3f} {r['parse_only_ms']:>10.4f} "
+                  f"{r['peak_bytes']:>12} {r['retained_blocks']:>8}")
+        print(f"{'':<8} ({row['itineraries']} itinerarios, {row['bytes']} bytes; "
+              f"con limit={MAX_ITINERARIES}: {row['optimized']['limited_response_ms']:.3f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parser de respuestas de Kiwi")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: BÚSQUEDA DE AEROPUERTOS Y CIUDADES
+# ============================================================================
+# Mide la preparación del índice de backend/locations.py y la latencia de
+# /flights/locations (búsqueda sin caché y con caché) para consultas típicas:
+# código IATA, prefijo, alias en español, tildes y erratas. Compara el índice
+# construido en memoria desde los CSV con el fichero binario abierto con mmap
+# (si existe; se genera con tools/build_locations_index.py).
+#
+# Uso:
+#   python benchmarks/bench_locations.py [--repeat 200] [--json resultados.json]
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.locations import LOCATIONS_IDX, LocationIndex, MappedLocationIndex, load_aliases, load_locations
+
+QUERIES = ['MAD', 'bar', 'ma', 'londres', 'nueva york', 'Zúrich', 'londn', 'frankfrut', 'tokio']
+
+
+def bench_index(open_index: Callable, repeat: int) -> Dict:
+    start = time.perf_counter()
+    index = open_index()
+    results = {'open_ms': round((time.perf_counter() - start) * 1000, 2), 'entries': len(index), 'queries': {}}
+
+    for query in QUERIES:
+        uncached = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            index._search(query, 5)
+            uncached = min(uncached, time.perf_counter() - start)
+        index.search(query, 5)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            index.search(query, 5)
+        cached = (time.perf_counter() - start) / repeat
+        results['queries'][query] = {
+            'top': [loc.code for loc in index.search(query, 5)],
+            'uncached_us': round(uncached * 1e6, 1),
+            'cached_us': round(cached * 1e6, 2),
+        }
+    return results
+
+
+def run(repeat: int) -> Dict[str, Dict]:
+    results = {'memory': bench_index(lambda: LocationIndex(load_locations(), load_aliases()), repeat)}
+    if os.path.exists(LOCATIONS_IDX):
+        results['mmap'] = bench_index(lambda: MappedLocationIndex(LOCATIONS_IDX), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de la búsqueda de ubicaciones")
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    for name, r in results.items():
+        print(f"\n[{name}] {r['entries']} ubicaciones, índice listo en {r['open_ms']} ms")
+        print(f"{'consulta':<12} {'sin caché µs':>13} {'con caché µs':>13}  resultados")
+        for query, q in r['queries'].items():
+            print(f"{query:<12} {q['uncached_us']:>13} {q['cached_us']:>13}  {', '.join(q['top'])}")
+    if 'mmap' in results:
+        same = all(results['memory']['queries'][q]['top'] == results['mmap']['queries'][q]['top'] for q in QUERIES)
+        print(f"\nMismos resultados en memoria y mmap: {'sí' if same else 'NO'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: ARRANQUE Y MEMORIA (RSS) DEL ÍNDICE DE UBICACIONES
+# ============================================================================
+# Lanza un proceso nuevo por modo (como arrancaría la API, el worker o el bot)
+# y mide cuánto tarda en tener el índice listo y responder la primera
+# búsqueda, y cuánta memoria añade al proceso:
+# - csv:  índice construido en memoria desde los CSV
+# - mmap: fichero binario backend/data/locations.idx abierto con mmap
+# RSS y memoria privada salen de /proc/self/smaps_rollup (Linux). Las páginas
+# del fichero mapeado cuentan como compartidas: el resto de procesos que lo
+# abren reutilizan las mismas de la caché del sistema.
+#
+# Uso:
+#   python tools/build_locations_index.py
+#   python benchmarks/bench_locations_startup.py [--runs 5] [--json resultados.json]
+# ============================================================================
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+from typing import Dict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r'''
+import json, sys, time
+sys.path.insert(0, ROOT)
+
+def memory_kb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0]] = int(parts[1])
+    return values['Rss:'], values['Private_Clean:'] + values['Private_Dirty:']
+
+rss0, private0 = memory_kb()
+start = time.perf_counter()
+from backend import locations
+if MODE == 'csv':
+    locations.LOCATIONS_IDX = '/nonexistent'
+index = locations.get_location_index()
+ready = time.perf_counter()
+index.search('londres', 5)
+index.search('frankfrut', 5)
+first_search = time.perf_counter()
+rss1, private1 = memory_kb()
+print(json.dumps({
+    'index_type': type(index).__name__,
+    'startup_ms': (ready - start) * 1000,
+    'first_search_ms': (first_search - ready) * 1000,
+    'rss_kb': rss1 - rss0,
+    'private_kb': private1 - private0,
+}))
+'''
+
+
+def run_child(mode: str) -> Dict:
+    code = f"ROOT = {ROOT!r}\nMODE = {mode!r}\n" + CHILD
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+    return json.loads(output.stdout)
+
+
+def run(runs: int) -> Dict[str, Dict]:
+    results = {}
+    for mode in ('csv', 'mmap'):
+        samples = [run_child(mode) for _ in range(runs)]
+        results[mode] = {
+            'index_type': samples[0]['index_type'],
+            **{key: round(median(s[key] for s in samples), 2)
+               for key in ('startup_ms', 'first_search_ms', 'rss_kb', 'private_kb')},
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque y RSS del índice de ubicaciones")
+    parser.add_argument('--runs', type=int, default=5, help="Procesos por modo (se muestra la mediana)")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(f"{'modo':<6} {'índice':<20} {'arranque ms':>12} {'1ª búsqueda ms':>15} {'+RSS KB':>9} {'+privada KB':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<6} {r['index_type']:<20} {r['startup_ms']:>12} {r['first_search_ms']:>15} "
+              f"{r['rss_kb']:>9} {r['private_kb']:>12}")
+    if results['mmap']['index_type'] != 'MappedLocationIndex':
+        print("⚠️  No existe backend/data/locations.idx: ejecuta tools/build_locations_index.py")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
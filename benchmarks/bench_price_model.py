@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARK: MOTOR DE PREDICCIÓN DE PRECIOS (ia/model.py)
+# ============================================================================
+# Sobre un histórico sintético (price_history.py) mide:
+# - cálculo vectorizado de features y etiquetas
+# - entrenamiento de los modelos por ruta con 1 proceso y con N procesos
+# - puntuación de todas las alertas activas de una pasada
+# - guardar y recargar los modelos desde disco
+#
+# Uso:
+#   python benchmarks/bench_price_model.py [--snapshots 500000] [--routes 200] [--alerts 20000] [--workers 4]
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.price_history import generate_snapshots
+from ia.model import PricePredictor, build_training_set
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def run(snapshots: int, routes: int, alerts: int, workers: int) -> dict:
+    history = generate_snapshots(snapshots, routes=routes)
+    results = {'snapshots': snapshots, 'routes': routes, 'alerts': alerts, 'workers': workers}
+
+    _, results['features_ms'] = timed(lambda: build_training_set(history))
+    _, results['fit_1_process_ms'] = timed(lambda: PricePredictor().fit(history, workers=1))
+    predictor, results[f'fit_{workers}_processes_ms'] = timed(lambda: PricePredictor().fit(history, workers=workers))
+
+    rng = np.random.default_rng(1)
+    route_names = history['route'].cat.categories.to_numpy()
+    prices = rng.uniform(4000, 60000, alerts).astype(np.float32)
+    active = pd.DataFrame({
+        'alert_id': np.arange(alerts),
+        'route': route_names[rng.integers(0, len(route_names), alerts)],
+        'departure': pd.Timestamp.now().normalize() + pd.to_timedelta(rng.integers(1, 120, alerts), unit='D'),
+        'price': prices,
+        'min_seen': prices * rng.uniform(0.85, 1.0, alerts).astype(np.float32),
+    })
+    scores, results['score_all_alerts_ms'] = timed(lambda: predictor.score_alerts(active))
+    results['recommendations'] = scores['recommendation'].value_counts().to_dict()
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, results['save_ms'] = timed(lambda: predictor.save(directory))
+        _, results['load_ms'] = timed(lambda: PricePredictor.load(directory))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de predicción de precios")
+    parser.add_argument('--snapshots', type=int, default=500_000)
+    parser.add_argument('--routes', type=int, default=200)
+    parser.add_argument('--alerts', type=int, default=20_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--json', help="Guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = run(args.snapshots, args.routes, args.alerts, args.workers)
+    for key, value in results.items():
+        print(f"{key:<24} {value}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
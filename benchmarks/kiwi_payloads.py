@@ -0,0 +1,116 @@
+# ============================================================================
+# RESPUESTAS DE KIWI PARA BENCHMARKS (small / medium / huge)
+# ============================================================================
+# Si existen respuestas grabadas en benchmarks/data/kiwi_<tamaño>.json se usan
+# tal cual. Si no, se generan respuestas sintéticas deterministas con la misma
+# estructura que devuelve el endpoint round-trip de RapidAPI Kiwi.com.
+# ============================================================================
+
+import os
+import json
+import random
+from typing import Dict
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# Número de itinerarios por tamaño de respuesta
+PAYLOAD_SIZES = {
+    'small': 10,
+    'medium': 200,
+    'huge': 5000,
+}
+
+_AIRPORTS = [
+    ('MAD', 'Madrid'), ('BCN', 'Barcelona'), ('LHR', 'Londres'), ('CDG', 'París'),
+    ('FCO', 'Roma'), ('AMS', 'Ámsterdam'), ('FRA', 'Fráncfort'), ('LIS', 'Lisboa'),
+]
+_CARRIERS = [('IB', 'Iberia'), ('VY', 'Vueling'), ('FR', 'Ryanair'), ('UX', 'Air Europa'), ('U2', 'easyJet')]
+
+
+def _station(code: str, city: str, local_time: str) -> Dict:
+    return {
+        'localTime': local_time,
+        'utcTime': local_time + 'Z',
+        'station': {
+            'id': f'Station:airport:{code}',
+            'code': code,
+            'name': f'Aeropuerto de {city}',
+            'gps': {'lat': 40.47, 'lng': -3.56},
+            'city': {'id': f'City:{city.lower()}', 'name': city, 'legacyId': city.lower()},
+            'country': {'id': 'Country:ES', 'code': 'ES'},
+        },
+        'city': {'id': f'City:{city.lower()}', 'name': city, 'legacyId': city.lower()},
+    }
+
+
+def _segment(rng: random.Random, origin, destination) -> Dict:
+    carrier_code, carrier_name = rng.choice(_CARRIERS)
+    hour = rng.randint(5, 22)
+    duration = rng.randint(3600, 4 * 3600)
+    return {
+        'id': f'seg_{rng.getrandbits(48):x}',
+        'segment': {
+            'id': f'{rng.getrandbits(64):x}',
+            'source': _station(origin[0], origin[1], f'2025-09-15T{hour:02d}:10:00'),
+            'destination': _station(destination[0], destination[1], f'2025-09-15T{(hour + 2) % 24:02d}:40:00'),
+            'duration': duration,
+            'type': 'FLIGHT',
+            'code': str(rng.randint(100, 9999)),
+            'carrier': {'id': f'Carrier:{carrier_code}', 'name': carrier_name, 'code': carrier_code},
+            'operatingCarrier': {'id': f'Carrier:{carrier_code}', 'name': carrier_name, 'code': carrier_code},
+            'cabinClass': 'ECONOMY',
+            'hiddenDestination': None,
+            'throwawayDestination': None,
+        },
+        'layover': None,
+        'guarantee': None,
+    }
+
+
+def _itinerary(rng: random.Random, index: int) -> Dict:
+    origin, destination = rng.sample(_AIRPORTS, 2)
+    stops = rng.choice([0, 0, 0, 1, 1, 2])
+    via = [rng.choice(_AIRPORTS) for _ in range(stops)]
+    hops = [origin] + via + [destination]
+    outbound_segments = [_segment(rng, hops[k], hops[k + 1]) for k in range(len(hops) - 1)]
+    inbound_segments = [_segment(rng, hops[k + 1], hops[k]) for k in reversed(range(len(hops) - 1))]
+    amount = round(rng.uniform(29, 600), 2)
+    return {
+        '__typename': 'ItineraryReturn',
+        'id': f'ItineraryReturn:{index}:{rng.getrandbits(64):x}',
+        'shareId': f'{rng.getrandbits(128):x}',
+        'price': {'amount': str(amount), 'priceBeforeDiscount': str(amount)},
+        'priceEur': {'amount': str(amount)},
+        'provider': {'name': 'Kiwi.com', 'code': 'KIWI', 'hasHighProbabilityOfPriceChange': False},
+        'bagsInfo': {'includedCheckedBags': 0, 'includedHandBags': 1, 'checkedBagTiers': [
+            {'tierPrice': {'amount': '35.5'}, 'bags': [{'weight': {'value': 20}}]},
+        ]},
+        'bookingOptions': {'edges': [
+            {'node': {'token': f'{rng.getrandbits(256):x}', 'bookingUrl': f'/es/booking?token={rng.getrandbits(128):x}',
+                      'price': {'amount': str(amount)}}},
+        ]},
+        'travelHack': {'isTrueHiddenCity': False, 'isVirtualInterlining': stops > 0, 'isThrowawayTicket': False},
+        'duration': sum(s['segment']['duration'] for s in outbound_segments),
+        'pnrCount': 1,
+        'lastAvailable': {'seatsLeft': rng.randint(1, 9)},
+        'outbound': {'id': f'Sector:{index}:out', 'duration': 0, 'sectorSegments': outbound_segments},
+        'inbound': {'id': f'Sector:{index}:in', 'duration': 0, 'sectorSegments': inbound_segments},
+    }
+
+
+def generate_payload(itineraries: int, seed: int = 42) -> Dict:
+    """Genera una respuesta sintética con el número de itinerarios indicado"""
+    rng = random.Random(seed)
+    return {
+        'metadata': {'itinerariesCount': itineraries, 'hasMorePending': False},
+        'itineraries': [_itinerary(rng, i) for i in range(itineraries)],
+    }
+
+
+def load_payload_bytes(size: str) -> bytes:
+    """Devuelve el cuerpo JSON (bytes) de la respuesta del tamaño pedido"""
+    recorded = os.path.join(DATA_DIR, f'kiwi_{size}.json')
+    if os.path.exists(recorded):
+        with open(recorded, 'rb') as f:
+            return f.read()
+    return json.dumps(generate_payload(PAYLOAD_SIZES[size])).encode('utf-8')
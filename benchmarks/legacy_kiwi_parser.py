@@ -0,0 +1,94 @@
+# ============================================================================
+# PARSER ORIGINAL DE KIWI (REFERENCIA PARA BENCHMARKS)
+# ============================================================================
+# Copia congelada de FlightSearchAPI._process_kiwi_results tal y como estaba
+# antes de optimizarlo. Solo se usa para comparar tiempos y memoria.
+# ============================================================================
+
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_process_kiwi_results(data: Dict, origin: str, destination: str) -> List[Dict]:
+    """Procesar resultados de RapidAPI Kiwi.com Round Trip API (versión original)"""
+    flights = []
+    
+    # La respuesta real tiene esta estructura
+    itineraries = data.get('itineraries', [])
+    
+    for i, itinerary in enumerate(itineraries[:12]):  # Máximo 12 resultados
+        try:
+            # Información básica del precio
+            price_info = itinerary.get('price', {})
+            price_eur = float(price_info.get('amount', 200))
+            
+            # Información del vuelo de ida
+            outbound = itinerary.get('outbound', {})
+            outbound_segments = outbound.get('sectorSegments', [])
+            
+            if not outbound_segments:
+                continue
+            
+            first_segment = outbound_segments[0].get('segment', {})
+            
+            # Información de origen y destino
+            source_info = first_segment.get('source', {})
+            dest_info = first_segment.get('destination', {})
+            
+            # Extraer información de aerolínea
+            carrier = first_segment.get('carrier', {})
+            airline = carrier.get('name', 'Unknown')
+            
+            # Extraer ciudades desde la estructura real
+            origin_city = source_info.get('city', {}).get('name', f'Ciudad {origin}')
+            dest_city = dest_info.get('city', {}).get('name', f'Ciudad {destination}')
+            
+            processed_flight = {
+                'id': f'kiwi_round_{itinerary.get("id", i)}',
+                'price_euros': float(price_eur),
+                'origin': origin,
+                'destination': destination,
+                'origin_city': origin_city,
+                'destination_city': dest_city,
+                'departure_time': source_info.get('localTime', '2025-09-15T08:00:00'),
+                'arrival_time': dest_info.get('localTime', '2025-09-15T10:30:00'),
+                'airlines': [airline],
+                'stops': len(outbound_segments) - 1,
+                'booking_link': _extract_booking_link_real(itinerary),
+                'found_at': datetime.now().isoformat(),
+                'api_used': 'kiwi_round_trip',
+                'flight_duration': _format_duration(first_segment.get('duration', 7200)),
+                'availability': itinerary.get('lastAvailable', {}).get('seatsLeft', 9),
+                'validating_airline': airline,
+                'cabin_class': first_segment.get('cabinClass', 'ECONOMY'),
+                'flight_number': f"{carrier.get('code', 'XX')}{first_segment.get('code', '000')}"
+            }
+            
+            flights.append(processed_flight)
+            
+        except Exception as e:
+            logger.error(f"Error procesando itinerario Kiwi: {e}")
+            continue
+    
+    # Ordenar por precio
+    flights.sort(key=lambda x: x.get('price_euros', 9999))
+    return flights
+
+
+def _extract_booking_link_real(itinerary: Dict) -> str:
+    booking_options = itinerary.get('bookingOptions', {}).get('edges', [])
+    if booking_options:
+        first_option = booking_options[0].get('node', {})
+        booking_url = first_option.get('bookingUrl', '')
+        if booking_url:
+            return f"https://kiwi.com{booking_url}"
+    return 'https://kiwi.com'
+
+
+def _format_duration(duration_seconds: int) -> str:
+    hours = duration_seconds // 3600
+    minutes = (duration_seconds % 3600) // 60
+    return f"PT{hours}H{minutes}M"
@@ -0,0 +1,37 @@
+# ============================================================================
+# HISTÓRICO DE PRECIOS SINTÉTICO
+# ============================================================================
+# Snapshots deterministas con la forma que devuelve ia.model.load_snapshots
+# (route, departure, found_at, price) para los benchmarks y tests del motor
+# de predicción: cada ruta tiene un precio base, una curva que sube al
+# acercarse la salida, estacionalidad semanal y ruido.
+# ============================================================================
+
+import numpy as np
+import pandas as pd
+
+
+def generate_snapshots(n: int, routes: int = 50, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    route_names = np.array([f"R{i:03d}-X{i:03d}" for i in range(routes)])
+    base_price = rng.uniform(40, 600, routes)
+
+    route_idx = rng.integers(0, routes, n)
+    departure_offset = rng.integers(0, 120, n)  # salida: días desde el inicio del histórico
+    days_before = rng.integers(0, 90, n)        # la búsqueda se hizo estos días antes de la salida
+    start = pd.Timestamp('2025-01-01')
+
+    departure = start + pd.to_timedelta(departure_offset + 90, unit='D')
+    found_at = departure - pd.to_timedelta(days_before, unit='D') + pd.to_timedelta(rng.integers(0, 86400, n), unit='s')
+
+    # Más caro cuanto más cerca de la salida, más caro en fin de semana, con ruido
+    curve = 1 + 0.6 * np.exp(-days_before / 20)
+    weekend = np.where(departure.dayofweek >= 4, 1.15, 1.0)
+    price = base_price[route_idx] * curve * weekend * rng.lognormal(0, 0.08, n) * 100
+
+    return pd.DataFrame({
+        'route': pd.Categorical(route_names[route_idx]),
+        'departure': departure,
+        'found_at': found_at,
+        'price': price.astype(np.float32),
+    })
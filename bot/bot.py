@@ -9,11 +9,15 @@
 # ============================================================================
 
 import os
+import sys
 import logging
 import requests
+import time
 import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Optional, Dict, Any
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -21,6 +25,11 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, filters
 )
 
+# Índice de aeropuertos compartido con el backend (fichero mmap, ver backend/locations.py)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from backend.locations import get_location_index
+from backend.bot_state import SharedStateApplication, create_persistence
+
 # ============================================================================
 # CONFIGURACIÓN Y LOGGING
 # ============================================================================
@@ -36,16 +45,28 @@ logger = logging.getLogger(__name__)
 # URL del backend API. ahora esta el de prod pero se puede cambiar al local cambiando la url, mira el .env
 API_BASE_URL = os.getenv('BACKEND_URL', "https://backend-production-2b7f.up.railway.app")
 
+# Hilos para las llamadas al backend (no bloquean el bucle de eventos del bot)
+API_MAX_WORKERS = int(os.getenv('BOT_API_WORKERS', '32'))
+_api_executor = ThreadPoolExecutor(max_workers=API_MAX_WORKERS, thread_name_prefix='bot-api')
+
 # Estados para conversaciones
 ORIGIN, DESTINATION, DATE_FROM, DATE_TO, PRICE_TARGET, MAX_STOPS = range(6)
 
 
 # FUNCIONES AUXILIARES PARA API
 
-def call_api(endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Dict[str, Any]:
+def resolve_airport(text: str) -> Optional[str]:
     """
-    Función auxiliar para llamar a nuestro backend API.
+    Código IATA a partir de lo que escribe el usuario: un código ("MAD") o el
+    nombre de la ciudad o aeropuerto ("Londres", "barajas"), con o sin tildes.
     """
+    index = get_location_index()
+    if len(text) == 3 and text.isalpha() and index.get(text):
+        return text.upper()
+    matches = index.search(text, 1)
+    return matches[0].code if matches else None
+
+def _call_api_sync(endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Dict[str, Any]:
     url = f"{API_BASE_URL}{endpoint}"
     try:
         if method == "GET":
@@ -61,19 +82,28 @@ def call_api(endpoint: str, method: str = "GET", data: Optional[Dict] = None) ->
         logger.error(f"Error calling API {url}: {e}")
         return {"error": str(e)}
 
-def get_or_create_user(telegram_user_id: int) -> Optional[int]:
+async def call_api(endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Función auxiliar para llamar a nuestro backend API. La petición HTTP va en
+    un hilo para no bloquear el bucle de eventos mientras se atienden otros
+    updates (en modo webhook se procesan varios a la vez).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_api_executor, _call_api_sync, endpoint, method, data)
+
+async def get_or_create_user(telegram_user_id: int) -> Optional[int]:
     """
     Obtiene o crea un usuario en el backend y devuelve su ID interno.
     """
     # Primero intentamos obtener el usuario
-    users_response = call_api("/users")
+    users_response = await call_api("/users")
     if "error" not in users_response:
         for user in users_response.get("users", []):
             if user["telegram_id"] == telegram_user_id:
                 return user["id"]
     
     # Si no existe, lo creamos
-    create_response = call_api("/users", "POST", {"telegram_user_id": telegram_user_id})
+    create_response = await call_api("/users", "POST", {"telegram_user_id": telegram_user_id})
     if "error" not in create_response and "user_id" in create_response:
         return create_response["user_id"]
     
@@ -101,7 +131,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     Comando de inicio del bot. Registra al usuario y muestra el menú principal.
     """
     user = update.effective_user
-    user_id = get_or_create_user(user.id)
+    user_id = await get_or_create_user(user.id)
     
     if user_id:
         welcome_message = f"""
@@ -201,31 +231,148 @@ Te avisaré automáticamente cuando encuentre:
 # ============================================================================
 # COMANDO: /mis_alertas
 # ============================================================================
-async def my_alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+# Icono de la tendencia de precio (backend/price_stats.py)
+TREND_ICONS = {"bajando": "⬇️", "subiendo": "⬆️", "estable": "➡️"}
+
+# Alertas por página (un mensaje de Telegram admite 4096 caracteres)
+ALERTS_PAGE_SIZE = int(os.getenv('BOT_ALERTS_PAGE_SIZE', '5'))
+
+# Páginas ya pedidas al backend: se reutilizan al navegar durante este tiempo
+ALERTS_CACHE_SECONDS = float(os.getenv('BOT_ALERTS_CACHE_SECONDS', '60'))
+ALERTS_CACHE_USERS = 1000
+
+
+class AlertsPage(NamedTuple):
+    alerts: List[Dict[str, Any]]
+    has_more: bool
+    page: int
+
+
+class AlertPagesCache:
+    """
+    Páginas de "Mis Alertas" por usuario de Telegram. Cualquier alta, cambio o
+    borrado de alertas desde el bot invalida todas las del usuario; además
+    caducan a los ALERTS_CACHE_SECONDS (cambios hechos desde otra réplica o el
+    resumen de precios que actualiza el worker).
+    """
+
+    def __init__(self, ttl: float = ALERTS_CACHE_SECONDS, max_users: int = ALERTS_CACHE_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._users: "OrderedDict[int, Dict[int, Tuple[float, AlertsPage]]]" = OrderedDict()
+
+    def get(self, telegram_id: int, page: int) -> Optional[AlertsPage]:
+        pages = self._users.get(telegram_id)
+        entry = pages.get(page) if pages else None
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        self._users.move_to_end(telegram_id)
+        return entry[1]
+
+    def put(self, telegram_id: int, alerts_page: AlertsPage):
+        self._users.setdefault(telegram_id, {})[alerts_page.page] = (time.monotonic(), alerts_page)
+        self._users.move_to_end(telegram_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self._users.pop(telegram_id, None)
+
+
+alert_pages = AlertPagesCache()
+
+
+async def load_alerts_page(telegram_id: int, page: int) -> Optional[AlertsPage]:
     """
-    Muestra todas las alertas activas del usuario.
+    Página `page` de las alertas del usuario: de la caché o pidiendo al
+    backend solo esas ALERTS_PAGE_SIZE alertas. None si falla el backend.
     """
-    user_id = get_or_create_user(update.effective_user.id)
+    cached = alert_pages.get(telegram_id, page)
+    if cached:
+        return cached
+
+    user_id = await get_or_create_user(telegram_id)
     if not user_id:
-        # Determinar si viene de callback o comando directo
-        if update.callback_query:
-            await update.callback_query.edit_message_text("❌ Error al acceder a tus alertas.")
-        else:
-            await update.message.reply_text("❌ Error al acceder a tus alertas.")
-        return
+        return None
+    response = await call_api(
+        f"/alerts?user_id={user_id}&limit={ALERTS_PAGE_SIZE}&offset={page * ALERTS_PAGE_SIZE}"
+    )
+    if "error" in response:
+        return None
+    alerts_page = AlertsPage(response.get("alerts", []), response.get("has_more", False), page)
+    if page and not alerts_page.alerts:
+        # La página ya no existe (se borraron alertas): ir a la anterior
+        return await load_alerts_page(telegram_id, page - 1)
+    alert_pages.put(telegram_id, alerts_page)
+    return alerts_page
+
+
+def page_navigation(alerts_page: AlertsPage, callback_prefix: str) -> List[InlineKeyboardButton]:
+    """Botones anterior/siguiente (vacío si solo hay una página)"""
+    buttons = []
+    if alerts_page.page > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Anterior", callback_data=f"{callback_prefix}{alerts_page.page - 1}"))
+    if alerts_page.has_more:
+        buttons.append(InlineKeyboardButton("Siguiente ➡️", callback_data=f"{callback_prefix}{alerts_page.page + 1}"))
+    return buttons
+
+
+def render_alerts_page(alerts_page: AlertsPage) -> Tuple[str, InlineKeyboardMarkup]:
+    message = "📋 <b>Tus alertas activas:</b>"
+    if alerts_page.page or alerts_page.has_more:
+        message += f" (página {alerts_page.page + 1})"
+    message += "\n\n"
+
+    first = alerts_page.page * ALERTS_PAGE_SIZE + 1
+    for i, alert in enumerate(alerts_page.alerts, first):
+        origin = alert["origin"]
+        destination = alert["destination"]
+        date_from = alert["date_from"]
+        date_to = alert["date_to"]
+        price_target = alert["price_target_cents"]
+        message += f"{i}. {origin} → {destination}\n"
+        message += f"📅 Salida: {date_from}\n"
+        if date_to:
+            message += f"🔄 Regreso: {date_to}\n"
+        if price_target:
+            message += f"💰 Precio objetivo: {price_target/100:.2f}€\n"
+        if alert.get("notify_deals"):
+            message += "🔥 Avisos de chollos activados\n"
+        summary = alert.get("price_summary")
+        if summary:
+            trend_icon = TREND_ICONS.get(summary.get("trend"), "")
+            message += f"📊 Último: {summary['last_euros']:.2f}€ {trend_icon}".rstrip() + "\n"
+            if summary.get("min_30d_euros") is not None:
+                message += f"📉 Mínimo 30 días: {summary['min_30d_euros']:.2f}€\n"
+        message += f"🆔 ID: {alert['id']}\n\n"
 
-    alerts_response = call_api(f"/alerts?user_id={user_id}")
-    
-    if "error" in alerts_response:
+    # Agregar botones para gestionar alertas
+    keyboard = []
+    navigation = page_navigation(alerts_page, "alerts_page_")
+    if navigation:
+        keyboard.append(navigation)
+    keyboard += [
+        [InlineKeyboardButton("🆕 Nueva Alerta", callback_data="create_alert")],
+        [InlineKeyboardButton("🗑️ Eliminar Alerta", callback_data=f"delmenu_{alerts_page.page}")],
+        [InlineKeyboardButton("🏠 Menú Principal", callback_data="start")]
+    ]
+    return message, InlineKeyboardMarkup(keyboard)
+
+
+async def my_alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0) -> None:
+    """
+    Muestra las alertas activas del usuario, una página cada vez.
+    """
+    alerts_page = await load_alerts_page(update.effective_user.id, page)
+    if alerts_page is None:
+        # Determinar si viene de callback o comando directo
         if update.callback_query:
             await update.callback_query.edit_message_text("❌ Error al obtener tus alertas.")
         else:
             await update.message.reply_text("❌ Error al obtener tus alertas.")
         return
 
-    alerts = alerts_response.get("alerts", [])
-    
-    if not alerts:
+    if not alerts_page.alerts:
         keyboard = [
             [InlineKeyboardButton("🆕 Crear Primera Alerta", callback_data="create_alert")],
             [InlineKeyboardButton("❓ Ayuda", callback_data="help")],
@@ -240,29 +387,7 @@ async def my_alerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text(message_text, reply_markup=reply_markup)
         return
 
-    message = "📋 <b>Tus alertas activas:</b>\n\n"
-    
-    for i, alert in enumerate(alerts, 1):
-        origin = alert["origin"]
-        destination = alert["destination"]
-        date_from = alert["date_from"]
-        date_to = alert["date_to"]
-        price_target = alert["price_target_cents"]
-        message += f"{i}. {origin} → {destination}\n"
-        message += f"📅 Salida: {date_from}\n"
-        if date_to:
-            message += f"🔄 Regreso: {date_to}\n"
-        if price_target:
-            message += f"💰 Precio objetivo: {price_target/100:.2f}€\n"
-        message += f"🆔 ID: {alert['id']}\n\n"
-
-    # Agregar botones para gestionar alertas
-    keyboard = [
-        [InlineKeyboardButton("🆕 Nueva Alerta", callback_data="create_alert")],
-        [InlineKeyboardButton("🗑️ Eliminar Alerta", callback_data="delete_alert")],
-        [InlineKeyboardButton("🏠 Menú Principal", callback_data="start")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = render_alerts_page(alerts_page)
     
     # Determinar si viene de callback o comando directo
     if update.callback_query:
@@ -297,11 +422,11 @@ async def get_origin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Recibe el aeropuerto de origen y pide el destino.
     """
-    origin = update.message.text.upper().strip()
-    # Validar código IATA (3 letras)
-    if len(origin) != 3 or not origin.isalpha():
+    # Código IATA o nombre de ciudad/aeropuerto
+    origin = resolve_airport(update.message.text.strip())
+    if not origin:
         await update.message.reply_text(
-            "❌ Por favor ingresa un código IATA válido de 3 letras (ej: MAD, BCN, LHR)."
+            "❌ No encuentro ese aeropuerto. Ingresa un código IATA (ej: MAD, BCN, LHR) o el nombre de la ciudad."
         )
         return ORIGIN
     context.user_data['origin'] = origin
@@ -319,11 +444,11 @@ async def get_destination(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """
     Recibe el aeropuerto de destino y pide la fecha de salida.
     """
-    destination = update.message.text.upper().strip()
-    # Validar código IATA
-    if len(destination) != 3 or not destination.isalpha():
+    # Código IATA o nombre de ciudad/aeropuerto
+    destination = resolve_airport(update.message.text.strip())
+    if not destination:
         await update.message.reply_text(
-            "❌ Por favor ingresa un código IATA válido de 3 letras (ej: MAD, BCN, LHR)."
+            "❌ No encuentro ese aeropuerto. Ingresa un código IATA (ej: MAD, BCN, LHR) o el nombre de la ciudad."
         )
         return DESTINATION
     if destination == context.user_data['origin']:
@@ -465,7 +590,7 @@ async def create_alert_api_call(update: Update, context: ContextTypes.DEFAULT_TY
     """
     Llama al API para crear la alerta con todos los datos recopilados.
     """
-    user_id = get_or_create_user(update.effective_user.id)
+    user_id = await get_or_create_user(update.effective_user.id)
     if not user_id:
         await update.message.reply_text("❌ Error al crear la alerta.")
         return
@@ -488,17 +613,20 @@ async def create_alert_api_call(update: Update, context: ContextTypes.DEFAULT_TY
         "date_from": context.user_data['date_from'].isoformat(),
         "date_to": context.user_data['date_to'].isoformat() if context.user_data.get('date_to') else None,
         "price_target_cents": context.user_data.get('price_target_cents'),
+        # Sin precio objetivo, avisar de los chollos (bajadas anómalas de la ruta)
+        "notify_deals": context.user_data.get('price_target_cents') is None,
         "max_stops": 2  # Por defecto máximo 2 escalas
     }
 
     # Llamar al API
-    response = call_api("/alerts", "POST", alert_data)
+    response = await call_api("/alerts", "POST", alert_data)
 
     if "error" in response:
         await update.message.reply_text(
             f"❌ Error al crear la alerta: {response['error']}"
         )
         return
+    alert_pages.invalidate(update.effective_user.id)
 
     # Mostrar resumen de la alerta creada (formato HTML seguro para Telegram)
     origin = context.user_data['origin']
@@ -516,6 +644,15 @@ async def create_alert_api_call(update: Update, context: ContextTypes.DEFAULT_TY
         summary += f"🔄 <b>Regreso:</b> {date_to.strftime('%d/%m/%Y')}\n"
     if price_target:
         summary += f"💰 <b>Precio objetivo:</b> {price_target/100:.2f}€\n"
+    else:
+        summary += "🔥 <b>Sin objetivo:</b> te avisaré de bajadas de precio inusuales\n"
+    # Último precio conocido para ese día (calendario compartido, sin gastar búsquedas)
+    calendar = await call_api(
+        f"/flights/calendar?origin={origin}&destination={destination}&date_from={date_from.strftime('%d/%m/%Y')}"
+    )
+    if calendar.get("days"):
+        known = calendar["days"][0]
+        summary += f"📊 <b>Último precio visto:</b> {known['price_euros']:.2f}€ ({known['airline']})\n"
     summary += f"\n🔔 Te notificaré cuando encuentre precios interesantes.\n\n{iata_link}"
     # Limpiar datos temporales
     context.user_data.clear()
@@ -553,24 +690,16 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # ============================================================================
 # FUNCIONES PARA ELIMINAR ALERTAS
 # ============================================================================
-async def show_delete_alerts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_delete_alerts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0) -> None:
     """
-    Muestra un menú para seleccionar qué alerta eliminar.
+    Muestra un menú para seleccionar qué alerta eliminar (las de la página actual).
     """
-    user_id = get_or_create_user(update.effective_user.id)
-    if not user_id:
-        await update.callback_query.edit_message_text("❌ Error al acceder a tus alertas.")
-        return
-
-    alerts_response = call_api(f"/alerts?user_id={user_id}")
-    
-    if "error" in alerts_response:
+    alerts_page = await load_alerts_page(update.effective_user.id, page)
+    if alerts_page is None:
         await update.callback_query.edit_message_text("❌ Error al obtener tus alertas.")
         return
 
-    alerts = alerts_response.get("alerts", [])
-    
-    if not alerts:
+    if not alerts_page.alerts:
         await update.callback_query.edit_message_text(
             "📭 No tienes alertas para eliminar.\n\n¿Quieres crear una nueva alerta?",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🆕 Crear Alerta", callback_data="create_alert")]])
@@ -579,7 +708,8 @@ async def show_delete_alerts_menu(update: Update, context: ContextTypes.DEFAULT_
 
     message = "🗑️ Selecciona la alerta que quieres eliminar:\n\n"
     keyboard = []
-    for i, alert in enumerate(alerts, 1):
+    first = alerts_page.page * ALERTS_PAGE_SIZE + 1
+    for i, alert in enumerate(alerts_page.alerts, first):
         origin = alert["origin"]
         destination = alert["destination"]
         date_from = alert["date_from"]
@@ -589,8 +719,11 @@ async def show_delete_alerts_menu(update: Update, context: ContextTypes.DEFAULT_
         # Botón para eliminar esta alerta específica
         keyboard.append([InlineKeyboardButton(f"❌ Eliminar #{i}", callback_data=f"delete_{alert['id']}")])
 
+    navigation = page_navigation(alerts_page, "delmenu_")
+    if navigation:
+        keyboard.append(navigation)
     # Agregar botón para cancelar
-    keyboard.append([InlineKeyboardButton("↩️ Volver a Mis Alertas", callback_data="my_alerts")])
+    keyboard.append([InlineKeyboardButton("↩️ Volver a Mis Alertas", callback_data=f"alerts_page_{alerts_page.page}")])
     keyboard.append([InlineKeyboardButton("🏠 Menú Principal", callback_data="start")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -607,7 +740,7 @@ async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE, alert
         return
     
     # Llamar a la API para eliminar la alerta
-    delete_response = call_api(f"/alerts/{alert_id_int}", "DELETE")
+    delete_response = await call_api(f"/alerts/{alert_id_int}", "DELETE")
     
     if "error" in delete_response:
         await update.callback_query.edit_message_text(
@@ -616,6 +749,8 @@ async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE, alert
         )
         return
     
+    alert_pages.invalidate(update.effective_user.id)
+
     # Confirmar eliminación exitosa
     success_message = "✅ Alerta eliminada exitosamente.\n\n¿Qué te gustaría hacer ahora?"
     keyboard = [
@@ -642,8 +777,13 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await my_alerts_command(update, context)
     elif query.data == "create_alert":
         await start_create_alert(update, context)
+    elif query.data.startswith("alerts_page_"):
+        # Navegar entre páginas de Mis Alertas
+        await my_alerts_command(update, context, int(query.data.replace("alerts_page_", "")))
     elif query.data == "delete_alert":
         await show_delete_alerts_menu(update, context)
+    elif query.data.startswith("delmenu_"):
+        await show_delete_alerts_menu(update, context, int(query.data.replace("delmenu_", "")))
     elif query.data.startswith("delete_"):
         # Eliminar alerta específica
         alert_id = query.data.replace("delete_", "")
@@ -662,19 +802,31 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 # ============================================================================
 # CONFIGURACIÓN Y EJECUCIÓN DEL BOT
 # ============================================================================
-def main() -> None:
+# BOT_MODE=polling (por defecto): el bot pide los updates a Telegram.
+# BOT_MODE=webhook: Telegram envía los updates a una app ASGI (backend/telegram_webhook.py)
+# que se puede replicar detrás de un balanceador.
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+
+# URL de la Bot API (se cambia para apuntar a un Telegram falso en pruebas de carga)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+
+def build_application(token: str, concurrent_updates=False, **builder_options) -> Application:
     """
-    Función principal que configura y ejecuta el bot.
+    Crea la aplicación con todos los handlers; la usan tanto el modo polling
+    como el webhook. builder_options se pasan al builder (p. ej. request=...).
     """
-    # Token del bot (debe configurarse como variable de entorno)
-    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-    if not TOKEN:
-        print("❌ Error: Define la variable TELEGRAM_BOT_TOKEN")
-        print("Ejemplo: export TELEGRAM_BOT_TOKEN='tu_token_aqui'")
-        return
-
-    # Crear aplicación
-    application = Application.builder().token(TOKEN).build()
+    builder = Application.builder().token(token).base_url(f"{TELEGRAM_API_URL}/bot")
+    builder = builder.concurrent_updates(concurrent_updates)
+    # Estado de las conversaciones en Postgres/SQLite si BOT_STATE_BACKEND lo pide
+    # (necesario con varias réplicas del webhook, ver backend/bot_state.py)
+    persistence = builder_options.pop('persistence', None) or create_persistence()
+    if persistence:
+        builder = builder.persistence(persistence).application_class(SharedStateApplication)
+    for option, value in builder_options.items():
+        builder = getattr(builder, option)(value)
+    application = builder.build()
 
     # Configurar conversación para crear alertas
     create_alert_handler = ConversationHandler(
@@ -692,7 +844,9 @@ def main() -> None:
             ],
             PRICE_TARGET: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_price_target)],
         },
-        fallbacks=[CommandHandler("cancel", cancel_command)]
+        fallbacks=[CommandHandler("cancel", cancel_command)],
+        name="create_alert",
+        persistent=persistence is not None
     )
 
     # Agregar handlers
@@ -701,6 +855,32 @@ def main() -> None:
     application.add_handler(CommandHandler("mis_alertas", my_alerts_command))
     application.add_handler(create_alert_handler)
     application.add_handler(CallbackQueryHandler(button_handler))
+    return application
+
+
+def main() -> None:
+    """
+    Función principal que configura y ejecuta el bot.
+    """
+    # Token del bot (debe configurarse como variable de entorno)
+    TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+    if not TOKEN:
+        print("❌ Error: Define la variable TELEGRAM_BOT_TOKEN")
+        print("Ejemplo: export TELEGRAM_BOT_TOKEN='tu_token_aqui'")
+        return
+
+    if BOT_MODE == 'webhook':
+        import uvicorn
+        from backend.telegram_webhook import create_webhook
+
+        # Servidor ASGI con el webhook; Telegram entrega los updates por POST
+        webhook = create_webhook(TOKEN, build_application)
+        print(f"🤖 Bot iniciado en modo webhook (puerto {WEBHOOK_PORT}). Presiona Ctrl+C para detener.")
+        uvicorn.run(webhook.asgi_app(), host="0.0.0.0", port=WEBHOOK_PORT)
+        return
+
+    # Crear aplicación
+    application = build_application(TOKEN)
 
     # Ejecutar bot
     print("🤖 Bot iniciado. Presiona Ctrl+C para detener.")
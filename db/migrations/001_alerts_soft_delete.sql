@@ -0,0 +1,19 @@
+-- Migración para bases de datos creadas antes del borrado lógico de alertas.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/001_alerts_soft_delete.sql
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- Las FK pasan a ON DELETE CASCADE para que el borrado final de la alerta
+-- arrastre cualquier fila que el worker haya insertado durante la purga
+ALTER TABLE search_snapshots
+    DROP CONSTRAINT IF EXISTS search_snapshots_alert_id_fkey,
+    ADD CONSTRAINT search_snapshots_alert_id_fkey
+        FOREIGN KEY (alert_id) REFERENCES alerts(id) ON DELETE CASCADE;
+
+ALTER TABLE notifications_sent
+    DROP CONSTRAINT IF EXISTS notifications_sent_alert_id_fkey,
+    ADD CONSTRAINT notifications_sent_alert_id_fkey
+        FOREIGN KEY (alert_id) REFERENCES alerts(id) ON DELETE CASCADE;
+
+CREATE INDEX IF NOT EXISTS idx_search_snapshots_alert_id ON search_snapshots (alert_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_sent_alert_id ON notifications_sent (alert_id);
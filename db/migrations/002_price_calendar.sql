@@ -0,0 +1,12 @@
+-- Calendario de precios por (origen, destino, día) compartido por worker, API y bot.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/002_price_calendar.sql
+
+CREATE TABLE IF NOT EXISTS price_calendar (
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    departure_date DATE NOT NULL,
+    price_cents INTEGER NOT NULL,
+    details JSONB,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (origin, destination, departure_date)
+);
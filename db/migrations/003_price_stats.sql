@@ -0,0 +1,39 @@
+-- Estadísticas de precio incrementales por alerta y por ruta.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/003_price_stats.sql
+-- y rellenar con el histórico: python tools/backfill_price_stats.py
+
+CREATE TABLE IF NOT EXISTS alert_price_stats (
+    alert_id INTEGER PRIMARY KEY REFERENCES alerts(id) ON DELETE CASCADE,
+    observations INTEGER NOT NULL DEFAULT 0,
+    min_cents INTEGER,
+    min_at TIMESTAMP,
+    max_cents INTEGER,
+    max_at TIMESTAMP,
+    last_cents INTEGER,
+    last_at TIMESTAMP,
+    ewma DOUBLE PRECISION,
+    ewm_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    daily_min INTEGER[] NOT NULL DEFAULT '{}',
+    daily_min_start DATE,
+    sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS route_price_stats (
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    observations INTEGER NOT NULL DEFAULT 0,
+    min_cents INTEGER,
+    min_at TIMESTAMP,
+    max_cents INTEGER,
+    max_at TIMESTAMP,
+    last_cents INTEGER,
+    last_at TIMESTAMP,
+    ewma DOUBLE PRECISION,
+    ewm_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    daily_min INTEGER[] NOT NULL DEFAULT '{}',
+    daily_min_start DATE,
+    sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (origin, destination)
+);
@@ -0,0 +1,4 @@
+-- Aviso opcional de chollos (bajadas anómalas del precio de la ruta) por alerta.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/004_alert_notify_deals.sql
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS notify_deals BOOLEAN NOT NULL DEFAULT FALSE;
@@ -0,0 +1,26 @@
+-- Outbox transaccional de notificaciones de Telegram.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/005_notification_outbox.sql
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    alert_id INTEGER NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+    user_id INTEGER,
+    chat_id BIGINT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    price_cents INTEGER,
+    message TEXT NOT NULL,
+    -- pending -> sending (con lease hasta locked_until) -> sent | failed
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (next_attempt_at)
+    WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_alert ON notification_outbox (alert_id)
+    WHERE status IN ('pending', 'sending');
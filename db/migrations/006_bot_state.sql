@@ -0,0 +1,10 @@
+-- Estado compartido de las conversaciones del bot (varias réplicas).
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/006_bot_state.sql
+
+CREATE TABLE IF NOT EXISTS bot_state (
+    kind VARCHAR(64) NOT NULL,
+    state_key VARCHAR(64) NOT NULL,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, state_key)
+);
@@ -0,0 +1,5 @@
+-- Índice para paginar las alertas de un usuario (GET /alerts con limit/offset).
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/007_alerts_user_page_index.sql
+
+CREATE INDEX IF NOT EXISTS idx_alerts_user_created ON alerts (user_id, created_at DESC, id DESC)
+    WHERE deleted_at IS NULL;
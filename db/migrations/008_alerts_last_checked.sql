@@ -0,0 +1,19 @@
+-- Progreso del worker por alerta: última revisión, para retomar un ciclo
+-- interrumpido sin volver a buscar lo ya revisado en este intervalo.
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/008_alerts_last_checked.sql
+
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_checked_at TIMESTAMP;
+
+-- Las alertas existentes toman su último snapshot (o su creación) como última
+-- revisión, para que el primer ciclo tras el despliegue no las trate todas
+-- como atrasadas
+UPDATE alerts a
+SET last_checked_at = COALESCE(
+    (SELECT MAX(ss.found_at) FROM search_snapshots ss WHERE ss.alert_id = a.id),
+    a.created_at
+)
+WHERE a.last_checked_at IS NULL;
+
+-- Alertas pendientes de revisar, las más atrasadas primero
+CREATE INDEX IF NOT EXISTS idx_alerts_active_last_checked ON alerts (last_checked_at NULLS FIRST, created_at)
+    WHERE active = TRUE;
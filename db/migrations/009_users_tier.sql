@@ -0,0 +1,5 @@
+-- Nivel del usuario ('free' o 'premium'): las alertas premium tienen su propio
+-- carril de prioridad en el worker (backend/alert_scheduler.py).
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/009_users_tier.sql
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS tier VARCHAR(20) NOT NULL DEFAULT 'free';
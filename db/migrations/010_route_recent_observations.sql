@@ -0,0 +1,7 @@
+-- Claves de las últimas observaciones de cada ruta (ciclo, vuelo y precio) con
+-- el chollo que se calculó: las alertas de la misma ruta que ven el mismo vuelo
+-- en un ciclo no lo suman varias veces y reciben el mismo chollo
+-- (backend/price_stats.py).
+-- Ejecutar una vez: psql -d vuelos -f db/migrations/010_route_recent_observations.sql
+
+ALTER TABLE route_price_stats ADD COLUMN IF NOT EXISTS recent_observations JSONB NOT NULL DEFAULT '[]';
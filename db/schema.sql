@@ -3,6 +3,8 @@
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     telegram_id BIGINT UNIQUE NOT NULL,
+    -- 'free' o 'premium' (carril de prioridad propio en el worker)
+    tier VARCHAR(20) NOT NULL DEFAULT 'free',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -20,13 +22,19 @@ CREATE TABLE IF NOT EXISTS alerts (
     max_stops INTEGER,
     airports_alternatives TEXT[],
     active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    -- Avisar también de bajadas anómalas de la ruta ("chollos"), haya objetivo o no
+    notify_deals BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Borrado lógico: la purga del histórico se hace después en segundo plano
+    deleted_at TIMESTAMP,
+    -- Última revisión del worker (se guarda por lotes; un ciclo interrumpido se retoma desde aquí)
+    last_checked_at TIMESTAMP
 );
 
 -- Tabla de snapshots de precios
 CREATE TABLE IF NOT EXISTS search_snapshots (
     id SERIAL PRIMARY KEY,
-    alert_id INTEGER REFERENCES alerts(id),
+    alert_id INTEGER REFERENCES alerts(id) ON DELETE CASCADE,
     found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     price_cents INTEGER,
     details JSONB
@@ -35,7 +43,110 @@ CREATE TABLE IF NOT EXISTS search_snapshots (
 -- Tabla de notificaciones enviadas
 CREATE TABLE IF NOT EXISTS notifications_sent (
     id SERIAL PRIMARY KEY,
-    alert_id INTEGER REFERENCES alerts(id),
+    alert_id INTEGER REFERENCES alerts(id) ON DELETE CASCADE,
     price_cents INTEGER,
     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Índices para borrar/consultar el histórico de una alerta sin recorrer la tabla entera
+CREATE INDEX IF NOT EXISTS idx_search_snapshots_alert_id ON search_snapshots (alert_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_sent_alert_id ON notifications_sent (alert_id);
+
+-- Páginas de "Mis Alertas" (GET /alerts con limit/offset) sin ordenar todas las del usuario
+CREATE INDEX IF NOT EXISTS idx_alerts_user_created ON alerts (user_id, created_at DESC, id DESC)
+    WHERE deleted_at IS NULL;
+
+-- Alertas pendientes de revisar por el worker, las más atrasadas primero
+CREATE INDEX IF NOT EXISTS idx_alerts_active_last_checked ON alerts (last_checked_at NULLS FIRST, created_at)
+    WHERE active = TRUE;
+
+-- Calendario de precios por ruta y día: el vuelo más barato visto en cualquier
+-- búsqueda (worker, API, fechas flexibles). Se actualiza con upserts y se lee
+-- antes de llamar al proveedor.
+CREATE TABLE IF NOT EXISTS price_calendar (
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    departure_date DATE NOT NULL,
+    price_cents INTEGER NOT NULL,
+    details JSONB,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (origin, destination, departure_date)
+);
+
+-- Estadísticas de precio incrementales (backend/price_stats.py): mínimo,
+-- máximo, último, EWMA/volatilidad, mínimos diarios de los últimos 30 días y
+-- sketch de percentiles. Se actualizan en la transacción de cada snapshot.
+CREATE TABLE IF NOT EXISTS alert_price_stats (
+    alert_id INTEGER PRIMARY KEY REFERENCES alerts(id) ON DELETE CASCADE,
+    observations INTEGER NOT NULL DEFAULT 0,
+    min_cents INTEGER,
+    min_at TIMESTAMP,
+    max_cents INTEGER,
+    max_at TIMESTAMP,
+    last_cents INTEGER,
+    last_at TIMESTAMP,
+    ewma DOUBLE PRECISION,
+    ewm_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    daily_min INTEGER[] NOT NULL DEFAULT '{}',
+    daily_min_start DATE,
+    sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS route_price_stats (
+    origin VARCHAR(3) NOT NULL,
+    destination VARCHAR(3) NOT NULL,
+    observations INTEGER NOT NULL DEFAULT 0,
+    min_cents INTEGER,
+    min_at TIMESTAMP,
+    max_cents INTEGER,
+    max_at TIMESTAMP,
+    last_cents INTEGER,
+    last_at TIMESTAMP,
+    ewma DOUBLE PRECISION,
+    ewm_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    daily_min INTEGER[] NOT NULL DEFAULT '{}',
+    daily_min_start DATE,
+    sketch JSONB NOT NULL DEFAULT '{}',
+    -- [clave, chollo] de las últimas observaciones: cada una cuenta una sola vez
+    recent_observations JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (origin, destination)
+);
+
+-- Outbox de notificaciones (backend/outbox.py): el aviso se escribe en la
+-- transacción del snapshot y un relay lo entrega a Telegram con reintentos.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    alert_id INTEGER NOT NULL REFERENCES alerts(id) ON DELETE CASCADE,
+    user_id INTEGER,
+    chat_id BIGINT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    price_cents INTEGER,
+    message TEXT NOT NULL,
+    -- pending -> sending (con lease hasta locked_until) -> sent | failed
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (next_attempt_at)
+    WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_alert ON notification_outbox (alert_id)
+    WHERE status IN ('pending', 'sending');
+
+-- Estado de las conversaciones del bot y user_data (backend/bot_state.py),
+-- compartido por todas las réplicas del bot. kind: 'user_data' o
+-- 'conversation:<nombre>'; state_key: user_id o chat_id:user_id.
+CREATE TABLE IF NOT EXISTS bot_state (
+    kind VARCHAR(64) NOT NULL,
+    state_key VARCHAR(64) NOT NULL,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, state_key)
+);
@@ -1 +1,429 @@
 # Módulo de IA para predicción de precios
+# ============================================================================
+# MOTOR DE PREDICCIÓN: ¿BAJARÁ EL PRECIO O CONVIENE COMPRAR YA?
+# ============================================================================
+# 1. Carga el histórico de search_snapshots (unido a su alerta) en arrays
+#    columnares de NumPy/pandas con una sola consulta.
+# 2. Calcula las features de forma vectorizada por (ruta, fecha de salida):
+#    días hasta la salida, precio frente a la mediana de la ruta y frente al
+#    mínimo visto hasta ese momento, día de la semana de la salida. La
+#    etiqueta es si después se vio un precio al menos DROP_THRESHOLD más bajo.
+# 3. Entrena un modelo por ruta (regresión logística) en paralelo con un pool
+#    de procesos; las rutas con pocos datos usan un modelo global.
+# 4. Puntúa todas las alertas activas de una pasada: una matriz de features
+#    para todas y una llamada a predict_proba por ruta.
+# 5. Guarda los modelos en disco (joblib) junto con una huella del histórico;
+#    si el histórico no ha cambiado, se recargan en lugar de reentrenar.
+# 6. La API nunca entrena: sirve el último modelo guardado (load_predictor),
+#    aunque el histórico haya crecido desde entonces. Se reentrena fuera de
+#    la petición con `python -m ia.model train` (por ejemplo, con cron).
+#
+# Uso:
+#   python -m ia.model train [--workers 4]
+#   python -m ia.model score
+# ============================================================================
+
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = os.getenv('IA_ARTIFACTS_DIR', os.path.join(os.path.dirname(__file__), 'artifacts'))
+MODEL_FILE = 'price_model.joblib'
+
+# Histórico que se usa para entrenar
+HISTORY_DAYS = int(os.getenv('IA_HISTORY_DAYS', '365'))
+
+# Observaciones etiquetadas mínimas para tener modelo propio de ruta
+MIN_ROUTE_SAMPLES = 200
+
+# Máximo de filas para el modelo global (muestra aleatoria si hay más)
+GLOBAL_SAMPLE_ROWS = 200_000
+
+# Una bajada cuenta si el precio cae al menos un 3%
+DROP_THRESHOLD = 0.03
+
+# Umbrales de la recomendación sobre la probabilidad de bajada
+WAIT_PROBABILITY = 0.6
+BUY_PROBABILITY = 0.4
+
+GLOBAL_ROUTE = '*'
+
+
+class NotEnoughDataError(ValueError):
+    """Ninguna (ruta, fecha de salida) tiene todavía una observación posterior con la que etiquetar"""
+
+
+SNAPSHOTS_QUERY = """
+    SELECT a.origin, a.destination, a.date_from, s.found_at, s.price_cents
+    FROM search_snapshots s
+    JOIN alerts a ON a.id = s.alert_id
+    WHERE s.price_cents IS NOT NULL
+      AND s.found_at >= NOW() - %s * INTERVAL '1 day'
+"""
+
+FINGERPRINT_QUERY = "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM search_snapshots"
+
+ACTIVE_ALERTS_QUERY = """
+    SELECT a.id, a.origin, a.destination, a.date_from,
+           (SELECT s.price_cents FROM search_snapshots s
+            WHERE s.alert_id = a.id AND s.price_cents IS NOT NULL
+            ORDER BY s.found_at DESC LIMIT 1) AS last_price,
+           (SELECT MIN(s.price_cents) FROM search_snapshots s WHERE s.alert_id = a.id) AS min_price
+    FROM alerts a
+    WHERE a.active = TRUE AND a.deleted_at IS NULL AND a.date_from >= CURRENT_DATE
+"""
+
+
+# ============================================================================
+# CARGA DE DATOS (COLUMNAR)
+# ============================================================================
+
+def load_snapshots(conn, history_days: int = HISTORY_DAYS) -> pd.DataFrame:
+    """Histórico de precios como DataFrame: route, departure, found_at, price"""
+    with conn.cursor() as cur:
+        cur.execute(SNAPSHOTS_QUERY, (history_days,))
+        rows = cur.fetchall()
+    if not rows:
+        return pd.DataFrame({'route': pd.Categorical([]), 'departure': pd.to_datetime([]),
+                             'found_at': pd.to_datetime([]), 'price': np.array([], dtype=np.float32)})
+    origin, destination, departure, found_at, price = zip(*rows)
+    return pd.DataFrame({
+        'route': pd.Categorical([f"{o}-{d}" for o, d in zip(origin, destination)]),
+        'departure': pd.to_datetime(departure),
+        'found_at': pd.to_datetime(found_at),
+        'price': np.asarray(price, dtype=np.float32),
+    })
+
+
+def load_active_alerts(conn, alert_ids: Optional[list] = None) -> pd.DataFrame:
+    """Alertas activas con su último precio y el mínimo visto: alert_id, route, departure, price, min_seen"""
+    with conn.cursor() as cur:
+        if alert_ids is None:
+            cur.execute(ACTIVE_ALERTS_QUERY)
+        else:
+            cur.execute(ACTIVE_ALERTS_QUERY + " AND a.id = ANY(%s)", (list(alert_ids),))
+        rows = [row for row in cur.fetchall() if row[4] is not None]
+    if not rows:
+        return pd.DataFrame(columns=['alert_id', 'route', 'departure', 'price', 'min_seen'])
+    alert_id, origin, destination, departure, price, min_seen = zip(*rows)
+    return pd.DataFrame({
+        'alert_id': np.asarray(alert_id, dtype=np.int64),
+        'route': [f"{o}-{d}" for o, d in zip(origin, destination)],
+        'departure': pd.to_datetime(departure),
+        'price': np.asarray(price, dtype=np.float32),
+        'min_seen': np.asarray(min_seen, dtype=np.float32),
+    })
+
+
+def data_fingerprint(conn) -> Tuple[int, int]:
+    with conn.cursor() as cur:
+        cur.execute(FINGERPRINT_QUERY)
+        count, max_id = cur.fetchone()
+    return int(count), int(max_id)
+
+
+# ============================================================================
+# FEATURES Y ETIQUETAS (VECTORIZADAS)
+# ============================================================================
+
+N_FEATURES = 5
+
+
+def _feature_matrix(days_to_departure: np.ndarray, price: np.ndarray, route_median: np.ndarray,
+                    min_seen: np.ndarray, departure: pd.Series) -> np.ndarray:
+    """Columnas: días hasta la salida, log, precio/mediana de la ruta, precio/mínimo visto, día de la semana"""
+    days = np.clip(days_to_departure, 0, None).astype(np.float32)
+    return np.column_stack([
+        days,
+        np.log1p(days),
+        price / route_median,
+        price / min_seen,
+        departure.dt.dayofweek.to_numpy(dtype=np.float32),
+    ]).astype(np.float32)
+
+
+def build_training_set(snapshots: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray, Dict[str, float]]:
+    """
+    Features y etiquetas de todas las observaciones con futuro conocido.
+    Devuelve (filas, X, y, mediana de precio por ruta).
+    """
+    df = snapshots.sort_values(['route', 'departure', 'found_at'], kind='stable').reset_index(drop=True)
+    keys = [df['route'], df['departure']]
+
+    route_median = df.groupby('route', observed=True)['price'].transform('median').to_numpy(np.float32)
+    min_seen = df.groupby(keys, observed=True)['price'].cummin().to_numpy(np.float32)
+
+    # Mínimo de las observaciones POSTERIORES de la misma ruta y fecha (cummin al revés, desplazado)
+    reversed_df = df.iloc[::-1]
+    reversed_keys = [reversed_df['route'], reversed_df['departure']]
+    future_min = (reversed_df.groupby(reversed_keys, observed=True)['price'].cummin()
+                  .groupby(reversed_keys, observed=True).shift(1))
+    future_min = future_min.iloc[::-1].to_numpy(np.float32)
+
+    days = (df['departure'] - df['found_at'].dt.normalize()).dt.days.to_numpy()
+    X = _feature_matrix(days, df['price'].to_numpy(np.float32), route_median, min_seen, df['departure'])
+
+    labeled = ~np.isnan(future_min)
+    y = future_min[labeled] < df['price'].to_numpy(np.float32)[labeled] * (1 - DROP_THRESHOLD)
+
+    medians = df.groupby('route', observed=True)['price'].median().astype(float).to_dict()
+    return df[labeled].reset_index(drop=True), X[labeled], y, medians
+
+
+# ============================================================================
+# ENTRENAMIENTO (UN PROCESO POR RUTA)
+# ============================================================================
+
+def _train_route(task: Tuple[str, np.ndarray, np.ndarray]) -> Tuple[str, Any]:
+    """Entrena el modelo de una ruta. Con una sola clase guarda la probabilidad constante."""
+    route, X, y = task
+    positive_rate = float(y.mean()) if len(y) else 0.5
+    if positive_rate in (0.0, 1.0):
+        return route, positive_rate
+    model = make_pipeline(StandardScaler(), LogisticRegression(max_iter=200))
+    model.fit(X, y)
+    return route, model
+
+
+class PricePredictor:
+    """
+    Modelos por ruta + modelo global. models[ruta] es un Pipeline de sklearn o,
+    si la ruta solo tenía una clase, la probabilidad constante (float).
+    """
+
+    def __init__(self):
+        self.models: Dict[str, Any] = {}
+        self.route_medians: Dict[str, float] = {}
+        self.fingerprint: Optional[Tuple[int, int]] = None
+        self.trained_at: Optional[datetime] = None
+        self.samples = 0
+        self._weights = None
+
+    def fit(self, snapshots: pd.DataFrame, workers: Optional[int] = None) -> 'PricePredictor':
+        rows, X, y, self.route_medians = build_training_set(snapshots)
+        self.samples = len(y)
+        if not self.samples:
+            raise NotEnoughDataError(f"Sin observaciones etiquetadas en {len(snapshots)} snapshots: "
+                                     f"hace falta un segundo precio de la misma ruta y fecha")
+
+        tasks = []
+        routes = rows['route'].to_numpy()
+        order = np.argsort(routes, kind='stable')
+        unique_routes, starts = np.unique(routes[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        for route, start, end in zip(unique_routes, starts, bounds):
+            if end - start >= MIN_ROUTE_SAMPLES:
+                idx = order[start:end]
+                tasks.append((route, X[idx], y[idx]))
+
+        if len(y) > GLOBAL_SAMPLE_ROWS:
+            idx = np.random.default_rng(0).choice(len(y), GLOBAL_SAMPLE_ROWS, replace=False)
+            tasks.append((GLOBAL_ROUTE, X[idx], y[idx]))
+        else:
+            tasks.append((GLOBAL_ROUTE, X, y))
+
+        workers = workers or os.cpu_count() or 1
+        start_time = time.perf_counter()
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                self.models = dict(pool.map(_train_route, tasks))
+        else:
+            self.models = dict(map(_train_route, tasks))
+        self.trained_at = datetime.now()
+        self._weights = None
+        logger.info(f"🧠 {len(self.models) - 1} modelos de ruta + global entrenados con {self.samples} "
+                    f"observaciones en {time.perf_counter() - start_time:.1f}s ({workers} procesos)")
+        return self
+
+    def _stacked_weights(self) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        """
+        Cada modelo (StandardScaler + LogisticRegression) reducido a pesos lineales:
+        logit = x · w + b, con w = coef / scale y b = intercept - mean · w. Una
+        probabilidad constante p queda como w = 0, b = logit(p). Se apilan en una
+        fila por modelo para puntuar todas las alertas con una sola operación.
+        """
+        if getattr(self, '_weights', None) is None:
+            keys = sorted(self.models)
+            weights = np.zeros((len(keys), N_FEATURES), dtype=np.float64)
+            bias = np.zeros(len(keys), dtype=np.float64)
+            for i, key in enumerate(keys):
+                model = self.models[key]
+                if isinstance(model, float):
+                    p = min(max(model, 1e-6), 1 - 1e-6)
+                    bias[i] = np.log(p / (1 - p))
+                else:
+                    scaler, classifier = model[0], model[-1]
+                    weights[i] = classifier.coef_[0] / scaler.scale_
+                    bias[i] = classifier.intercept_[0] - scaler.mean_ @ weights[i]
+            self._weights = ({key: i for i, key in enumerate(keys)}, weights, bias)
+        return self._weights
+
+    def predict_drop_probability(self, alerts: pd.DataFrame) -> np.ndarray:
+        """
+        Probabilidad de bajada para cada fila de alerts (route, departure, price,
+        min_seen), de una pasada: features vectorizadas para todas las filas y el
+        modelo de cada fila (el de su ruta o el global) aplicado con los pesos apilados.
+        """
+        if alerts.empty:
+            return np.array([], dtype=np.float32)
+
+        routes = alerts['route'].to_numpy()
+        medians = pd.Series(routes).map(self.route_medians).to_numpy(dtype=np.float32)
+        prices = alerts['price'].to_numpy(np.float32)
+        medians = np.where(np.isnan(medians), prices, medians)
+        today = pd.Timestamp(datetime.now().date())
+        days = (alerts['departure'] - today).dt.days.to_numpy()
+        X = _feature_matrix(days, prices, medians, alerts['min_seen'].to_numpy(np.float32), alerts['departure'])
+
+        if not self.models:
+            return np.full(len(alerts), 0.5, dtype=np.float32)
+        index, weights, bias = self._stacked_weights()
+        global_row = index[GLOBAL_ROUTE]
+        rows = pd.Series(routes).map(index).fillna(global_row).to_numpy(dtype=np.int64)
+        logits = np.einsum('ij,ij->i', X.astype(np.float64), weights[rows]) + bias[rows]
+        return (1 / (1 + np.exp(-logits))).astype(np.float32)
+
+    def score_alerts(self, alerts: pd.DataFrame) -> pd.DataFrame:
+        """alert_id, probabilidad de bajada y recomendación ('esperar', 'comprar_ya' o 'neutral')"""
+        probabilities = self.predict_drop_probability(alerts)
+        recommendation = np.where(
+            probabilities >= WAIT_PROBABILITY, 'esperar',
+            np.where(probabilities <= BUY_PROBABILITY, 'comprar_ya', 'neutral')
+        )
+        return pd.DataFrame({
+            'alert_id': alerts['alert_id'].to_numpy() if 'alert_id' in alerts else np.arange(len(alerts)),
+            'drop_probability': probabilities.round(3),
+            'recommendation': recommendation,
+        })
+
+    # ------------------------------------------------------------------------
+    # Artefactos en disco
+    # ------------------------------------------------------------------------
+
+    # El estado se guarda como dict (no la instancia) para poder cargarlo
+    # tanto desde `python -m ia.model` como desde el backend
+    _STATE = ('models', 'route_medians', 'fingerprint', 'trained_at', 'samples')
+
+    def save(self, directory: str = ARTIFACTS_DIR) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, MODEL_FILE)
+        tmp_path = f"{path}.tmp"
+        joblib.dump({name: getattr(self, name) for name in self._STATE}, tmp_path, compress=3)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, directory: str = ARTIFACTS_DIR) -> Optional['PricePredictor']:
+        path = os.path.join(directory, MODEL_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            state = joblib.load(path)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar el modelo de {path}: {e}")
+            return None
+        predictor = cls()
+        for name in cls._STATE:
+            setattr(predictor, name, state[name])
+        return predictor
+
+
+# ============================================================================
+# PREDICTOR GLOBAL (CACHEADO EN DISCO Y EN MEMORIA)
+# ============================================================================
+
+_predictor: Optional[PricePredictor] = None
+_predictor_mtime: Optional[float] = None
+_predictor_lock = threading.Lock()
+
+
+def load_predictor(directory: str = ARTIFACTS_DIR) -> Optional[PricePredictor]:
+    """
+    Último modelo entrenado, sin reentrenar: el de memoria, o el de disco si el
+    fichero ha cambiado desde que se cargó. None si aún no se ha entrenado ninguno.
+    """
+    global _predictor, _predictor_mtime
+    try:
+        mtime = os.path.getmtime(os.path.join(directory, MODEL_FILE))
+    except OSError:
+        return _predictor
+    with _predictor_lock:
+        if _predictor is None or mtime != _predictor_mtime:
+            loaded = PricePredictor.load(directory)
+            if loaded is not None:
+                _predictor, _predictor_mtime = loaded, mtime
+        return _predictor
+
+
+def get_predictor(conn, workers: Optional[int] = None, force: bool = False) -> PricePredictor:
+    """
+    Predictor al día con el histórico: el de memoria o el de disco si su huella
+    coincide con la de search_snapshots; si no, se reentrena y se guarda.
+    """
+    global _predictor, _predictor_mtime
+    fingerprint = data_fingerprint(conn)
+    with _predictor_lock:
+        if not force:
+            if _predictor is not None and _predictor.fingerprint == fingerprint:
+                return _predictor
+            cached = PricePredictor.load()
+            if cached is not None and cached.fingerprint == fingerprint:
+                _predictor = cached
+                return _predictor
+
+        predictor = PricePredictor().fit(load_snapshots(conn), workers=workers)
+        predictor.fingerprint = fingerprint
+        _predictor_mtime = os.path.getmtime(predictor.save())
+        _predictor = predictor
+        return _predictor
+
+
+def score_active_alerts(conn, workers: Optional[int] = None) -> pd.DataFrame:
+    """Recomendación para todas las alertas activas con histórico"""
+    predictor = get_predictor(conn, workers=workers)
+    return predictor.score_alerts(load_active_alerts(conn))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predicción de precios de las alertas")
+    parser.add_argument('command', choices=['train', 'score'])
+    parser.add_argument('--workers', type=int, default=None, help="Procesos para entrenar (por defecto, todos los cores)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+    from backend import db
+
+    conn = db.get_connection()
+    try:
+        if args.command == 'train':
+            predictor = get_predictor(conn, workers=args.workers, force=True)
+            print(f"✅ Modelo guardado en {os.path.join(ARTIFACTS_DIR, MODEL_FILE)} "
+                  f"({predictor.samples} observaciones, {len(predictor.models) - 1} rutas con modelo propio)")
+        else:
+            scores = score_active_alerts(conn, workers=args.workers)
+            print(scores.to_string(index=False) if not scores.empty else "😴 No hay alertas activas con histórico")
+    except NotEnoughDataError as e:
+        print(f"😴 Todavía no se puede entrenar: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Igual que el worker: añadir la raíz del repo al path para importar backend/, worker/, etc.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
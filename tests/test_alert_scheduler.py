@@ -0,0 +1,57 @@
+import pytest
+
+from backend.alert_scheduler import PriorityScheduler, parse_weights
+
+
+def test_parse_weights():
+    assert parse_weights('urgent:5, standard:2') == {'urgent': 5, 'premium': 1, 'near_target': 1, 'standard': 2}
+    with pytest.raises(ValueError):
+        parse_weights('vip:3')
+    with pytest.raises(ValueError):
+        parse_weights('urgent:0')
+
+
+def test_weighted_lanes_with_starvation_protection():
+    now = [1000.0]
+    scheduler = PriorityScheduler({'urgent': 3, 'premium': 1, 'near_target': 1, 'standard': 1},
+                                  max_wait_seconds=600, clock=lambda: now[0])
+    fetched = []
+
+    def lane(alerts):
+        # Como los cursores del worker: se lee del carril solo cuando hace falta
+        for due_at, alert in alerts:
+            fetched.append(alert['id'])
+            yield due_at, alert
+
+    scheduler.open({'urgent': lane((990 + i, {'id': i}) for i in range(6)),
+                    'standard': lane((900 + i, {'id': i}) for i in range(10, 12))},
+                   totals={'urgent': 6, 'standard': 2})
+
+    order = [scheduler.next() for _ in range(4)]
+    # 3 de cada 4 turnos para urgent, intercalados; dentro del carril, por antigüedad
+    assert [item.lane for item in order] == ['urgent', 'urgent', 'standard', 'urgent']
+    assert [item.alert['id'] for item in order] == [0, 1, 10, 2]
+    assert fetched == [0, 10, 1, 2, 11, 3]
+
+    # La que lleva más de max_wait pendiente pasa delante aunque le toque a otro carril
+    now[0] = 1600
+    item = scheduler.next()
+    assert (item.alert['id'], item.promoted) == (11, True)
+    assert scheduler.depth() == {'urgent': 3, 'premium': 0, 'near_target': 0, 'standard': 0}
+    assert [scheduler.next().alert['id'] for _ in range(3)] == [3, 4, 5]
+    assert scheduler.next() is None and scheduler.pending() == 0
+
+
+def test_backlog_of_over_age_alerts_keeps_lane_weights():
+    now = 100000.0
+    scheduler = PriorityScheduler({'urgent': 3, 'premium': 1, 'near_target': 1, 'standard': 1},
+                                  max_wait_seconds=600, clock=lambda: now)
+    # Diez alertas standard con horas de atraso y unas urgentes que acaban de tocar
+    scheduler.open({'urgent': [(now - 1 + i, {'id': i}) for i in range(20)],
+                    'standard': [(now - 7200 + i, {'id': 100 + i}) for i in range(10)]})
+
+    picks = [scheduler.next() for _ in range(8)]
+    assert picks[0].lane == 'urgent' and not picks[0].promoted
+    # Como mucho una adelantada por ronda de 4 turnos: las urgentes siguen saliendo
+    assert sum(item.promoted for item in picks) <= 2
+    assert sum(item.lane == 'urgent' for item in picks) >= 4
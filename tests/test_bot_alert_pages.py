@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+from fastapi.testclient import TestClient
+
+from backend import db, main, price_stats
+from bot.bot import ALERTS_PAGE_SIZE, AlertPagesCache, AlertsPage, render_alerts_page
+
+
+def alert(alert_id):
+    return {"id": alert_id, "origin": "MAD", "destination": "BCN", "date_from": "2027-01-01",
+            "date_to": None, "price_target_cents": 9900, "notify_deals": False, "price_summary": None}
+
+
+def test_pages_are_cached_per_user_until_invalidated():
+    cache = AlertPagesCache(ttl=60, max_users=2)
+    page = AlertsPage([alert(1)], has_more=False, page=0)
+    cache.put(10, page)
+    assert cache.get(10, 0) is page
+    assert cache.get(10, 1) is None
+
+    cache.invalidate(10)
+    assert cache.get(10, 0) is None
+
+    # Se descarta el usuario usado hace más tiempo
+    for telegram_id in (1, 2, 3):
+        cache.put(telegram_id, page)
+    assert cache.get(1, 0) is None and cache.get(3, 0) is page
+
+
+def test_middle_page_has_both_navigation_buttons():
+    page = AlertsPage([alert(i) for i in range(ALERTS_PAGE_SIZE)], has_more=True, page=1)
+    text, markup = render_alerts_page(page)
+
+    assert "(página 2)" in text
+    assert f"{ALERTS_PAGE_SIZE + 1}. MAD → BCN" in text
+    navigation = [button.callback_data for button in markup.inline_keyboard[0]]
+    assert navigation == ["alerts_page_0", "alerts_page_2"]
+
+
+class PageConnection:
+    """Conexión falsa: devuelve tantas alertas (sin resumen de precios) como pida el LIMIT, hasta `stored`"""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.params = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        self.params = params
+
+    def fetchall(self):
+        limit, offset = self.params[1], self.params[2]
+        row = (1, 'MAD', 'BCN', date(2027, 1, 1), None, 9900, None, None, None, False, True,
+               datetime(2026, 10, 1), False) + (None,) * len(price_stats.STATS_COLUMNS)
+        return [row] * max(0, min(limit, self.stored - offset))
+
+    def close(self):
+        pass
+
+
+def test_alerts_endpoint_reads_one_extra_row_instead_of_counting(monkeypatch):
+    conn = PageConnection(stored=3)
+    monkeypatch.setattr(db, 'get_connection', lambda: conn)
+    client = TestClient(main.app)
+
+    first = client.get("/alerts", params={"user_id": 1, "limit": 2}).json()
+    assert conn.params == (1, 3, 0)
+    assert (len(first["alerts"]), first["has_more"]) == (2, True)
+
+    last = client.get("/alerts", params={"user_id": 1, "limit": 2, "offset": 2}).json()
+    assert (len(last["alerts"]), last["has_more"]) == (1, False)
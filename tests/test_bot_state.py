@@ -0,0 +1,85 @@
+import asyncio
+from datetime import date
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, CommandHandler, ConversationHandler, MessageHandler, filters
+
+from backend.bot_state import SharedStateApplication, SharedStatePersistence, SQLiteStateStore
+from tests.test_telegram_webhook import FakeBotRequest, message_update
+
+ASK_NAME, ASK_DATE = range(2)
+
+
+async def start(update, context):
+    context.user_data['started'] = True
+    return ASK_NAME
+
+
+async def got_name(update, context):
+    context.user_data['name'] = update.message.text
+    context.user_data['since'] = date(2026, 1, 2)
+    return ASK_DATE
+
+
+async def got_date(update, context):
+    context.user_data['done'] = f"{context.user_data['name']} {context.user_data['since']:%d/%m}"
+    return ConversationHandler.END
+
+
+def replica(path):
+    """Una réplica del bot con su propia Application y el mismo fichero de estado"""
+    persistence = SharedStatePersistence(SQLiteStateStore(path), update_interval=3600)
+    application = (
+        ApplicationBuilder().application_class(SharedStateApplication)
+        .token("1:TEST").request(FakeBotRequest()).get_updates_request(FakeBotRequest())
+        .persistence(persistence).build()
+    )
+    application.add_handler(ConversationHandler(
+        entry_points=[CommandHandler("go", start)],
+        states={
+            ASK_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, got_name)],
+            ASK_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, got_date)],
+        },
+        fallbacks=[],
+        name="flow", persistent=True
+    ))
+    return application
+
+
+def command_update(update_id, chat_id, command):
+    data = message_update(update_id, chat_id, command)
+    data['message']['entities'] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return data
+
+
+def test_conversation_continues_on_another_replica(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def scenario():
+        a, b = replica(path), replica(path)
+        await a.initialize()
+        await b.initialize()
+        try:
+            await a.process_update(Update.de_json(command_update(1, 10, "/go"), a.bot))
+            await a.process_update(Update.de_json(message_update(2, 10, "Ana"), a.bot))
+            # Escritura diferida: nada en disco hasta el siguiente volcado, y en uno solo
+            assert a.persistence.stats['flushes'] == 0
+            await a.update_persistence()
+            # El segundo mensaje no lee: A tenía cambios propios más recientes que el almacén
+            assert a.persistence.stats == {'loads': 1, 'flushes': 1, 'rows_written': 2}
+
+            # La réplica B carga el estado de ese chat y termina la conversación
+            await b.process_update(Update.de_json(message_update(3, 10, "mañana"), b.bot))
+            assert b.user_data[10]['done'] == "Ana 02/01"
+            await b.update_persistence()
+
+            # De vuelta en A: la conversación terminó, así que el texto ya no la continúa
+            await a.process_update(Update.de_json(message_update(4, 10, "otra vez"), a.bot))
+            assert a.user_data[10]['done'] == "Ana 02/01"
+            assert 'flow' in a._conversation_handler_conversations
+            assert (10, 10) not in a._conversation_handler_conversations['flow']
+        finally:
+            await a.shutdown()
+            await b.shutdown()
+
+    asyncio.run(scenario())
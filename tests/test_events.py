@@ -0,0 +1,30 @@
+import asyncio
+
+from backend.events import PriceEventBroker
+
+
+def test_broker_routes_events_by_user():
+    async def scenario():
+        broker = PriceEventBroker()
+        queue_a = broker.subscribe(1)
+        queue_b = broker.subscribe(2)
+        assert broker.publish({"type": "snapshot", "user_id": 1, "price_cents": 4200}) == 1
+        assert queue_a.get_nowait()["price_cents"] == 4200
+        assert queue_b.empty()
+
+        broker.unsubscribe(1, queue_a)
+        assert broker.publish({"type": "snapshot", "user_id": 1}) == 0
+        assert broker.connection_count == 1
+
+    asyncio.run(scenario())
+
+
+def test_broker_drops_oldest_event_for_slow_clients():
+    async def scenario():
+        broker = PriceEventBroker(queue_size=2)
+        queue = broker.subscribe(1)
+        for price in (100, 200, 300):
+            broker.publish({"type": "snapshot", "user_id": 1, "price_cents": price})
+        assert [queue.get_nowait()["price_cents"] for _ in range(2)] == [200, 300]
+
+    asyncio.run(scenario())
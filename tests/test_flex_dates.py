@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+
+from backend.flex_dates import FlexDateSearch
+from backend.flight_record import FlightRecord
+
+
+class FakeRangeAPI:
+    """Un vuelo por día con el precio indicado; cuenta las llamadas por rango"""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def search_date_range(self, origin, destination, date_start, date_end):
+        self.calls.append((date_start, date_end))
+        flights = []
+        day = date_start
+        while day <= date_end:
+            if day in self.prices:
+                flights.append(FlightRecord(
+                    id=f'f{day}', price_cents=self.prices[day], origin=origin, destination=destination,
+                    departure_time=f'{day.isoformat()}T08:00:00', arrival_time=None, airline='Vueling',
+                    stops=0, booking_link='https://kiwi.com', duration_seconds=3600, flight_number='VY1',
+                ))
+            day += timedelta(days=1)
+        return {'success': True, 'flights': flights}
+
+
+def test_window_is_one_range_call_and_then_cached():
+    center = date.today() + timedelta(days=30)
+    prices = {center + timedelta(days=d): 10000 - abs(d) * 1000 for d in range(-3, 4)}
+    api = FakeRangeAPI(prices)
+    search = FlexDateSearch(api)
+
+    result = search.alternatives('mad', 'bcn', center, days=3, limit=3)
+    assert len(api.calls) == 1 and result['upstream_calls'] == 1
+    # Más baratos primero; a igualdad de precio, el día anterior antes que el posterior
+    assert [o['days_from_target'] for o in result['alternatives']] == [-3, 3, -2]
+
+    again = search.alternatives('MAD', 'BCN', center, days=3, max_price_cents=8000)
+    assert len(api.calls) == 1 and again['upstream_calls'] == 0
+    assert all(o['flight'].price_cents <= 8000 for o in again['alternatives'])
+
+
+def test_call_budget_fetches_nearest_range_first():
+    center = date.today() + timedelta(days=30)
+    api = FakeRangeAPI({center + timedelta(days=1): 5000})
+    search = FlexDateSearch(api)
+
+    result = search.price_calendar('MAD', 'BCN', center, days=10, max_calls=1)
+    assert result['upstream_calls'] == 1 and not result['complete']
+    start, end = api.calls[0]
+    assert start <= center <= end
+
+
+class FakeStore:
+    """PriceCalendarStore en memoria"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.recorded = []
+
+    def read(self, origin, destination, start, end, max_age_seconds=None):
+        from backend.price_calendar import CalendarEntry
+        return {day: CalendarEntry(flight, None) for day, flight in self.entries.items() if start <= day <= end}
+
+    def record(self, origin, destination, flights):
+        self.recorded.extend(flights)
+
+
+def test_days_in_price_calendar_table_skip_the_provider():
+    center = date.today() + timedelta(days=30)
+    known = FakeRangeAPI({center + timedelta(days=d): 9000 for d in range(-2, 3)})
+    stored = known.search_date_range('MAD', 'BCN', center - timedelta(days=2), center + timedelta(days=2))['flights']
+    store = FakeStore({date.fromisoformat(f.departure_time[:10]): f for f in stored})
+
+    api = FakeRangeAPI({center + timedelta(days=3): 6000})
+    result = FlexDateSearch(api, store=store).alternatives('MAD', 'BCN', center, days=3)
+    # Solo se piden los días que faltan: dos rangos de un día (-3 y +3)
+    assert sorted(api.calls) == [(center - timedelta(days=3),) * 2, (center + timedelta(days=3),) * 2]
+    assert result['alternatives'][0]['days_from_target'] == 3
+    assert [f.price_cents for f in store.recorded] == [6000]
+
+
+def test_empty_days_of_a_truncated_response_are_not_cached():
+    center = date.today() + timedelta(days=30)
+    api = FakeRangeAPI({center: 9000})
+    api.search_date_range = lambda *args, search=api.search_date_range: {**search(*args), 'truncated': True}
+    search = FlexDateSearch(api)
+
+    search.price_calendar('MAD', 'BCN', center, days=1)
+    again = search.price_calendar('MAD', 'BCN', center, days=1)
+    # El día con vuelo sale de la caché; los vacíos (quizá fuera del límite) se vuelven a pedir
+    assert api.calls[1] == (center - timedelta(days=1), center - timedelta(days=1))
+    assert api.calls[2] == (center + timedelta(days=1), center + timedelta(days=1))
+    assert again['upstream_calls'] == 2 and again['days'][center].price_cents == 9000
@@ -0,0 +1,34 @@
+from backend.flight_record import FlightRecord
+
+
+def make_flight(**overrides):
+    fields = dict(
+        id='kiwi_round_1', price_cents=5350, origin='MAD', destination='BCN',
+        departure_time='2025-09-15T08:10:00', arrival_time='2025-09-15T09:40:00',
+        airline='Vueling', stops=0, booking_link='https://kiwi.com/es/booking?token=abc',
+        duration_seconds=5400, flight_number='VY1001',
+    )
+    fields.update(overrides)
+    return FlightRecord(**fields)
+
+
+def test_storage_round_trip_keeps_notification_fields():
+    flight = FlightRecord.from_storage(make_flight().to_storage())
+    assert flight.price_euros == 53.5
+    assert flight.airline == 'Vueling'
+    assert flight.flight_duration == 'PT1H30M'
+    assert flight.booking_link.endswith('token=abc')
+
+
+def test_from_storage_reads_legacy_snapshot_dicts():
+    legacy = make_flight().to_dict(found_at='2025-09-01T10:00:00')
+    flight = FlightRecord.from_storage(legacy)
+    assert flight.price_cents == 5350
+    assert flight.duration_seconds == 5400
+    assert flight.origin_city is None
+
+
+def test_codes_are_interned():
+    a = make_flight(airline=''.join(['Vue', 'ling']))
+    b = make_flight(airline=''.join(['Vuel', 'ing']))
+    assert a.airline is b.airline
@@ -0,0 +1,34 @@
+import gzip
+import json
+
+from backend import flight_traffic
+from backend.flight_traffic import RecordedResponse, RecordingTransport, ReplayTransport
+from backend.flights_api import FlightSearchAPI
+from benchmarks.kiwi_payloads import generate_payload
+
+
+def test_recorded_searches_replay_without_network(tmp_path, monkeypatch):
+    path = str(tmp_path / "kiwi.jsonl.gz")
+    calls = []
+
+    def fake_get(url, headers, params, timeout):
+        calls.append(params)
+        return RecordedResponse(200, json.dumps(generate_payload(5, seed=len(calls)), indent=2))
+
+    monkeypatch.setenv('RAPIDAPI_KEY', 'secreta')
+    monkeypatch.setattr(flight_traffic.requests, 'get', fake_get)
+    recorder = RecordingTransport(path)
+    recorded = FlightSearchAPI(transport=recorder).search_flights('MAD', 'BCN', '01/03/2027', limit=5)
+    recorder.close()
+    assert recorder.recorded == 1 and recorded['success']
+
+    # Sin API key ni red: misma respuesta para los mismos parámetros, 404 para el resto
+    monkeypatch.delenv('RAPIDAPI_KEY')
+    monkeypatch.setattr(flight_traffic.requests, 'get', None)
+    replay = ReplayTransport(path, latency_scale=0)
+    api = FlightSearchAPI(transport=replay)
+    replayed = api.search_flights('MAD', 'BCN', '01/03/2027', limit=5)
+    assert [f.to_storage() for f in replayed['flights']] == [f.to_storage() for f in recorded['flights']]
+    assert not api.search_flights('MAD', 'LIS', '01/03/2027', limit=5)['success']
+    assert replay.stats == {'hits': 1, 'misses': 1}
+    assert 'secreta' not in gzip.open(path, 'rt').read()
@@ -0,0 +1,23 @@
+from backend.flights_api import FlightSearchAPI, MAX_ITINERARIES
+from benchmarks.kiwi_payloads import generate_payload
+from benchmarks.legacy_kiwi_parser import legacy_process_kiwi_results
+
+
+def test_kiwi_parser_matches_original_parser():
+    data = generate_payload(30)
+    flights = FlightSearchAPI()._process_kiwi_results(data, 'MAD', 'BCN')
+    legacy = legacy_process_kiwi_results(data, 'MAD', 'BCN')
+
+    strip = lambda items: [{k: v for k, v in f.items() if k != 'found_at'} for f in items]
+    assert strip(f.to_dict() for f in flights) == strip(legacy)
+    assert len(flights) == MAX_ITINERARIES
+    assert [f.price_cents for f in flights] == sorted(f.price_cents for f in flights)
+
+
+def test_kiwi_parser_skips_itineraries_without_segments():
+    data = generate_payload(3)
+    data['itineraries'][0]['outbound']['sectorSegments'] = []
+    data['itineraries'][1]['outbound'] = None
+
+    flights = FlightSearchAPI()._process_kiwi_results(data, 'MAD', 'BCN')
+    assert len(flights) == 1
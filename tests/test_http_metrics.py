@@ -0,0 +1,54 @@
+import time
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import http_metrics, request_timing
+
+
+def test_records_latency_and_phases_by_route_template():
+    app = FastAPI(default_response_class=http_metrics.TimedJSONResponse)
+    app.add_middleware(http_metrics.RequestMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with request_timing.track('db'):
+            time.sleep(0.01)
+        return {"id": item_id}
+
+    with TestClient(app) as client:
+        assert client.get("/items/1").status_code == 200
+        assert client.get("/items/2").status_code == 200
+
+    text = http_metrics.registry.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'http_request_phase_seconds_count{route="/items/{item_id}",phase="db"} 2' in text
+    assert 'http_request_phase_seconds_count{route="/items/{item_id}",phase="serialize"} 2' in text
+    # Fuera de una petición no se acumula nada
+    with request_timing.track('db'):
+        assert request_timing.current() is None
+
+
+def test_slow_request_profile_is_dumped_as_folded_stacks(tmp_path):
+    profiler = http_metrics.SlowRequestProfiler(0.02, 0.002, str(tmp_path), max_dumps=1)
+
+    def slow_handler():
+        time.sleep(0.05)
+
+    def request():
+        timings = request_timing.RequestTimings()
+        timings.threads.add(threading.get_ident())
+        profile = profiler.begin(timings)
+        started = time.perf_counter()
+        slow_handler()
+        return profiler.finish(profile, "GET", "/slow/{id}", time.perf_counter() - started)
+
+    first = request()
+    second = request()
+    lines = open(second).read().splitlines()
+    assert second.endswith(".folded") and "-GET-slow_id-" in second
+    assert any(line.split(' ')[0].endswith("test_http_metrics:slow_handler") for line in lines)
+    # Solo se conservan max_dumps perfiles
+    assert list(tmp_path.iterdir()) == [tmp_path / second.split('/')[-1]]
+    assert first != second
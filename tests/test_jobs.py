@@ -0,0 +1,33 @@
+import time
+
+from backend.jobs import JobQueue
+
+
+def wait_for(queue, job_id, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("el trabajo no terminó a tiempo")
+
+
+def test_job_queue_returns_result():
+    queue = JobQueue(max_workers=1)
+    job_id = queue.submit("suma", lambda a, b: a + b, 2, 3)
+    job = wait_for(queue, job_id)
+    assert job["status"] == "done"
+    assert job["result"] == 5
+
+
+def test_job_queue_records_errors():
+    queue = JobQueue(max_workers=1)
+
+    def boom():
+        raise ValueError("Alerta no encontrada o inactiva")
+
+    job = wait_for(queue, queue.submit("boom", boom))
+    assert job["status"] == "failed"
+    assert "Alerta no encontrada" in job["error"]
+    assert queue.get("no-existe") is None
@@ -0,0 +1,61 @@
+from backend.flights_api import FlightSearchAPI
+from backend.locations import get_location_index
+
+
+def codes(query, limit=5):
+    return [loc.code for loc in get_location_index().search(query, limit)]
+
+
+def test_iata_code_matches_first():
+    assert codes('mad')[0] == 'MAD'
+    assert codes('SVQ')[0] == 'SVQ'
+
+
+def test_accents_and_spanish_aliases():
+    assert codes('Zúrich')[0] == 'ZRH'
+    assert codes('londres')[0] == 'LON'
+    assert 'NYC' in codes('nueva york')
+
+
+def test_typo_tolerant_search():
+    assert codes('londn')[0] == 'LON'
+    assert codes('frankfrut')[0] == 'FRA'
+
+
+def test_kiwi_ids_for_any_airport():
+    api = FlightSearchAPI()
+    assert api._format_location_for_kiwi('MAD') == 'City:madrid_es'
+    assert api._format_location_for_kiwi('svq') == 'City:sevilla_es'
+    assert api._format_location_for_kiwi('QQQ') == 'City:qqq'
+    # Aeropuerto sin ciudad en locations.csv
+    assert get_location_index().get('AAA').city == ''
+    assert api._format_location_for_kiwi('AAA') == 'City:aaa'
+
+
+def test_mapped_index_matches_in_memory_index(tmp_path):
+    from backend.locations import LocationIndex, MappedLocationIndex, load_aliases, load_locations, write_index_file
+
+    memory = LocationIndex(load_locations(), load_aliases())
+    path = str(tmp_path / 'locations.idx')
+    write_index_file(memory, path, b'test')
+    mapped = MappedLocationIndex(path)
+
+    assert len(mapped) == len(memory)
+    assert mapped.get('bcn') == memory.get('BCN')
+    assert mapped.get('QQQ') is None
+    for query in ('mad', 'londres', 'Zúrich', 'londn', 'frankfrut', 'ma'):
+        assert mapped.search(query, 5) == memory.search(query, 5)
+
+
+def test_stale_mapped_index_falls_back_to_csv(tmp_path, monkeypatch):
+    from backend import locations
+
+    path = str(tmp_path / 'locations.idx')
+    # Compilado con otros CSV (solo diez ubicaciones y sin alias)
+    locations.write_index_file(locations.LocationIndex(locations.load_locations()[:10]), path, b'csv antiguos')
+    monkeypatch.setattr(locations, 'LOCATIONS_IDX', path)
+    monkeypatch.setattr(locations, '_index', None)
+
+    index = locations.get_location_index()
+    assert isinstance(index, locations.LocationIndex)
+    assert codes('londres')[0] == 'LON'
@@ -0,0 +1,33 @@
+import urllib.request
+
+from backend import metrics
+
+
+def test_histogram_buckets_are_cumulative_and_labels_escaped():
+    registry = metrics.Registry()
+    latency = registry.histogram('op_seconds', 'Latencia', ['phase'], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        latency.labels('db "write"').observe(value)
+    registry.counter('errors_total', 'Errores', ['provider']).labels(provider='kiwi').inc(2)
+    registry.callback('queue_depth', 'Cola', lambda: {'pending': 3}, labelnames=['status'])
+
+    text = registry.render()
+    assert '# TYPE op_seconds histogram' in text
+    assert 'op_seconds_bucket{phase="db \\"write\\"",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{phase="db \\"write\\"",le="1"} 2' in text
+    assert 'op_seconds_bucket{phase="db \\"write\\"",le="+Inf"} 3' in text
+    assert 'op_seconds_count{phase="db \\"write\\""} 3' in text
+    assert 'errors_total{provider="kiwi"} 2' in text
+    assert 'queue_depth{status="pending"} 3' in text
+
+
+def test_serves_metrics_over_http():
+    registry = metrics.Registry()
+    registry.gauge('alerts_due', 'Alertas').set(7)
+    server = metrics.serve(registry, 0, host='127.0.0.1')
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert 'alerts_due 7' in response.read().decode()
+    finally:
+        server.shutdown()
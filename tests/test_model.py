@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+
+from benchmarks.price_history import generate_snapshots
+from ia import model
+from ia.model import GLOBAL_ROUTE, NotEnoughDataError, PricePredictor, build_training_set
+
+
+def test_labels_look_only_at_later_observations():
+    snapshots = pd.DataFrame({
+        'route': pd.Categorical(['MAD-BCN'] * 3),
+        'departure': pd.to_datetime(['2025-03-01'] * 3),
+        'found_at': pd.to_datetime(['2025-01-01', '2025-01-10', '2025-01-20']),
+        'price': np.array([100, 90, 95], dtype=np.float32),
+    })
+    rows, X, y, _ = build_training_set(snapshots)
+    # La última observación no tiene futuro: no se usa para entrenar
+    assert len(rows) == 2
+    assert y.tolist() == [True, False]
+    assert X[1, 3] == pytest.approx(1.0)  # 90 es el mínimo visto hasta ese momento
+
+
+def test_fit_without_later_observations_raises_typed_error():
+    # Un solo snapshot por ruta (despliegue recién hecho): nada que etiquetar
+    snapshots = pd.DataFrame({
+        'route': pd.Categorical(['MAD-BCN', 'MAD-LIS']),
+        'departure': pd.to_datetime(['2025-03-01', '2025-03-02']),
+        'found_at': pd.to_datetime(['2025-01-01', '2025-01-01']),
+        'price': np.array([100, 90], dtype=np.float32),
+    })
+    with pytest.raises(NotEnoughDataError):
+        PricePredictor().fit(snapshots, workers=1)
+
+
+def test_fit_score_and_reload(tmp_path):
+    snapshots = generate_snapshots(20000, routes=5)
+    predictor = PricePredictor().fit(snapshots, workers=1)
+    assert GLOBAL_ROUTE in predictor.models and len(predictor.models) == 6
+
+    alerts = pd.DataFrame({
+        'alert_id': [1, 2, 3],
+        'route': ['R000-X000', 'R001-X001', 'NEW-ROUTE'],
+        'departure': pd.Timestamp.now().normalize() + pd.to_timedelta([60, 2, 30], unit='D'),
+        'price': np.array([50000, 30000, 20000], dtype=np.float32),
+        'min_seen': np.array([40000, 30000, 20000], dtype=np.float32),
+    })
+    scores = predictor.score_alerts(alerts)
+    assert scores['alert_id'].tolist() == [1, 2, 3]
+    assert ((scores['drop_probability'] >= 0) & (scores['drop_probability'] <= 1)).all()
+
+    predictor.save(str(tmp_path))
+    reloaded = PricePredictor.load(str(tmp_path))
+    assert np.allclose(reloaded.predict_drop_probability(alerts), predictor.predict_drop_probability(alerts))
+
+
+def test_stacked_weights_match_sklearn_predict_proba():
+    snapshots = generate_snapshots(20000, routes=3)
+    predictor = PricePredictor().fit(snapshots, workers=1)
+    rows, X, _, _ = build_training_set(snapshots)
+
+    index, weights, bias = predictor._stacked_weights()
+    model = predictor.models['R000-X000']
+    row = index['R000-X000']
+    manual = 1 / (1 + np.exp(-(X[:100].astype(np.float64) @ weights[row] + bias[row])))
+    assert np.allclose(manual, model.predict_proba(X[:100])[:, 1], atol=1e-5)
+
+
+def test_load_predictor_serves_saved_model_without_training(tmp_path, monkeypatch):
+    monkeypatch.setattr(model, '_predictor', None)
+    monkeypatch.setattr(model, '_predictor_mtime', None)
+    assert model.load_predictor(str(tmp_path)) is None
+
+    trained = PricePredictor().fit(generate_snapshots(5000, routes=2), workers=1)
+    trained.save(str(tmp_path))
+    served = model.load_predictor(str(tmp_path))
+    assert served is not None and served.samples == trained.samples
+    # Mientras el fichero no cambie se sirve el mismo objeto de memoria
+    assert model.load_predictor(str(tmp_path)) is served
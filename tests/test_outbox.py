@@ -0,0 +1,63 @@
+from backend import outbox
+from backend.outbox import OutboxEntry, OutboxRelay
+
+
+class RecordingConnection:
+    """Conexión falsa: apunta las sentencias confirmadas; con fail_commit el commit falla"""
+
+    def __init__(self, log, fail_commit=False):
+        self.log = log
+        self.fail_commit = fail_commit
+        self.statements = []
+        self.rowcount = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+
+    def fetchall(self):
+        return []
+
+    def commit(self):
+        if self.fail_commit:
+            raise RuntimeError('BD caída')
+        self.log.extend(self.statements)
+
+    def close(self):
+        pass
+
+
+class QueueOnly:
+    def pending(self):
+        return 0
+
+
+def test_relay_survives_missing_connection_and_retries_unsaved_result(monkeypatch):
+    committed = []
+    connections = [None]
+    relay = OutboxRelay(lambda: connections.pop(0) if connections else RecordingConnection(committed), QueueOnly())
+    # Sin BD: el ciclo se salta sin excepciones
+    assert relay.drain() == 0
+
+    entry = OutboxEntry(1, 'target_hit:7:4000:2026-10-19', 7, None, 100, 'target_hit', 4000, 'hola', 1)
+    relay._claimed[entry.idempotency_key] = entry
+    connections[:] = [None]
+    monkeypatch.setattr(outbox, 'OUTBOX_LEASE_SECONDS', 0)
+    assert relay.renew_leases() == 0
+
+    # Telegram aceptó el mensaje pero no se pudo guardar: la fila sigue reclamada
+    connections[:] = [RecordingConnection(committed, fail_commit=True)]
+    relay._finish(entry, None, False)
+    assert entry.idempotency_key in relay._claimed and committed == []
+
+    relay.retry_unfinished()
+    assert entry.idempotency_key not in relay._claimed and not relay._unfinished
+    assert any("status = 'sent'" in statement for statement in committed)
@@ -0,0 +1,81 @@
+import os
+from datetime import date, datetime, timedelta
+
+import psycopg2
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import db, main
+from backend.flight_record import FlightRecord
+from backend.price_calendar import read_range, record_flights
+
+
+class RecordingConnection:
+    """Conexión falsa: apunta las consultas y no devuelve filas"""
+
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def test_calendar_endpoint_reads_prices_of_any_age(monkeypatch):
+    conn = RecordingConnection()
+    monkeypatch.setattr(main.price_calendar_store, 'get_connection', lambda: conn)
+
+    response = TestClient(main.app).get(
+        "/flights/calendar", params={"origin": "MAD", "destination": "BCN",
+                                     "date_from": "01/12/2026", "date_to": "07/12/2026"})
+
+    assert response.status_code == 200
+    [(query, params)] = conn.queries
+    assert "updated_at >=" not in query
+    assert len(params) == 4
+
+
+def test_newer_observation_wins_the_upsert():
+    try:
+        conn = psycopg2.connect(host=db.DB_HOST, port=db.DB_PORT, dbname=db.DB_NAME, user=db.DB_USER,
+                                password=db.DB_PASSWORD, connect_timeout=2)
+    except psycopg2.OperationalError:
+        pytest.skip("Sin PostgreSQL para probar el upsert")
+
+    def flight(price_cents):
+        return FlightRecord(id='f', price_cents=price_cents, origin='MAD', destination='BCN',
+                            departure_time='2026-12-01T08:00:00', arrival_time=None, airline='IB', stops=0,
+                            booking_link='https://kiwi.com', duration_seconds=4500, flight_number='IB1')
+
+    migration = os.path.join(os.path.dirname(__file__), '..', 'db', 'migrations', '002_price_calendar.sql')
+    seen = datetime(2026, 10, 1, 12)
+    try:
+        with conn.cursor() as cur:
+            # Tabla temporal con la misma definición: tapa a la real y desaparece con la conexión
+            cur.execute(open(migration).read().replace('CREATE TABLE IF NOT EXISTS', 'CREATE TEMP TABLE'))
+            record_flights(cur, 'MAD', 'BCN', [flight(9000)], observed_at=seen)
+            # Una observación más antigua no pisa la nueva...
+            record_flights(cur, 'mad', 'bcn', [flight(5000)], observed_at=seen - timedelta(hours=1))
+            assert read_range(cur, 'MAD', 'BCN', date(2026, 12, 1), date(2026, 12, 1), None)[
+                date(2026, 12, 1)].flight.price_cents == 9000
+            # ...y una más reciente sí, aunque sea más cara
+            record_flights(cur, 'MAD', 'BCN', [flight(9500)], observed_at=seen + timedelta(hours=1))
+            entry = read_range(cur, 'MAD', 'BCN', date(2026, 12, 1), date(2026, 12, 1), None)[date(2026, 12, 1)]
+            assert (entry.flight.price_cents, entry.updated_at) == (9500, seen + timedelta(hours=1))
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,110 @@
+import json
+from datetime import datetime, timedelta
+
+from backend.price_stats import (
+    ROUTE_TABLE, STATS_COLUMNS, WINDOW_DAYS, PriceStats, SKETCH_RELATIVE_ACCURACY, get_route_stats, update_stats,
+)
+
+
+def test_running_extremes_ewma_and_trend():
+    stats = PriceStats()
+    start = datetime(2026, 3, 1, 9)
+    for i, price in enumerate([20000, 18000, 22000, 15000]):
+        stats.update(price, start + timedelta(hours=i))
+
+    assert stats.observations == 4
+    assert (stats.min_cents, stats.max_cents, stats.last_cents) == (15000, 22000, 15000)
+    assert stats.min_at == start + timedelta(hours=3)
+    assert 15000 < stats.ewma < 20000
+    assert stats.volatility > 0
+    assert stats.trend == 'bajando'
+
+
+def test_daily_minimum_window_slides():
+    stats = PriceStats()
+    first = datetime(2026, 1, 1, 12)
+    stats.update(5000, first)
+    stats.update(9000, first + timedelta(days=10))
+    today = (first + timedelta(days=10)).date()
+    assert stats.min_last_days(today=today) == 5000
+    assert stats.min_last_days(days=5, today=today) == 9000
+
+    # Al pasar WINDOW_DAYS el mínimo del primer día sale de la ventana
+    later = first + timedelta(days=WINDOW_DAYS + 5)
+    stats.update(12000, later)
+    assert len(stats.daily_min) <= WINDOW_DAYS
+    assert stats.min_last_days(today=later.date()) == 9000
+    assert stats.min_cents == 5000
+
+
+def test_percentiles_and_row_round_trip():
+    stats = PriceStats()
+    start = datetime(2026, 5, 1)
+    prices = list(range(10000, 30001, 100))
+    for i, price in enumerate(prices):
+        stats.update(price, start + timedelta(minutes=i))
+
+    median = prices[len(prices) // 2]
+    assert abs(stats.percentile(0.5) - median) <= median * 2 * SKETCH_RELATIVE_ACCURACY
+
+    # El sketch viaja como JSON (claves str) y el resto tal cual
+    row = stats.to_row()
+    restored = PriceStats.from_row(tuple(json.loads(v) if i == len(row) - 1 else v for i, v in enumerate(row)))
+    assert restored.to_public() == stats.to_public()
+
+
+def test_deal_needs_history_and_an_anomalous_drop():
+    stats = PriceStats()
+    start = datetime(2026, 6, 1)
+    prices = [20000, 20400, 19800, 20100, 19900, 20300, 20000, 19700, 20200, 20000, 20100, 19900]
+    assert stats.detect_deal(9000) is None  # sin historial no hay referencia
+    for i, price in enumerate(prices):
+        stats.update(price, start + timedelta(hours=i))
+
+    assert stats.detect_deal(19500) is None
+    deal = stats.detect_deal(12000)
+    assert deal is not None
+    assert deal.zscore < 0 and deal.drop_pct > 35
+    assert abs(deal.baseline_cents - 20000) < 300
+
+
+class FakeStatsCursor:
+    """Tablas de estadísticas en memoria; entiende solo las sentencias de price_stats"""
+
+    def __init__(self):
+        self.tables = {}
+        self.result = None
+
+    def execute(self, query, params):
+        rows = self.tables.setdefault(ROUTE_TABLE if ROUTE_TABLE in query else 'alert', {})
+        if query.startswith('INSERT'):
+            rows.setdefault(tuple(params), {'stats': PriceStats().to_row(), 'recent': []})
+        elif query.startswith('SELECT recent_observations'):
+            self.result = (rows[tuple(params)]['recent'],)
+        elif query.startswith('SELECT'):
+            row = rows.get(tuple(params))
+            # Como psycopg2 con JSONB: el sketch llega como dict
+            self.result = row['stats'][:-1] + (json.loads(row['stats'][-1]),) if row else None
+        elif 'SET recent_observations' in query:
+            rows[tuple(params[1:])]['recent'] = json.loads(params[0])
+        else:
+            rows[tuple(params[len(STATS_COLUMNS):])]['stats'] = tuple(params[:len(STATS_COLUMNS)])
+
+    def fetchone(self):
+        return self.result
+
+
+def test_alerts_on_one_route_share_the_deal_and_count_it_once():
+    cur = FakeStatsCursor()
+    start = datetime(2026, 6, 1)
+    for i, price in enumerate([10000, 10300, 9700, 10100, 9900, 10200, 10000, 9800, 10300, 9700, 10100, 9900]):
+        update_stats(cur, 100 + i, 'MAD', 'BCN', price, start + timedelta(hours=i))
+    before = get_route_stats(cur, 'MAD', 'BCN').observations
+
+    # Mismo vuelo (misma observación del ciclo) para dos alertas de la ruta
+    observed_at = start + timedelta(days=1)
+    first = update_stats(cur, 1, 'MAD', 'BCN', 7000, observed_at, observation='ciclo1:VY1:2026-07-01:7000')
+    second = update_stats(cur, 2, 'mad', 'bcn', 7000, observed_at, observation='ciclo1:VY1:2026-07-01:7000')
+
+    assert first is not None and second == first
+    assert get_route_stats(cur, 'MAD', 'BCN').observations == before + 1
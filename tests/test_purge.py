@@ -0,0 +1,85 @@
+from fastapi.testclient import TestClient
+
+from backend import db, main, purge
+
+
+class FakeConnection:
+    """
+    Conexión falsa con el histórico de una alerta (filas por tabla). Apunta cada
+    commit como (tabla de la última sentencia, filas afectadas).
+    """
+
+    def __init__(self, history=None, deleted_ids=()):
+        self.history = dict(history or {})
+        self.deleted_ids = list(deleted_ids)
+        self.commits = []
+        self.rowcount = 0
+        self.result = []
+        self.table = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=()):
+        words = query.split()
+        self.table = words[2] if words[0] == 'DELETE' else words[1]
+        if words[0] == 'DELETE' and self.table in self.history:
+            self.rowcount = min(self.history[self.table], params[1])
+            self.history[self.table] -= self.rowcount
+        elif words[0] == 'DELETE':
+            self.rowcount = 1
+        elif words[0] == 'SELECT':
+            self.result = [(alert_id,) for alert_id in self.deleted_ids]
+        elif words[0] == 'UPDATE':
+            self.rowcount, self.result = 1, [(params[0],)]
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def commit(self):
+        self.commits.append((self.table, self.rowcount))
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_history_is_deleted_in_chunks_with_a_commit_each(monkeypatch):
+    conn = FakeConnection({'notifications_sent': 2, 'search_snapshots': 5})
+    monkeypatch.setattr(db, 'get_connection', lambda: conn)
+    monkeypatch.setattr(purge, 'PURGE_PAUSE_SECONDS', 0)
+
+    assert purge.purge_alert_history(7, chunk_size=2) == 7
+    assert conn.commits == [
+        ('notifications_sent', 2), ('notifications_sent', 0),
+        ('search_snapshots', 2), ('search_snapshots', 2), ('search_snapshots', 1),
+        # Por último la propia alerta (solo si sigue marcada como eliminada)
+        ('alerts', 1),
+    ]
+
+
+def test_delete_endpoint_soft_deletes_and_purges_in_background(monkeypatch):
+    conn = FakeConnection()
+    purged = []
+    monkeypatch.setattr(db, 'get_connection', lambda: conn)
+    monkeypatch.setattr(purge, 'purge_alert_history', purged.append)
+
+    response = TestClient(main.app).delete("/alerts/7")
+
+    assert response.status_code == 200
+    assert conn.commits == [('alerts', 1)]   # UPDATE ... SET deleted_at
+    assert purged == [7]
+
+
+def test_pending_purges_are_resumed_in_deletion_order(monkeypatch):
+    monkeypatch.setattr(db, 'get_connection', lambda: FakeConnection(deleted_ids=[3, 5]))
+    purged = []
+    monkeypatch.setattr(purge, 'purge_alert_history', purged.append)
+
+    assert purge.purge_pending_deletions() == [3, 5]
+    assert purged == [3, 5]
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import threading
+
+from backend.telegram_dispatcher import COALESCE_SEPARATOR, SendResult, TelegramDispatcher
+
+
+class FakeTelegram:
+    """
+    Registra cada envío (chat, texto, instante). Con rate_limit_first devuelve un 429
+    al primer envío; los envíos esperan a que release esté activado.
+    """
+
+    def __init__(self, rate_limit_first=None):
+        self.sent = []
+        self.rate_limit_first = rate_limit_first
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.release.set()
+        self.started = 0
+
+    async def send(self, chat_id, text, parse_mode):
+        started_at = time.monotonic()
+        self.started += 1
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        with self.lock:
+            if self.rate_limit_first is not None:
+                retry_after, self.rate_limit_first = self.rate_limit_first, None
+                return SendResult(False, retry_after=retry_after)
+            self.sent.append((chat_id, text, started_at))
+        return SendResult(True)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_coalesces_per_chat_and_spaces_sends():
+    telegram = FakeTelegram()
+    dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=10, send=telegram.send)
+    dispatcher.start()
+    delivered = []
+    try:
+        # Mientras el primero está en vuelo su clave sigue ocupada
+        telegram.release.clear()
+        assert dispatcher.submit(1, 'primero', key='a1', on_sent=lambda: delivered.append('a1'))
+        assert not dispatcher.submit(1, 'duplicado', key='a1')
+        assert wait_for(lambda: telegram.started == 1)
+        # Los que llegan mientras tanto salen juntos en un solo mensaje
+        for i in range(3):
+            dispatcher.submit(1, f'm{i}', key=f'b{i}')
+        dispatcher.submit(2, 'otro chat')
+        telegram.release.set()
+        assert wait_for(lambda: len(telegram.sent) == 3)
+    finally:
+        dispatcher.stop()
+
+    chat_1 = [entry for entry in telegram.sent if entry[0] == 1]
+    assert chat_1[1][1] == COALESCE_SEPARATOR.join(['m0', 'm1', 'm2'])
+    assert chat_1[1][2] - chat_1[0][2] >= 0.09
+    assert delivered == ['a1']
+    assert dispatcher.stats['messages_sent'] == 5
+
+
+def test_respects_retry_after():
+    telegram = FakeTelegram(rate_limit_first=0.3)
+    dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=100, send=telegram.send)
+    dispatcher.start()
+    start = time.monotonic()
+    try:
+        dispatcher.submit(7, 'hola')
+        assert wait_for(lambda: telegram.sent)
+    finally:
+        dispatcher.stop()
+    assert telegram.sent[0][2] - start >= 0.3
+    assert dispatcher.stats['rate_limited'] == 1
+
+
+def test_permanent_error_reports_failure_without_retrying():
+    calls = []
+
+    async def blocked(chat_id, text, parse_mode):
+        calls.append(chat_id)
+        return SendResult(False, description='Forbidden: bot was blocked by the user')
+
+    failures = []
+    dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=100, send=blocked)
+    dispatcher.start()
+    try:
+        dispatcher.submit(3, 'hola', key='k', on_failed=lambda error, retryable: failures.append((error, retryable)))
+        assert wait_for(lambda: failures)
+    finally:
+        dispatcher.stop()
+    assert calls == [3]
+    assert failures == [('Forbidden: bot was blocked by the user', False)]
+
+
+def test_bounded_stop_cancels_in_flight_and_returns_unsent():
+    telegram = FakeTelegram()
+    telegram.release.clear()
+    dispatcher = TelegramDispatcher(global_rate=1000, chat_rate=1, send=telegram.send)
+    dispatcher.start()
+    delivered = []
+    dispatcher.submit(1, 'en vuelo', key='a', on_sent=lambda: delivered.append('a'))
+    assert wait_for(lambda: telegram.started == 1)
+    # El segundo del mismo chat espera su turno (1 mensaje/s por chat)
+    dispatcher.submit(1, 'en cola', key='b')
+    dispatcher.submit(2, 'otro chat', key='c')
+    assert wait_for(lambda: telegram.started == 2)
+
+    started = time.monotonic()
+    unsent = dispatcher.stop(timeout=0.2)
+    assert time.monotonic() - started < 2
+    # Los que estaban en vuelo (a, c) se cancelan y vuelven con el que esperaba en la cola (b)
+    assert sorted(message.key for message in unsent[:2]) == ['a', 'c']
+    assert [message.key for message in unsent[2:]] == ['b']
+    assert delivered == [] and telegram.sent == []
+    assert not dispatcher.submit(3, 'tarde')
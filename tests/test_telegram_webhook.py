@@ -0,0 +1,95 @@
+import json
+import asyncio
+
+import httpx
+from telegram.ext import Application, MessageHandler, filters
+from telegram.request import BaseRequest
+
+from backend.telegram_webhook import SECRET_HEADER, WEBHOOK_PATH, TelegramWebhook
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "test_bot"}
+
+
+class FakeBotRequest(BaseRequest):
+    """Bot API sin red: getMe y poco más"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        result = BOT_USER if url.endswith('/getMe') else True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def message_update(update_id, chat_id, text):
+    chat = {"id": chat_id, "type": "private"}
+    user = {"id": chat_id, "is_bot": False, "first_name": "Ana"}
+    return {"update_id": update_id,
+            "message": {"message_id": update_id, "date": 0, "chat": chat, "from": user, "text": text}}
+
+
+def run_webhook(handler, updates, secret='s3cret'):
+    """Publica los updates en el webhook y espera a que terminen; devuelve los códigos HTTP"""
+    application = (
+        Application.builder().token("1:TEST").request(FakeBotRequest())
+        .get_updates_request(FakeBotRequest()).concurrent_updates(8).build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, handler))
+    webhook = TelegramWebhook(application, secret_token='s3cret', webhook_url='')
+
+    async def scenario():
+        await webhook.start()
+        transport = httpx.ASGITransport(app=webhook.asgi_app(lifespan=False))
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+                statuses = [
+                    (await client.post(WEBHOOK_PATH, json=update, headers={SECRET_HEADER: secret})).status_code
+                    for update in updates
+                ]
+            while webhook.pending:
+                await asyncio.sleep(0.01)
+        finally:
+            await webhook.stop()
+        return statuses
+
+    return asyncio.run(scenario())
+
+
+def test_rejects_wrong_secret():
+    seen = []
+
+    async def handler(update, context):
+        seen.append(update.message.text)
+
+    assert run_webhook(handler, [message_update(1, 10, "hola")], secret='otro') == [403]
+    assert seen == []
+
+
+def test_orders_per_chat_and_runs_chats_in_parallel():
+    events = []
+
+    async def handler(update, context):
+        events.append(('start', update.message.text))
+        await asyncio.sleep(0.05)
+        events.append(('end', update.message.text))
+
+    updates = [
+        message_update(1, 10, "a1"),
+        message_update(2, 10, "a2"),
+        message_update(3, 20, "b1"),
+        message_update(2, 10, "a2"),   # reentrega de Telegram: se ignora
+    ]
+    assert run_webhook(handler, updates) == [200, 200, 200, 200]
+
+    texts = [text for kind, text in events if kind == 'start']
+    assert sorted(texts) == ["a1", "a2", "b1"]
+    # a2 no empieza hasta que termina a1; b1 (otro chat) no espera a a1
+    assert events.index(('end', 'a1')) < events.index(('start', 'a2'))
+    assert events.index(('start', 'b1')) < events.index(('end', 'a1'))
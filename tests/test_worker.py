@@ -0,0 +1,61 @@
+import os
+from datetime import date
+
+os.environ['WORKER_METRICS_PORT'] = '0'
+os.environ.pop('TELEGRAM_BOT_TOKEN', None)
+
+from backend.flight_record import FlightRecord
+from worker.worker import FlightAlertWorker
+
+
+def make_flight(price_cents):
+    return FlightRecord(
+        id='f1', price_cents=price_cents, origin='MAD', destination='BCN',
+        departure_time='2026-12-01T08:00:00', arrival_time='2026-12-01T09:15:00',
+        airline='IB', stops=0, booking_link='https://example.com', duration_seconds=4500,
+        flight_number='IB1234',
+    )
+
+
+class FakeFlightsAPI:
+    """La ruta 'ERR' falla en el proveedor; el resto devuelve un vuelo"""
+
+    def search_flights(self, origin, destination, date_from, return_from=None, limit=5):
+        if destination == 'ERR':
+            return {'success': False, 'error': 'timeout', 'flights': [], 'total_results': 0, 'api_used': 'kiwi'}
+        return {'success': True, 'flights': [make_flight(9000)], 'total_results': 1, 'api_used': 'kiwi'}
+
+
+def make_alert(alert_id, destination):
+    return {'id': alert_id, 'user_id': 1, 'telegram_id': 100, 'origin': 'MAD', 'destination': destination,
+            'date_from': date(2026, 12, 1), 'date_to': None, 'price_target_cents': 5000,
+            'max_stops': None, 'notify_deals': False}
+
+
+def test_only_successful_checks_update_last_checked_at():
+    worker = FlightAlertWorker(FakeFlightsAPI())
+    worker.alert_delay_seconds = 0
+    alerts = [make_alert(1, 'BCN'), make_alert(2, 'ERR'), make_alert(3, 'SNAP')]
+    worker.open_due_alerts = lambda: worker.scheduler.open(
+        {'standard': [(0.0, alert) for alert in alerts]}, {'standard': len(alerts)})
+    worker.cached_search_for_alert = lambda alert: None
+
+    def save_search_snapshot(alert, price_cents, flight_details, notification_for=None):
+        if alert['destination'] == 'SNAP':
+            raise RuntimeError('BD caída')
+        return None
+    worker.save_search_snapshot = save_search_snapshot
+    checkpoints = []
+
+    def save_checkpoint():
+        checkpoints.extend(alert_id for alert_id, _ in worker.unsaved_checks)
+        worker.unsaved_checks = []
+    worker.save_checkpoint = save_checkpoint
+
+    worker.run_check_cycle()
+
+    # Ni el fallo del proveedor (2) ni el del snapshot (3) cuentan como revisión
+    assert checkpoints == [1]
+    processed = worker.metrics.alerts_processed
+    assert processed.labels('search_failed').get() == 1
+    assert processed.labels('error').get() == 1
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# ============================================================================
+# RELLENO DE alert_price_stats / route_price_stats DESDE EL HISTÓRICO
+# ============================================================================
+# Recorre search_snapshots en orden cronológico (cursor de servidor, sin
+# cargarlo todo en memoria), reconstruye las estadísticas incrementales de
+# backend/price_stats.py y las escribe de una vez, sustituyendo las que haya.
+# Se ejecuta una vez después de la migración 003 (o para recalcular):
+#
+#   python tools/backfill_price_stats.py
+# ============================================================================
+
+import os
+import sys
+import time
+from typing import Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from psycopg2.extras import execute_values
+
+from backend import db
+from backend.price_stats import ALERT_TABLE, ROUTE_TABLE, STATS_COLUMNS, PriceStats
+
+FETCH_SIZE = 10000
+
+
+def _write(cur, table: str, key_columns: Tuple[str, ...], stats_by_key: Dict[Tuple, PriceStats]):
+    columns = key_columns + STATS_COLUMNS
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in STATS_COLUMNS)
+    execute_values(
+        cur,
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}, updated_at = NOW()",
+        [key + stats.to_row() for key, stats in stats_by_key.items()],
+        page_size=1000
+    )
+
+
+def main():
+    start = time.perf_counter()
+    alerts: Dict[Tuple, PriceStats] = {}
+    routes: Dict[Tuple, PriceStats] = {}
+
+    conn = db.get_connection()
+    try:
+        with conn.cursor(name='price_stats_backfill') as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute("""
+                SELECT s.alert_id, a.origin, a.destination, s.price_cents, s.found_at
+                FROM search_snapshots s
+                JOIN alerts a ON a.id = s.alert_id
+                WHERE s.price_cents IS NOT NULL
+                ORDER BY s.found_at
+            """)
+            snapshots = 0
+            for alert_id, origin, destination, price_cents, found_at in cur:
+                alerts.setdefault((alert_id,), PriceStats()).update(price_cents, found_at)
+                routes.setdefault((origin.upper(), destination.upper()), PriceStats()).update(price_cents, found_at)
+                snapshots += 1
+
+        with conn.cursor() as cur:
+            _write(cur, ALERT_TABLE, ('alert_id',), alerts)
+            _write(cur, ROUTE_TABLE, ('origin', 'destination'), routes)
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"✅ {snapshots} snapshots → {len(alerts)} alertas y {len(routes)} rutas "
+          f"({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
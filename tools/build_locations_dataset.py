@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# ============================================================================
+# GENERADOR DEL DATASET DE AEROPUERTOS Y CIUDADES (backend/data/locations.csv)
+# ============================================================================
+# Fuente: paquete `airportsdata` (aeropuertos con código IATA y códigos de
+# ciudad multi-aeropuerto como LON, NYC, PAR). Los nombres de país salen de
+# `pycountry`. Solo hacen falta para regenerar el CSV, no en producción:
+#
+#   pip install airportsdata pycountry
+#   python tools/build_locations_dataset.py
+#
+# Los alias en español (Londres, Nueva York...) se mantienen a mano en
+# backend/data/location_aliases.csv.
+# ============================================================================
+
+import os
+import csv
+import sys
+import argparse
+
+import airportsdata
+import pycountry
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), '..', 'backend', 'data', 'locations.csv')
+
+# Aeropuertos principales que siempre deben salir primero en las búsquedas
+HUB_CODES = {
+    'MAD', 'BCN', 'LHR', 'CDG', 'FCO', 'AMS', 'FRA', 'MUC', 'VIE', 'ZRH', 'JFK', 'LAX', 'ORD',
+    'MIA', 'DXB', 'SIN', 'NRT', 'HND', 'ICN', 'PEK', 'SYD', 'MEL', 'YYZ', 'YVR', 'GRU', 'GIG',
+    'BOG', 'LIM', 'SCL', 'EZE', 'MEX', 'LIS', 'DUB', 'IST', 'ATH', 'BRU', 'CPH', 'ARN', 'OSL',
+    'HEL', 'PRG', 'WAW', 'BUD', 'AGP', 'PMI', 'ALC', 'VLC', 'SVQ', 'BIO', 'LPA', 'TFS', 'IBZ',
+}
+
+FIELDS = ['code', 'kind', 'name', 'city', 'country_code', 'country', 'rank']
+
+
+def country_name(code: str) -> str:
+    country = pycountry.countries.get(alpha_2=code)
+    return getattr(country, 'common_name', None) or (country.name if country else code)
+
+
+def build_rows():
+    airports = airportsdata.load('IATA')
+    macs = airportsdata.load_iata_macs()
+
+    # Aeropuertos que pertenecen a un código de ciudad multi-aeropuerto
+    mac_airports = {code for mac in macs.values() for code in mac['airports']}
+
+    rows = []
+    for code, airport in airports.items():
+        rank = 0
+        if 'international' in airport['name'].lower():
+            rank = 1
+        if code in HUB_CODES or code in mac_airports:
+            rank = 2
+        rows.append({
+            'code': code,
+            'kind': 'airport',
+            'name': airport['name'],
+            'city': airport['city'],
+            'country_code': airport['country'],
+            'country': country_name(airport['country']),
+            'rank': rank,
+        })
+
+    for code, mac in macs.items():
+        # Algunos códigos de ciudad coinciden con el de su aeropuerto principal (DXB, BRU...)
+        if code in airports:
+            continue
+        rows.append({
+            'code': code,
+            'kind': 'city',
+            'name': f"{mac['name']} (todos los aeropuertos)",
+            'city': mac['name'],
+            'country_code': mac['country'],
+            'country': country_name(mac['country']),
+            'rank': 3,
+        })
+
+    rows.sort(key=lambda row: row['code'])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera backend/data/locations.csv")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    rows = build_rows()
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"✅ {len(rows)} ubicaciones escritas en {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# ============================================================================
+# COMPILADOR DEL ÍNDICE BINARIO DE UBICACIONES (backend/data/locations.idx)
+# ============================================================================
+# Construye el índice de backend/locations.py a partir de locations.csv y
+# location_aliases.csv y lo guarda en el formato binario que se abre con mmap
+# (MappedLocationIndex). Hay que volver a ejecutarlo cada vez que cambien los
+# CSV (por ejemplo, después de tools/build_locations_dataset.py); si el
+# fichero ya corresponde a los CSV actuales no hace nada (salvo con --force):
+#
+#   python tools/build_locations_index.py [--force]
+# ============================================================================
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.locations import (
+    ALIASES_CSV, LOCATIONS_CSV, LOCATIONS_IDX, LocationIndex, MappedLocationIndex,
+    load_aliases, load_locations, source_digest, write_index_file,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera backend/data/locations.idx")
+    parser.add_argument('--locations', default=LOCATIONS_CSV)
+    parser.add_argument('--aliases', default=ALIASES_CSV)
+    parser.add_argument('--output', default=LOCATIONS_IDX)
+    parser.add_argument('--force', action='store_true', help="Regenerar aunque esté al día")
+    args = parser.parse_args()
+
+    digest = source_digest((args.locations, args.aliases))
+    if not args.force and os.path.exists(args.output):
+        try:
+            if MappedLocationIndex(args.output).digest == digest:
+                print(f"✅ {os.path.normpath(args.output)} ya está al día", file=sys.stderr)
+                return
+        except ValueError:
+            pass
+
+    start = time.perf_counter()
+    index = LocationIndex(load_locations(args.locations), load_aliases(args.aliases))
+    size = write_index_file(index, args.output, digest)
+    print(f"✅ {len(index)} ubicaciones, {len(index._keys)} claves y {len(index._deletes)} variantes "
+          f"escritas en {os.path.normpath(args.output)} ({size / 1024:.0f} KB, {time.perf_counter() - start:.1f}s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -54,6 +54,9 @@ if [[ ! -f ../backend/flights_api.py ]]; then
     exit 1
 fi
 
+# Índice binario de ubicaciones (no hace nada si ya está al día)
+python3 ../tools/build_locations_index.py
+
 # Crear directorio de logs
 mkdir -p logs
 
@@ -61,7 +64,9 @@ mkdir -p logs
 cleanup() {
     echo -e "\n${YELLOW}⏹️  Deteniendo worker...${NC}"
     if [[ ! -z "$worker_pid" ]]; then
-        kill $worker_pid 2>/dev/null
+        # SIGTERM: el worker termina la alerta en curso y vacía la cola de Telegram
+        kill -TERM $worker_pid 2>/dev/null
+        wait $worker_pid
     fi
     echo -e "${GREEN}✅ Worker detenido${NC}"
     exit 0
@@ -82,8 +87,8 @@ echo -e "${GREEN}🚀 Iniciando worker de alertas...${NC}"
 echo -e "${BLUE}💡 Presiona Ctrl+C para detener${NC}"
 echo ""
 
-# Ejecutar worker con logging
-python3 worker.py 2>&1 | tee logs/worker.log &
+# Ejecutar worker con logging ($! es el PID de python, no el de tee)
+python3 worker.py > >(tee logs/worker.log) 2>&1 &
 worker_pid=$!
 
 # Esperar a que termine
@@ -12,12 +12,15 @@
 import os
 import sys
 import time
+import signal
 import logging
-import requests
+import threading
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 import json
+import uuid
 
 # Configurar logging PRIMERO
 logging.basicConfig(
@@ -30,15 +33,115 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Agregar el path del backend para importar modules
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+# Agregar la raíz del repo al path para importar los módulos de backend/
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 try:
-    from flights_api import FlightSearchAPI
+    from backend.flights_api import FlightSearchAPI
     logger.info("✅ FlightSearchAPI importada correctamente")
 except ImportError as e:
     logger.error(f"❌ Error importando flights_api: {e}")
     FlightSearchAPI = None
 
+from backend import events
+from backend.flight_record import FlightRecord
+from backend.flex_dates import FlexDateSearch, alternatives_to_storage
+from backend.price_calendar import PriceCalendarStore
+from backend import price_stats
+from backend import outbox
+from backend.outbox import OutboxRelay
+from backend.telegram_dispatcher import SendResult, TelegramDispatcher
+from backend import metrics
+from backend import alert_scheduler
+from backend.alert_scheduler import PriorityScheduler
+
+# Puerto del endpoint /metrics (formato Prometheus); 0 lo desactiva
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '9108'))
+
+# Tiempo máximo para parar tras SIGTERM/SIGINT: terminar la alerta en curso y
+# vaciar la cola de Telegram (el orquestador debe dar algo más de margen)
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv('WORKER_SHUTDOWN_TIMEOUT', '20'))
+
+# Cada cuántas alertas revisadas se guarda su last_checked_at (lo que se pierde
+# si el worker cae es lo que se vuelve a buscar al arrancar)
+WORKER_CHECKPOINT_BATCH = int(os.getenv('WORKER_CHECKPOINT_BATCH', '20'))
+
+# Alertas que se leen de la BD de una vez (por carril, con un cursor en el servidor)
+WORKER_FETCH_CHUNK = int(os.getenv('WORKER_FETCH_CHUNK', '500'))
+
+# Resultados de process_alert que cuentan como revisión (se guarda last_checked_at);
+# con 'search_failed' la alerta se vuelve a intentar en la siguiente pasada
+CHECKED_RESULTS = ('no_flights', 'target_hit', 'above_target', 'checked')
+
+# En ciclos largos, cada cuánto se vuelven a abrir los cursores de alertas por
+# revisar: entran las que han pasado a tocar (p. ej. las urgentes revisadas al
+# principio del ciclo) y la transacción de lectura no dura más que esto
+WORKER_RESCHEDULE_SECONDS = float(os.getenv('WORKER_RESCHEDULE_SECONDS', '300'))
+
+# Un ciclo va de segundos a decenas de minutos
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+
+# Desde que una alerta toca hasta que se revisa: de segundos a días
+LANE_WAIT_BUCKETS = (1, 10, 30, 60, 300, 900, 1800, 3600, 7200, 21600, 86400, 259200)
+
+
+class WorkerMetrics:
+    """
+    Métricas del worker: duración del ciclo y de cada fase del camino caliente,
+    resultados por proveedor, alertas pendientes frente a procesadas y
+    profundidad de las colas (Telegram y outbox, calculadas al hacer scrape).
+    """
+
+    def __init__(self, worker: 'FlightAlertWorker'):
+        self.registry = metrics.Registry()
+        registry = self.registry
+        self.cycle_seconds = registry.histogram(
+            'worker_cycle_duration_seconds', 'Duración de un ciclo completo de verificación', buckets=CYCLE_BUCKETS)
+        self.phase_seconds = registry.histogram(
+            'worker_phase_duration_seconds', 'Latencia de cada fase del procesamiento de alertas', ['phase'])
+        self.provider_requests = registry.counter(
+            'worker_provider_requests_total', 'Búsquedas de vuelos por proveedor y resultado', ['provider', 'outcome'])
+        self.alerts_due = registry.gauge(
+            'worker_alerts_due', 'Alertas activas a revisar en el ciclo en curso')
+        self.alerts_processed = registry.counter(
+            'worker_alerts_processed_total', 'Alertas revisadas por resultado', ['result'])
+        self.notifications_queued = registry.counter(
+            'worker_notifications_queued_total', 'Avisos escritos en el outbox por tipo', ['kind'])
+        self.telegram_sends = registry.counter(
+            'worker_telegram_sends_total', 'Envíos a Telegram por resultado', ['outcome'])
+        self.last_cycle = registry.gauge(
+            'worker_last_cycle_timestamp_seconds', 'Fin del último ciclo (epoch)')
+        self.lane_wait = registry.histogram(
+            'worker_lane_wait_seconds', 'Desde que la alerta toca hasta que se revisa, por carril',
+            ['lane'], buckets=LANE_WAIT_BUCKETS)
+        self.lane_promotions = registry.counter(
+            'worker_lane_starvation_promotions_total', 'Alertas adelantadas por llevar demasiado esperando', ['lane'])
+
+        registry.callback('worker_telegram_queue_depth', 'Mensajes en la cola de salida de Telegram',
+                          lambda: worker.notifier.pending() if worker.notifier else None)
+        registry.callback('worker_outbox_backlog', 'Avisos del outbox por entregar',
+                          worker.outbox_backlog, labelnames=['status'])
+        registry.callback('worker_lane_queue_depth', 'Alertas en cola por carril en el ciclo en curso',
+                          worker.scheduler.depth, labelnames=['lane'])
+
+        # Series del camino caliente resueltas una vez
+        self.get_alerts_seconds = self.phase_seconds.labels('get_active_alerts')
+        self.search_seconds = self.phase_seconds.labels('search_flights')
+        self.flex_seconds = self.phase_seconds.labels('flex_dates')
+        self.db_write_seconds = self.phase_seconds.labels('db_write')
+        self.telegram_seconds = self.phase_seconds.labels('telegram_send')
+
+    def observe_send(self, seconds: float, result: SendResult):
+        """Hook del TelegramDispatcher tras cada envío"""
+        self.telegram_seconds.observe(seconds)
+        if result.ok:
+            outcome = 'ok'
+        elif result.retry_after is not None:
+            outcome = 'rate_limited'
+        else:
+            outcome = 'retryable_error' if result.retryable else 'error'
+        self.telegram_sends.labels(outcome).inc()
+
+
 class FlightAlertWorker:
     """
     Worker para monitoreo automático de alertas de vuelos
@@ -55,8 +158,46 @@ class FlightAlertWorker:
         
         self.telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
         self.check_interval_minutes = int(os.getenv('WORKER_INTERVAL_MINUTES', '15'))
+        # Pausa entre alertas para no saturar la API
+        self.alert_delay_seconds = float(os.getenv('WORKER_ALERT_DELAY_SECONDS', '2'))
         self.flights_api = flights_api
         
+        # Parada ordenada: las esperas se cortan en cuanto se pide parar
+        self.stop_event = threading.Event()
+        self.stop_deadline: Optional[float] = None
+        
+        # Carriles de prioridad (urgentes, premium, cerca del objetivo, resto)
+        self.scheduler = PriorityScheduler(alert_scheduler.parse_weights(alert_scheduler.WORKER_LANE_WEIGHTS),
+                                           alert_scheduler.WORKER_LANE_MAX_WAIT_MINUTES * 60)
+        # Inicio (monotónico) e identificador del ciclo en curso
+        self.cycle_started_at: Optional[float] = None
+        self.cycle_id: Optional[str] = None
+        # Conexión de la pasada en curso (transacción de solo lectura con un cursor por carril)
+        self.alerts_conn = None
+        
+        # Alertas revisadas cuyo last_checked_at aún no está en BD: (id, instante monotónico)
+        self.unsaved_checks: List[Tuple[int, float]] = []
+        
+        # Fechas flexibles para alertas que se quedan cerca del objetivo
+        self.flex_days = int(os.getenv('FLEX_DATES_DAYS', '3'))
+        self.flex_near_miss_pct = float(os.getenv('FLEX_DATES_NEAR_MISS_PCT', '25'))
+        self.flex_calls_per_cycle = int(os.getenv('FLEX_DATES_CALLS_PER_CYCLE', '5'))
+        # Calendario de precios compartido: una ruta/día buscada en este ciclo no se vuelve a buscar
+        self.price_calendar = PriceCalendarStore(self.get_db_connection, max_age_seconds=self.check_interval_minutes * 60)
+        self.flex_search = FlexDateSearch(flights_api, store=self.price_calendar) if flights_api else None
+        self.flex_calls_left = self.flex_calls_per_cycle
+        
+        # Los avisos se escriben en el outbox con el snapshot; el relay los entrega a
+        # Telegram por la cola de salida (límites global y por chat), fuera del bucle de búsqueda
+        self.metrics = WorkerMetrics(self)
+        self.notifier = TelegramDispatcher(self.telegram_bot_token, observe=self.metrics.observe_send) \
+            if self.telegram_bot_token else None
+        self.outbox_relay = OutboxRelay(self.get_db_connection, self.notifier) if self.notifier else None
+        if self.notifier:
+            self.notifier.start()
+            self.outbox_relay.start()
+        self.metrics_server = metrics.serve(self.metrics.registry, WORKER_METRICS_PORT) if WORKER_METRICS_PORT else None
+        
         logger.info(f"🤖 Worker iniciado - Intervalo: {self.check_interval_minutes} minutos")
         
     def get_db_connection(self):
@@ -68,51 +209,145 @@ class FlightAlertWorker:
             logger.error(f"❌ Error conectando a BD: {e}")
             return None
     
-    def get_active_alerts(self) -> List[Dict]:
-        """Obtener todas las alertas activas"""
+    def mark_checked(self, alert_id: int):
+        """Apunta la alerta como revisada; se guarda en BD cada WORKER_CHECKPOINT_BATCH"""
+        self.unsaved_checks.append((alert_id, time.monotonic()))
+        if len(self.unsaved_checks) >= WORKER_CHECKPOINT_BATCH:
+            self.save_checkpoint()
+    
+    def save_checkpoint(self):
+        """
+        Guarda last_checked_at de las alertas revisadas desde el último guardado,
+        con el instante de cada revisión (relativo al reloj de la BD). Si falla, se
+        reintenta en el siguiente lote.
+        """
+        if not self.unsaved_checks:
+            return
         conn = self.get_db_connection()
         if not conn:
-            return []
-        
+            return
         try:
-            cursor = conn.cursor()
-            query = """
-                SELECT a.id, a.user_id, a.origin, a.destination, 
-                       a.date_from, a.date_to, a.price_target_cents, 
-                       a.max_stops, a.created_at, u.telegram_id
+            now = time.monotonic()
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE alerts a SET last_checked_at = NOW() - make_interval(secs => v.age)
+                    FROM (VALUES %s) AS v(id, age)
+                    WHERE a.id = v.id
+                """, [(alert_id, now - checked) for alert_id, checked in self.unsaved_checks],
+                    template='(%s, %s::double precision)')
+            conn.commit()
+            self.unsaved_checks = []
+        except Exception as e:
+            logger.error(f"❌ Error guardando el progreso del ciclo: {e}")
+        finally:
+            conn.close()
+    
+    def outbox_backlog(self) -> Optional[Dict[str, int]]:
+        """Filas del outbox por entregar (para la métrica de profundidad de cola)"""
+        conn = self.get_db_connection()
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cur:
+                return outbox.backlog(cur)
+        finally:
+            conn.close()
+    
+    def due_alerts_query(self, select: str, tail: str = '') -> str:
+        """Alertas activas no revisadas en el último intervalo, con su carril y cuánto llevan esperando"""
+        return f"""
+            SELECT {select} FROM (
+                SELECT a.id, a.user_id, a.origin, a.destination,
+                       a.date_from, a.date_to, a.price_target_cents,
+                       a.max_stops, a.created_at, u.telegram_id, a.notify_deals,
+                       {alert_scheduler.LANE_SQL} AS lane,
+                       -- Una alerta nunca revisada toca desde que se creó, o desde que empezó
+                       -- el ciclo si es anterior: no cuenta como atrasada por su antigüedad
+                       EXTRACT(EPOCH FROM NOW() - COALESCE(
+                           a.last_checked_at + make_interval(secs => %(interval)s),
+                           GREATEST(a.created_at, NOW() - make_interval(secs => %(cycle_age)s))
+                       )) AS overdue_seconds
                 FROM alerts a
                 JOIN users u ON a.user_id = u.id
+                LEFT JOIN alert_price_stats s ON s.alert_id = a.id
                 WHERE a.active = TRUE
                   AND a.date_from >= CURRENT_DATE
-                ORDER BY a.created_at ASC
-            """
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            alerts = []
-            for row in results:
-                alerts.append({
-                    'id': row[0],
-                    'user_id': row[1],
-                    'origin': row[2],
-                    'destination': row[3],
-                    'date_from': row[4].strftime('%d/%m/%Y') if row[4] else None,
-                    'date_to': row[5].strftime('%d/%m/%Y') if row[5] else None,
-                    'price_target_cents': row[6],
-                    'max_stops': row[7],
-                    'created_at': row[8],
-                    'telegram_id': row[9]
-                })
-            
-            logger.info(f"📊 Encontradas {len(alerts)} alertas activas")
-            return alerts
-            
+                  AND (a.last_checked_at IS NULL
+                       OR a.last_checked_at <= NOW() - make_interval(secs => %(interval)s))
+            ) due
+            {tail}
+        """
+    
+    def open_due_alerts(self):
+        """
+        Abre una pasada: cuenta las alertas por revisar de cada carril y prepara un
+        cursor con nombre por carril, todo sobre la misma foto de la BD (REPEATABLE
+        READ). Las alertas se leen después, a trozos, según el planificador las pide.
+        """
+        self.close_due_alerts()
+        self.scheduler.clear()
+        conn = self.get_db_connection()
+        if not conn:
+            return
+        try:
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            # NOW() es el inicio de la transacción: la espera de cada alerta se cuenta desde aquí
+            opened_at = time.monotonic()
+            params = {'interval': self.check_interval_minutes * 60,
+                      'cycle_age': opened_at - (self.cycle_started_at or opened_at),
+                      **alert_scheduler.lane_params()}
+            with self.metrics.get_alerts_seconds.time(), conn.cursor() as cursor:
+                cursor.execute(self.due_alerts_query('lane, COUNT(*)', 'GROUP BY lane'), params)
+                totals = dict(cursor.fetchall())
         except Exception as e:
             logger.error(f"❌ Error obteniendo alertas: {e}")
-            return []
-        finally:
             conn.close()
+            return
+        
+        self.alerts_conn = conn
+        self.scheduler.open({lane: self.stream_lane(conn, lane, params, opened_at) for lane in totals}, totals)
+        logger.info(f"📊 Encontradas {sum(totals.values())} alertas activas por revisar")
+    
+    def close_due_alerts(self):
+        if self.alerts_conn is not None:
+            try:
+                self.alerts_conn.close()
+            except Exception:
+                pass
+            self.alerts_conn = None
+    
+    def iter_due_alerts(self, conn, lane: str, params: Dict[str, Any]) -> Iterator[List[Dict]]:
+        """Alertas por revisar de un carril, las más atrasadas primero, en trozos de WORKER_FETCH_CHUNK"""
+        # Cursor con nombre: la consulta se queda en el servidor y se trae por partes
+        cursor = conn.cursor(name=f"due_alerts_{lane}")
+        cursor.execute(self.due_alerts_query('*', 'WHERE lane = %(lane)s ORDER BY overdue_seconds DESC, id'),
+                       {**params, 'lane': lane})
+        while True:
+            with self.metrics.get_alerts_seconds.time():
+                rows = cursor.fetchmany(WORKER_FETCH_CHUNK)
+            if not rows:
+                return
+            yield [{
+                'id': row[0],
+                'user_id': row[1],
+                'origin': row[2],
+                'destination': row[3],
+                'date_from': row[4].strftime('%d/%m/%Y') if row[4] else None,
+                'date_to': row[5].strftime('%d/%m/%Y') if row[5] else None,
+                'price_target_cents': row[6],
+                'max_stops': row[7],
+                'created_at': row[8],
+                'telegram_id': row[9],
+                'notify_deals': row[10],
+                'lane': row[11],
+                'overdue_seconds': max(0.0, float(row[12] or 0))
+            } for row in rows]
+    
+    def stream_lane(self, conn, lane: str, params: Dict[str, Any], opened_at: float):
+        """(instante monotónico en que tocaba, alerta) para el planificador"""
+        for chunk in self.iter_due_alerts(conn, lane, params):
+            for alert in chunk:
+                yield opened_at - alert['overdue_seconds'], alert
     
     def search_flights_for_alert(self, alert: Dict) -> Dict[str, Any]:
         """Buscar vuelos para una alerta específica"""
@@ -129,13 +364,19 @@ class FlightAlertWorker:
                 }
 
             # Usar la API de vuelos ya configurada
-            result = self.flights_api.search_flights(
-                origin=alert['origin'],
-                destination=alert['destination'],
-                date_from=alert['date_from'],
-                return_from=alert.get('date_to'),
-                limit=5
-            )
+            with self.metrics.search_seconds.time():
+                result = self.flights_api.search_flights(
+                    origin=alert['origin'],
+                    destination=alert['destination'],
+                    date_from=alert['date_from'],
+                    return_from=alert.get('date_to'),
+                    limit=5
+                )
+            if not result.get('success'):
+                outcome = 'error'
+            else:
+                outcome = 'ok' if result.get('flights') else 'empty'
+            self.metrics.provider_requests.labels(result.get('api_used', 'unknown'), outcome).inc()
 
             if result.get('success') and result.get('flights'):
                 logger.info(f"✅ Encontrados {len(result['flights'])} vuelos para alerta {alert['id']}")
@@ -146,6 +387,7 @@ class FlightAlertWorker:
 
         except Exception as e:
             logger.error(f"❌ Error buscando vuelos para alerta {alert['id']}: {e}")
+            self.metrics.provider_requests.labels('unknown', 'exception').inc()
             return {
                 'success': False,
                 'error': str(e),
@@ -153,14 +395,45 @@ class FlightAlertWorker:
                 'total_results': 0
             }
     
-    def save_search_snapshot(self, alert_id: int, price_cents: int, flight_details: Dict):
-        """Guardar snapshot de búsqueda en BD"""
+    def cached_search_for_alert(self, alert: Dict) -> Optional[Dict[str, Any]]:
+        """Resultado a partir de price_calendar si otra búsqueda reciente cubrió la fecha de la alerta"""
+        if not alert.get('date_from'):
+            return None
+        day = datetime.strptime(alert['date_from'], '%d/%m/%Y').date()
+        entry = self.price_calendar.read_day(alert['origin'], alert['destination'], day)
+        if not entry:
+            return None
+        logger.info(f"📚 Precio de {alert['origin']} → {alert['destination']} el {alert['date_from']} "
+                    f"tomado del calendario ({entry.flight.price_euros:.2f}€)")
+        return {'success': True, 'flights': [entry.flight], 'total_results': 1, 'api_used': 'price_calendar'}
+    
+    def save_search_snapshot(self, alert: Dict, price_cents: int, flight_details: Dict,
+                             notification_for: Optional[Callable[[Optional[price_stats.Deal]], Optional[Tuple[str, int, str]]]] = None
+                             ) -> Optional[str]:
+        """
+        Guardar snapshot de búsqueda en BD (y publicar el evento para los streams SSE).
+        En la misma transacción se actualizan las estadísticas de la alerta y de la
+        ruta y, si notification_for(chollo) devuelve (tipo, precio, mensaje), el aviso
+        se escribe en el outbox (salvo que la alerta ya tenga uno reciente o pendiente).
+        Devuelve el tipo de aviso encolado, o None; si no se puede guardar, lanza
+        la excepción (la alerta no se da por revisada).
+        """
+        with self.metrics.db_write_seconds.time():
+            queued = self._save_search_snapshot(alert, price_cents, flight_details, notification_for)
+        if queued:
+            self.metrics.notifications_queued.labels(queued).inc()
+        return queued
+    
+    def _save_search_snapshot(self, alert: Dict, price_cents: int, flight_details: Dict,
+                              notification_for: Optional[Callable]) -> Optional[str]:
+        alert_id = alert['id']
         conn = self.get_db_connection()
         if not conn:
-            return False
+            raise RuntimeError("Sin conexión a la BD para guardar el snapshot")
         
         try:
             cursor = conn.cursor()
+            found_at = datetime.now()
             
             query = """
                 INSERT INTO search_snapshots (alert_id, price_cents, found_at, details)
@@ -170,208 +443,343 @@ class FlightAlertWorker:
             cursor.execute(query, (
                 alert_id,
                 price_cents,
-                datetime.now(),
+                found_at,
                 json.dumps(flight_details)
             ))
             
+            deal = None
+            if flight_details.get('origin') and flight_details.get('destination'):
+                # El mismo vuelo visto por varias alertas de la ruta en este ciclo cuenta una vez
+                observation = (f"{self.cycle_id}:{flight_details.get('flight_number')}:"
+                               f"{flight_details.get('departure')}:{price_cents}") if self.cycle_id else None
+                deal = price_stats.update_stats(cursor, alert_id, flight_details['origin'],
+                                                flight_details['destination'], price_cents, found_at,
+                                                observation=observation)
+            
+            if alert.get('user_id') is not None:
+                events.notify_price_event(cursor, alert['user_id'], alert_id, "snapshot", price_cents)
+            
+            queued = None
+            notification = notification_for(deal) if notification_for else None
+            if notification and alert.get('telegram_id') is not None:
+                if outbox.recently_notified(cursor, alert_id):
+                    logger.info(f"📬 Ya se envió (o está pendiente) una notificación reciente para alerta {alert_id}")
+                else:
+                    kind, notify_cents, message = notification
+                    key = outbox.idempotency_key(kind, alert_id, notify_cents)
+                    if outbox.enqueue(cursor, key, alert_id, alert.get('user_id'), alert['telegram_id'],
+                                      kind, notify_cents, message):
+                        queued = kind
+            
             conn.commit()
             logger.info(f"💾 Snapshot guardado para alerta {alert_id}: {price_cents/100:.2f}€")
-            return True
+            return queued
             
         except Exception as e:
+            # Sin snapshot la revisión no cuenta: el error sube para que no se guarde last_checked_at
             logger.error(f"❌ Error guardando snapshot: {e}")
-            return False
+            raise
         finally:
             conn.close()
     
-    def check_recent_notification(self, alert_id: int) -> bool:
-        """Verificar si ya se envió una notificación reciente (últimas 24h)"""
-        conn = self.get_db_connection()
-        if not conn:
-            return True  # Por seguridad, asumir que sí se envió
+    def format_price_notification(self, alert: Dict, flight: FlightRecord) -> str:
+        """Mensaje de precio objetivo alcanzado"""
+        price_euros = flight.price_euros
+        target_euros = alert['price_target_cents'] / 100
         
-        try:
-            cursor = conn.cursor()
-            
-            query = """
-                SELECT COUNT(*) FROM notifications_sent
-                WHERE alert_id = %s
-                  AND sent_at >= %s
-            """
-            
-            yesterday = datetime.now() - timedelta(days=1)
-            cursor.execute(query, (alert_id, yesterday))
-            
-            count = cursor.fetchone()[0]
-            return count > 0
-            
-        except Exception as e:
-            logger.error(f"❌ Error verificando notificaciones recientes: {e}")
-            return True
-        finally:
-            conn.close()
+        message = f"🎉 **¡ALERTA DE VUELO ENCONTRADO!** ✈️\n\n"
+        message += f"**Ruta:** {alert['origin']} → {alert['destination']}\n"
+        message += f"**Fecha:** {alert['date_from']}\n"
+        message += f"**Precio encontrado:** {price_euros:.2f}€\n"
+        message += f"**Tu objetivo:** {target_euros:.2f}€\n"
+        message += f"**Aerolínea:** {flight.airline}\n"
+        message += f"**Duración:** {flight.flight_duration}\n"
+        message += f"**Escalas:** {flight.stops}\n\n"
+        message += f"🔗 **[RESERVAR AHORA]({flight.booking_link})**\n\n"
+        message += f"💡 *Precio encontrado por tu alerta automática*"
+        return message
     
-    def save_notification_sent(self, alert_id: int, price_cents: int):
-        """Registrar que se envió una notificación"""
-        conn = self.get_db_connection()
-        if not conn:
-            return False
+    def is_near_miss(self, price_cents: int, target_price_cents: int) -> bool:
+        """El precio supera el objetivo como mucho en FLEX_DATES_NEAR_MISS_PCT %"""
+        return price_cents <= target_price_cents * (1 + self.flex_near_miss_pct / 100)
+    
+    def find_flex_alternatives(self, alert: Dict) -> List[Dict]:
+        """
+        Fechas cercanas (±FLEX_DATES_DAYS) más baratas, sin gastar más llamadas a la
+        API que las que quedan del presupuesto del ciclo (FLEX_DATES_CALLS_PER_CYCLE).
+        Los días ya cacheados no gastan cuota. Si el worker está parando, no se buscan.
+        """
+        if not self.flex_search or not alert.get('date_from') or self.stop_event.is_set():
+            return []
         
         try:
-            cursor = conn.cursor()
-            
-            query = """
-                INSERT INTO notifications_sent (alert_id, price_cents, sent_at)
-                VALUES (%s, %s, %s)
-            """
-            
-            cursor.execute(query, (alert_id, price_cents, datetime.now()))
-            conn.commit()
-            
-            logger.info(f"📬 Notificación registrada para alerta {alert_id}")
-            return True
-            
+            center = datetime.strptime(alert['date_from'], '%d/%m/%Y').date()
+            with self.metrics.flex_seconds.time():
+                result = self.flex_search.alternatives(
+                    alert['origin'], alert['destination'], center,
+                    days=self.flex_days, max_calls=self.flex_calls_left
+                )
         except Exception as e:
-            logger.error(f"❌ Error registrando notificación: {e}")
-            return False
-        finally:
-            conn.close()
+            logger.error(f"❌ Error buscando fechas flexibles para alerta {alert['id']}: {e}")
+            return []
+        
+        self.flex_calls_left -= result['upstream_calls']
+        if not result['complete']:
+            logger.info(f"📅 Presupuesto de fechas flexibles agotado en alerta {alert['id']}")
+        return result['alternatives']
     
-    def send_telegram_notification(self, telegram_id: int, alert: Dict, flight: Dict):
-        """Enviar notificación por Telegram"""
-        if not self.telegram_bot_token:
-            logger.warning("⚠️ No hay token de Telegram configurado")
-            return False
+    def format_flex_suggestion(self, alert: Dict, alternative: Dict) -> str:
+        """Mensaje con una fecha cercana que cumple el precio objetivo"""
+        flight = alternative['flight']
+        offset = alternative['days_from_target']
         
-        try:
-            price_euros = flight['price_euros']
-            target_euros = alert['price_target_cents'] / 100
-            
-            message = f"🎉 **¡ALERTA DE VUELO ENCONTRADO!** ✈️\n\n"
-            message += f"**Ruta:** {alert['origin']} → {alert['destination']}\n"
-            message += f"**Fecha:** {alert['date_from']}\n"
-            message += f"**Precio encontrado:** {price_euros:.2f}€\n"
-            message += f"**Tu objetivo:** {target_euros:.2f}€\n"
-            message += f"**Aerolínea:** {', '.join(flight['airlines'])}\n"
-            message += f"**Duración:** {flight['flight_duration']}\n"
-            message += f"**Escalas:** {flight['stops']}\n\n"
-            message += f"🔗 **[RESERVAR AHORA]({flight['booking_link']})**\n\n"
-            message += f"💡 *Precio encontrado por tu alerta automática*"
-            
-            url = f"https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage"
-            payload = {
-                'chat_id': telegram_id,
-                'text': message,
-                'parse_mode': 'Markdown',
-                'disable_web_page_preview': False
-            }
-            
-            response = requests.post(url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info(f"📱 Notificación enviada a usuario {telegram_id}")
-                return True
-            else:
-                logger.error(f"❌ Error enviando notificación: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"❌ Error enviando notificación por Telegram: {e}")
-            return False
+        message = f"📅 **¡Precio objetivo en una fecha cercana!** ✈️\n\n"
+        message += f"**Ruta:** {alert['origin']} → {alert['destination']}\n"
+        message += f"**Tu fecha:** {alert['date_from']}\n"
+        message += f"**Fecha alternativa:** {alternative['date'].strftime('%d/%m/%Y')} ({offset:+d} días)\n"
+        message += f"**Precio:** {flight.price_euros:.2f}€ (objetivo {alert['price_target_cents'] / 100:.2f}€)\n"
+        message += f"**Aerolínea:** {flight.airline}\n\n"
+        message += f"🔗 **[VER VUELO]({flight.booking_link})**"
+        return message
+    
+    def format_deal_notification(self, alert: Dict, flight: FlightRecord, deal: price_stats.Deal) -> str:
+        """Mensaje de bajada anómala del precio de la ruta"""
+        message = f"🔥 **¡Chollo detectado!** ✈️\n\n"
+        message += f"**Ruta:** {alert['origin']} → {alert['destination']}\n"
+        message += f"**Fecha:** {alert['date_from']}\n"
+        message += f"**Precio:** {flight.price_euros:.2f}€ ({deal.drop_pct:.0f}% por debajo de lo habitual, ~{deal.baseline_cents / 100:.2f}€)\n"
+        if alert.get('price_target_cents'):
+            message += f"**Tu objetivo:** {alert['price_target_cents'] / 100:.2f}€\n"
+        message += f"**Aerolínea:** {flight.airline}\n\n"
+        message += f"🔗 **[VER VUELO]({flight.booking_link})**"
+        return message
+    
+    def choose_notification(self, alert: Dict, flight: FlightRecord, alternatives: List[Dict],
+                            deal: Optional[price_stats.Deal]) -> Optional[Tuple[str, int, str]]:
+        """
+        Aviso que corresponde a este snapshot como (tipo, precio, mensaje), por orden:
+        precio objetivo alcanzado, chollo (si la alerta lo pidió) o fecha cercana que cumple el objetivo.
+        """
+        target_price_cents = alert['price_target_cents']
+        if target_price_cents is not None and flight.price_cents <= target_price_cents:
+            return 'threshold_hit', flight.price_cents, self.format_price_notification(alert, flight)
+        
+        if deal and alert.get('notify_deals'):
+            logger.info(f"🔥 Chollo en alerta {alert['id']}: {flight.price_cents/100:.2f}€ "
+                        f"(z={deal.zscore:.1f}, -{deal.drop_pct:.0f}% sobre {deal.baseline_cents/100:.2f}€)")
+            return 'deal', flight.price_cents, self.format_deal_notification(alert, flight, deal)
+        
+        best_alternative = alternatives[0] if alternatives else None
+        if best_alternative and target_price_cents is not None \
+                and best_alternative['flight'].price_cents <= target_price_cents:
+            return ('flex_date', best_alternative['flight'].price_cents,
+                    self.format_flex_suggestion(alert, best_alternative))
+        return None
     
-    def process_alert(self, alert: Dict):
-        """Procesar una alerta individual"""
+    def process_alert(self, alert: Dict) -> str:
+        """Procesar una alerta individual; devuelve el resultado ('search_failed', 'no_flights', 'target_hit', 'above_target', 'checked')"""
         alert_id = alert['id']
         target_price_cents = alert['price_target_cents']
         
-        logger.info(f"🔄 Procesando alerta {alert_id} - Objetivo: {target_price_cents/100:.2f}€")
+        target_text = f"{target_price_cents/100:.2f}€" if target_price_cents is not None else "sin objetivo"
+        logger.info(f"🔄 Procesando alerta {alert_id} - Objetivo: {target_text}")
         
-        # 1. Buscar vuelos
-        search_result = self.search_flights_for_alert(alert)
+        # 1. Buscar vuelos (o reutilizar el precio del calendario si es de este ciclo)
+        search_result = self.cached_search_for_alert(alert)
+        if search_result is not None:
+            self.metrics.provider_requests.labels('price_calendar', 'ok').inc()
+        else:
+            search_result = self.search_flights_for_alert(alert)
+            if search_result.get('success'):
+                self.price_calendar.record(alert['origin'], alert['destination'], search_result.get('flights', []))
+        
+        if not search_result.get('success'):
+            logger.warning(f"⚠️ Búsqueda fallida para alerta {alert_id}, se reintentará")
+            return 'search_failed'
         
-        if not search_result.get('success') or not search_result.get('flights'):
+        if not search_result.get('flights'):
             logger.warning(f"⚠️ No hay vuelos disponibles para alerta {alert_id}")
-            return
+            return 'no_flights'
         
         flights = search_result['flights']
         
         # 2. Encontrar el vuelo más barato
-        cheapest_flight = min(flights, key=lambda f: f.get('price_euros', 999))
-        cheapest_price_cents = int(cheapest_flight['price_euros'] * 100)
+        cheapest_flight = min(flights, key=lambda f: f.price_cents)
+        cheapest_price_cents = cheapest_flight.price_cents
         
-        # 3. Guardar snapshot siempre
-        self.save_search_snapshot(alert_id, cheapest_price_cents, cheapest_flight)
+        # 3. Si se queda cerca del objetivo, buscar fechas cercanas más baratas
+        alternatives = []
+        if (target_price_cents is not None and cheapest_price_cents > target_price_cents
+                and self.is_near_miss(cheapest_price_cents, target_price_cents)):
+            alternatives = self.find_flex_alternatives(alert)
         
-        # 4. Verificar si cumple objetivo de precio
-        if cheapest_price_cents <= target_price_cents:
+        # 4. Guardar snapshot siempre (formato compacto), con el aviso que toque en el outbox
+        details = cheapest_flight.to_storage()
+        if alternatives:
+            details['flex_alternatives'] = alternatives_to_storage(alternatives)
+        queued = self.save_search_snapshot(
+            alert, cheapest_price_cents, details,
+            notification_for=lambda deal: self.choose_notification(alert, cheapest_flight, alternatives, deal)
+        )
+        
+        # 5. Resultado
+        if target_price_cents is not None and cheapest_price_cents <= target_price_cents:
             logger.info(f"🎯 ¡PRECIO OBJETIVO ALCANZADO! Alerta {alert_id}: {cheapest_price_cents/100:.2f}€ <= {target_price_cents/100:.2f}€")
-            
-            # 5. Verificar si ya se envió notificación reciente
-            if self.check_recent_notification(alert_id):
-                logger.info(f"📬 Ya se envió notificación reciente para alerta {alert_id}")
-                return
-            
-            # 6. Enviar notificación
-            if self.send_telegram_notification(alert['telegram_id'], alert, cheapest_flight):
-                # 7. Registrar notificación enviada
-                self.save_notification_sent(alert_id, cheapest_price_cents)
-                logger.info(f"✅ Alerta {alert_id} procesada y notificación enviada")
-            else:
-                logger.error(f"❌ Error enviando notificación para alerta {alert_id}")
-        else:
+        elif target_price_cents is not None:
             logger.info(f"💰 Precio actual {cheapest_price_cents/100:.2f}€ > objetivo {target_price_cents/100:.2f}€ (alerta {alert_id})")
+        if queued:
+            logger.info(f"📬 Aviso '{queued}' de la alerta {alert_id} en el outbox")
+        
+        if target_price_cents is None:
+            return 'checked'
+        return 'target_hit' if cheapest_price_cents <= target_price_cents else 'above_target'
     
     def run_check_cycle(self):
         """Ejecutar un ciclo completo de verificación"""
         logger.info("🔄 Iniciando ciclo de verificación de alertas")
         
         start_time = datetime.now()
+        self.cycle_started_at = time.monotonic()
+        self.cycle_id = uuid.uuid4().hex
+        self.flex_calls_left = self.flex_calls_per_cycle
         
-        # Obtener alertas activas
-        alerts = self.get_active_alerts()
+        with self.metrics.cycle_seconds.time():
+            self._run_check_cycle(start_time)
+        self.metrics.last_cycle.set(time.time())
+    
+    def _run_check_cycle(self, start_time: datetime):
+        # Contar las alertas por revisar y abrir un cursor por carril de prioridad
+        self.open_due_alerts()
+        self.metrics.alerts_due.set(self.scheduler.pending())
         
-        if not alerts:
+        if not self.scheduler.pending():
+            self.close_due_alerts()
             logger.info("😴 No hay alertas activas para procesar")
             return
+        logger.info("🚦 Carriles: " + ", ".join(f"{lane}={count}" for lane, count in self.scheduler.depth().items()))
         
-        # Procesar cada alerta
+        # Procesar cada alerta; el progreso se guarda por lotes (y siempre al salir,
+        # también por una excepción) para que un reinicio no repita búsquedas
         processed_count = 0
-        notifications_sent = 0
+        opened_at = time.monotonic()
         
-        for alert in alerts:
-            try:
-                self.process_alert(alert)
-                processed_count += 1
-                
-                # Pequeño delay entre alertas para no saturar la API
-                time.sleep(2)
+        try:
+            while True:
+                # Al parar se termina la alerta en curso, pero no se empieza otra
+                if self.stop_event.is_set():
+                    logger.info(f"⏹️ Ciclo interrumpido: {self.scheduler.pending()} alertas quedan para el próximo")
+                    break
+                # En un ciclo largo, nueva pasada: entran las que han vuelto a tocar
+                if time.monotonic() - opened_at >= WORKER_RESCHEDULE_SECONDS:
+                    self.save_checkpoint()
+                    self.open_due_alerts()
+                    opened_at = time.monotonic()
+                    logger.info("🔀 Carriles actualizados: " +
+                                ", ".join(f"{lane}={count}" for lane, count in self.scheduler.depth().items()))
+                    self.metrics.alerts_due.set(processed_count + self.scheduler.pending())
                 
-            except Exception as e:
-                logger.error(f"❌ Error procesando alerta {alert['id']}: {e}")
+                scheduled = self.scheduler.next()
+                if scheduled is None:
+                    break
+                alert = scheduled.alert
+                if scheduled.promoted:
+                    self.metrics.lane_promotions.labels(scheduled.lane).inc()
+                try:
+                    result = self.process_alert(alert)
+                    self.metrics.alerts_processed.labels(result).inc()
+                    self.metrics.lane_wait.labels(scheduled.lane).observe(time.monotonic() - scheduled.due_at)
+                    # Solo cuenta como revisada si la búsqueda y el snapshot han ido bien
+                    if result in CHECKED_RESULTS:
+                        self.mark_checked(alert['id'])
+                    processed_count += 1
+                    
+                    # Pequeño delay entre alertas para no saturar la API
+                    self.stop_event.wait(self.alert_delay_seconds)
+                    
+                except Exception as e:
+                    logger.error(f"❌ Error procesando alerta {alert['id']}: {e}")
+                    self.metrics.alerts_processed.labels('error').inc()
+        finally:
+            self.save_checkpoint()
+            self.close_due_alerts()
         
         elapsed_time = (datetime.now() - start_time).total_seconds()
         logger.info(f"✅ Ciclo completado: {processed_count} alertas procesadas en {elapsed_time:.1f}s")
     
+    def request_stop(self, reason: str = ''):
+        """Pide una parada ordenada (desde un manejador de señal u otro hilo)"""
+        if self.stop_event.is_set():
+            return
+        self.stop_deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT
+        self.stop_event.set()
+        logger.info(f"🛑 Parada solicitada{f' ({reason})' if reason else ''}: terminando lo que está en curso "
+                    f"(máximo {WORKER_SHUTDOWN_TIMEOUT:.0f}s)")
+    
+    def install_signal_handlers(self):
+        """SIGTERM/SIGINT paran de forma ordenada; una segunda señal sale sin esperar"""
+        def handle(signum, frame):
+            if self.stop_event.is_set():
+                logger.warning("⚠️ Segunda señal: saliendo sin vaciar la cola")
+                raise KeyboardInterrupt
+            self.request_stop(signal.Signals(signum).name)
+        
+        signal.signal(signal.SIGTERM, handle)
+        # Lanzado en segundo plano (start_worker.sh) SIGINT llega ignorado: el
+        # Ctrl+C es para el script, que nos manda SIGTERM
+        if signal.getsignal(signal.SIGINT) is not signal.SIG_IGN:
+            signal.signal(signal.SIGINT, handle)
+    
     def run(self):
         """Ejecutar el worker principal"""
         logger.info("🚀 Worker de alertas de vuelos iniciado")
         logger.info(f"⏰ Intervalo de verificación: {self.check_interval_minutes} minutos")
         
-        while True:
+        while not self.stop_event.is_set():
             try:
                 self.run_check_cycle()
+                if self.stop_event.is_set():
+                    break
                 
-                # Esperar hasta el siguiente ciclo
+                # Esperar hasta el siguiente ciclo (o hasta que se pida parar)
                 logger.info(f"💤 Esperando {self.check_interval_minutes} minutos hasta el próximo ciclo...")
-                time.sleep(self.check_interval_minutes * 60)
+                self.stop_event.wait(self.check_interval_minutes * 60)
                 
             except KeyboardInterrupt:
                 logger.info("⏹️ Worker detenido por usuario")
-                break
+                self.shutdown(drain=False)
+                return
             except Exception as e:
                 logger.error(f"💥 Error inesperado en worker: {e}")
                 logger.info("🔄 Reintentando en 5 minutos...")
-                time.sleep(300)  # 5 minutos
+                self.stop_event.wait(300)  # 5 minutos
+        
+        self.shutdown()
+    
+    def shutdown(self, drain: bool = True):
+        """
+        Vacía la cola de Telegram con el tiempo que quede hasta stop_deadline y
+        devuelve al outbox lo que no salió (otro worker lo entrega sin esperar al
+        lease). Después cierra el transporte de Kiwi y el endpoint de métricas.
+        """
+        if self.stop_deadline is None:
+            self.stop_deadline = time.monotonic() + WORKER_SHUTDOWN_TIMEOUT
+        if self.notifier:
+            # Primero el relay, para que no reclame avisos que ya no se van a enviar
+            self.outbox_relay.stop()
+            remaining = max(0.0, self.stop_deadline - time.monotonic()) if drain else 0.0
+            pending = self.notifier.pending()
+            if pending:
+                logger.info(f"📤 Enviando {pending} mensajes pendientes antes de salir (máximo {remaining:.0f}s)")
+            unsent = self.notifier.stop(timeout=remaining)
+            try:
+                self.outbox_relay.release(unsent)
+            except Exception as e:
+                logger.error(f"❌ No se pudieron devolver los avisos al outbox (se retoman al caducar el lease): {e}")
+        if self.flights_api:
+            self.flights_api.close()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        logger.info("👋 Worker detenido")
 
 
 def main():
@@ -397,6 +805,7 @@ def main():
 
     # Iniciar worker
     worker = FlightAlertWorker(flights_api)
+    worker.install_signal_handlers()
     worker.run()
 
 if __name__ == "__main__":